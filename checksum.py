@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة التحقق من سلامة الملفات
+Streaming Checksum Module
+
+حساب البصمة (hash) أثناء كتابة البايتات بدلاً من إعادة قراءة الملف بعد
+التحميل، والتحقق منها مقابل قيمة متوقعة أو ترويسات الخادم، وحفظها في ملف جانبي
+"""
+
+import os
+import re
+import base64
+import binascii
+import hashlib
+
+SUPPORTED_ALGORITHMS = ("sha256", "sha1", "md5", "sha512", "blake2b")
+DEFAULT_ALGORITHM = "sha256"
+
+# أسماء الخوارزميات في ترويسة Digest (RFC 3230) وما يقابلها في hashlib
+_DIGEST_HEADER_NAMES = {
+    "sha-256": "sha256",
+    "sha-512": "sha512",
+    "sha": "sha1",
+    "sha-1": "sha1",
+    "md5": "md5",
+}
+
+# طول البصمة الست عشرية لكل خوارزمية (لتحديد خوارزمية X-Checksum بدون اسم)
+_HEX_LENGTHS = {64: "sha256", 40: "sha1", 32: "md5", 128: "sha512"}
+
+_READ_CHUNK = 1024 * 1024
+
+
+class ChecksumError(Exception):
+    """خوارزمية غير مدعومة أو بصمة غير صالحة"""
+
+
+def _new_hash(algorithm):
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ChecksumError(f"Unsupported checksum algorithm: {algorithm}")
+    return hashlib.new(algorithm)
+
+
+class StreamingHasher:
+    def __init__(self, algorithms=(DEFAULT_ALGORITHM,)):
+        """
+        حساب بصمة واحدة أو أكثر للبايتات أثناء كتابتها
+
+        Args:
+            algorithms: الخوارزميات المطلوبة
+        """
+        self._hashes = {}
+        self.bytes_hashed = 0
+        for algorithm in algorithms:
+            self._hashes[algorithm] = _new_hash(algorithm)
+
+    @property
+    def algorithms(self):
+        return tuple(self._hashes)
+
+    def update(self, chunk):
+        """إضافة بايتات مكتوبة إلى كل البصمات"""
+        for hasher in self._hashes.values():
+            hasher.update(chunk)
+        self.bytes_hashed += len(chunk)
+
+    def reset(self):
+        """البدء من الصفر (مثلاً عندما لا يدعم الخادم الإكمال)"""
+        self._hashes = {algorithm: _new_hash(algorithm) for algorithm in self._hashes}
+        self.bytes_hashed = 0
+
+    def add_algorithm(self, algorithm, path=None):
+        """
+        إضافة خوارزمية بعد بدء الحساب
+
+        إذا سبق حساب بايتات، تُقرأ البادئة المكتوبة من الملف مرة واحدة فقط
+
+        Args:
+            algorithm: الخوارزمية
+            path: مسار الملف الجزئي (مطلوب إذا كانت هناك بايتات محسوبة)
+        """
+        if algorithm in self._hashes:
+            return
+        hasher = _new_hash(algorithm)
+        if self.bytes_hashed:
+            _hash_prefix(path, self.bytes_hashed, [hasher])
+        self._hashes[algorithm] = hasher
+
+    def seed_from_file(self, path, length):
+        """
+        بدء الحساب من ملف جزئي موجود (إكمال بعد إعادة تشغيل البرنامج)
+
+        تُقرأ البادئة الموجودة مرة واحدة، والبقية تُحسب أثناء الكتابة،
+        فلا يُقرأ أي بايت مرتين
+
+        Args:
+            path: مسار الملف الجزئي
+            length: عدد البايتات الموجودة
+        """
+        self.reset()
+        _hash_prefix(path, length, list(self._hashes.values()))
+        self.bytes_hashed = length
+
+    def hexdigest(self, algorithm=None):
+        """البصمة الست عشرية (افتراضياً لأول خوارزمية)"""
+        algorithm = algorithm or self.algorithms[0]
+        return self._hashes[algorithm].hexdigest()
+
+    def digests(self):
+        """كل البصمات كقاموس {الخوارزمية: البصمة}"""
+        return {algorithm: hasher.hexdigest() for algorithm, hasher in self._hashes.items()}
+
+
+def _hash_prefix(path, length, hashers):
+    """قراءة أول length بايت من الملف وإضافتها إلى البصمات"""
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(_READ_CHUNK, remaining))
+            if not chunk:
+                raise ChecksumError(f"Partial file shorter than expected: {path}")
+            for hasher in hashers:
+                hasher.update(chunk)
+            remaining -= len(chunk)
+
+
+def _b64_to_hex(value):
+    try:
+        return binascii.hexlify(base64.b64decode(value.strip(), validate=True)).decode("ascii")
+    except (binascii.Error, ValueError):
+        return None
+
+
+def normalize_expected(value, algorithm=None):
+    """
+    تحويل بصمة متوقعة إلى (الخوارزمية، بصمة ست عشرية)
+
+    تقبل "sha256:abc..." أو "sha256=abc..." أو بصمة ست عشرية فقط
+
+    Returns:
+        tuple: (algorithm, hexdigest) أو None إذا تعذر التحليل
+    """
+    if not value:
+        return None
+    value = value.strip()
+    match = re.match(r"^([A-Za-z0-9-]+)[:=](.+)$", value)
+    if match:
+        name = match.group(1).lower()
+        algorithm = _DIGEST_HEADER_NAMES.get(name, name.replace("-", ""))
+        value = match.group(2).strip()
+    if re.fullmatch(r"[0-9a-fA-F]+", value):
+        algorithm = algorithm or _HEX_LENGTHS.get(len(value))
+        hexdigest = value.lower()
+    else:
+        hexdigest = _b64_to_hex(value)
+    if not algorithm or not hexdigest or algorithm not in SUPPORTED_ALGORITHMS:
+        return None
+    return algorithm, hexdigest
+
+
+def expected_from_headers(headers, partial=False):
+    """
+    استخراج البصمة المتوقعة من ترويسات الخادم
+
+    Args:
+        headers: ترويسات الاستجابة
+        partial: هل الاستجابة جزئية (206)؛ Content-MD5 يصف الجزء فقط فيُتجاهل
+
+    Returns:
+        tuple: (algorithm, hexdigest) أو None
+    """
+    checksum = headers.get("X-Checksum")
+    if checksum:
+        result = normalize_expected(checksum)
+        if result:
+            return result
+
+    digest = headers.get("Digest")
+    if digest:
+        # مثل: "sha-256=base64..., md5=base64..." نفضل أقوى خوارزمية
+        candidates = {}
+        for item in digest.split(","):
+            name, _, value = item.strip().partition("=")
+            algorithm = _DIGEST_HEADER_NAMES.get(name.strip().lower())
+            hexdigest = _b64_to_hex(value) if algorithm else None
+            if hexdigest:
+                candidates[algorithm] = hexdigest
+        for algorithm in ("sha512", "sha256", "sha1", "md5"):
+            if algorithm in candidates:
+                return algorithm, candidates[algorithm]
+
+    content_md5 = headers.get("Content-MD5")
+    if content_md5 and not partial:
+        hexdigest = _b64_to_hex(content_md5)
+        if hexdigest:
+            return "md5", hexdigest
+    return None
+
+
+def sidecar_path(path, algorithm=DEFAULT_ALGORITHM):
+    """مسار الملف الجانبي للبصمة (مثل video.mp4.sha256)"""
+    return f"{path}.{algorithm}"
+
+
+def write_sidecar(path, hexdigest, algorithm=DEFAULT_ALGORITHM):
+    """
+    حفظ البصمة في ملف جانبي بصيغة sha256sum
+
+    Returns:
+        str: مسار الملف الجانبي
+    """
+    sidecar = sidecar_path(path, algorithm)
+    with open(sidecar, "w", encoding="utf-8") as f:
+        f.write(f"{hexdigest} *{os.path.basename(path)}\n")
+    return sidecar
+
+
+def read_sidecar(path, algorithm=DEFAULT_ALGORITHM):
+    """
+    قراءة البصمة من الملف الجانبي
+
+    Returns:
+        str: البصمة أو None إذا لم يوجد الملف
+    """
+    try:
+        with open(sidecar_path(path, algorithm), encoding="utf-8") as f:
+            return f.read().split()[0].lower()
+    except (OSError, IndexError):
+        return None
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+واجهة سطر الأوامر غير التفاعلية
+Command Line Interface
+
+أوامر info و download و batch و resume للسكربتات وخطوط المعالجة: لا أسئلة
+تفاعلية، الأحداث والتقدم بصيغة NDJSON (سطر JSON لكل حدث) على stdout،
+ورموز خروج تفرق بين الفشل المؤقت والدائم. لا تستورد tkinter فتبدأ بسرعة
+على الخوادم بدون شاشة
+
+أمثلة:
+    python cli.py info URL...
+    python cli.py download URL --policy 720p --output DIR --interval 0.5
+    python cli.py batch --file urls.txt --format bestaudio
+    python cli.py resume
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+
+import jobs
+from jobs import JobJournal, ProgressBoard, new_job_id
+from retry import RETRYABLE, TRANSIENT
+from utils import validate_url, unique_urls, get_default_download_path
+
+# رموز الخروج
+EXIT_OK = 0
+EXIT_PERMANENT = 1      # فشل دائم: لا فائدة من إعادة التشغيل
+EXIT_USAGE = 2          # معاملات خاطئة
+EXIT_TRANSIENT = 75     # فشل مؤقت: أعد التشغيل لاحقاً (EX_TEMPFAIL)
+EXIT_INTERRUPTED = 130  # أوقف بواسطة المستخدم (Ctrl+C)
+
+# الفترة الافتراضية بين أحداث التقدم (ثوانٍ)
+DEFAULT_INTERVAL = 1.0
+
+# حقول صف لوحة التقدم في أحداث progress
+PROGRESS_EVENT_FIELDS = ("state", "progress", "downloaded", "total", "speed", "eta")
+
+
+class EventWriter:
+    def __init__(self, stream=None):
+        """
+        كاتب أحداث NDJSON (آمن من عدة خيوط)
+
+        Args:
+            stream: مجرى الكتابة (افتراضياً stdout)
+        """
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        """كتابة حدث واحد في سطر مستقل"""
+        record = {"event": event, "t": round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class ProgressEmitter:
+    def __init__(self, board, events, interval=DEFAULT_INTERVAL):
+        """
+        خيط يكتب الصفوف المتغيرة في لوحة التقدم كل interval ثانية
+
+        التحديثات بين فترتين تُدمج في حدث واحد لكل مهمة، فمعدل الأحداث
+        لا يتبع سرعة مخرجات yt-dlp
+
+        Args:
+            board: لوحة التقدم (ProgressBoard)
+            events: كاتب الأحداث
+            interval: الفترة بين الدفعات
+        """
+        self.board = board
+        self.events = events
+        self.interval = max(0.05, interval)
+        self._version = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """كتابة التغييرات المعلقة الآن"""
+        self._version, changed, _ = self.board.changes(self._version)
+        for job_id, row in changed.items():
+            fields = {key: row.get(key) for key in PROGRESS_EVENT_FIELDS}
+            for key in ("progress", "speed", "eta"):
+                if fields[key] is not None:
+                    fields[key] = round(fields[key], 2)
+            self.events.emit("progress", job_id=job_id, url=row.get("url"), **fields)
+
+    def stop(self):
+        """إيقاف الخيط بعد كتابة آخر التغييرات"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(self.interval + 1)
+        self.flush()
+
+
+def exit_code_for(results):
+    """
+    رمز الخروج لمجموعة نتائج
+
+    الفشل المؤقت يتقدم على الدائم لأن إعادة التشغيل (resume) تفيد فيه
+
+    Args:
+        results: قائمة رموز خروج المهام
+
+    Returns:
+        int: رمز الخروج الكلي
+    """
+    if EXIT_TRANSIENT in results:
+        return EXIT_TRANSIENT
+    if any(code != EXIT_OK for code in results):
+        return EXIT_PERMANENT
+    return EXIT_OK
+
+
+class CliRunner:
+    def __init__(self, events=None, interval=DEFAULT_INTERVAL, downloader_factory=None,
+                 journal=None):
+        """
+        تنفيذ أوامر سطر الأوامر مع لوحة تقدم مركزية وسجل المهام
+
+        Args:
+            events: كاتب الأحداث (افتراضياً NDJSON على stdout)
+            interval: الفترة بين أحداث التقدم
+            downloader_factory: دالة تُنشئ VideoDownloader من معاملاته (للاختبارات)
+            journal: سجل المهام (افتراضياً السجل في مجلد الحالة)
+        """
+        self.events = events or EventWriter()
+        self.interval = interval
+        self.board = ProgressBoard()
+        self.journal = journal
+        self._downloader_factory = downloader_factory
+        self._downloader = None
+        self._current = None  # معرف المهمة الجارية
+
+    @property
+    def downloader(self):
+        """المحمّل (يُنشأ عند أول حاجة إليه)"""
+        if self._downloader is None:
+            factory = self._downloader_factory
+            if factory is None:
+                from downloader import VideoDownloader as factory
+            self._downloader = factory(progress_callback=self._on_progress,
+                                       checkpoint_callback=self._on_checkpoint)
+        return self._downloader
+
+    def _journal(self):
+        if self.journal is None:
+            self.journal = JobJournal()
+        return self.journal
+
+    def _on_progress(self, percentage):
+        if self._current is not None:
+            self.board.update(self._current, progress=percentage)
+
+    def _on_checkpoint(self, downloaded_bytes, total_bytes):
+        job_id = self._current
+        if job_id is not None:
+            self._journal().checkpoint(job_id, downloaded_bytes, total_bytes)
+            self.board.update(job_id, downloaded=downloaded_bytes, total=total_bytes or None)
+
+    def info(self, urls, timeout=None):
+        """
+        جلب معلومات الروابط بعملية yt-dlp واحدة (حدث info لكل رابط)
+
+        Returns:
+            int: رمز الخروج
+        """
+        results = []
+        failures = {}
+        for url, info in self.downloader.iter_videos_info(urls, per_url_timeout=timeout,
+                                                          failures=failures):
+            if info is None:
+                # المهلة وأخطاء الشبكة مؤقتة، والفيديو غير المتاح دائم
+                kind = failures.get(url, TRANSIENT)
+                transient = kind in RETRYABLE
+                self.events.emit("info", url=url, ok=False, transient=transient, kind=kind)
+                results.append(EXIT_TRANSIENT if transient else EXIT_PERMANENT)
+                continue
+            options = self.downloader.get_quality_options(info.get("formats", []))
+            self.events.emit("info", url=url, ok=True, title=info.get("title"),
+                             uploader=info.get("uploader"), duration=info.get("duration"),
+                             options=[{"format_id": option["format_id"], "type": option["type"],
+                                       "label": option["label"]} for option in options])
+            results.append(EXIT_OK)
+        return exit_code_for(results)
+
+    def download(self, url, save_path, format_id=None, policy=None, job_id=None,
+                 option=None, title=None):
+        """
+        تحميل رابط واحد مع أحداث start ثم progress ثم done أو failed
+
+        المهمة تُسجل في سجل المهام؛ الفشل المؤقت يُعاد إلى الطابور (queued)
+        حتى يكملها أمر resume، والإيقاف بـ Ctrl+C يسجلها متوقفة (paused)
+
+        Returns:
+            int: رمز الخروج
+        """
+        job_id = job_id or new_job_id()
+        downloader = self.downloader
+        info = None
+        if option is None:
+            option, info = downloader.resolve_quality(url, format_id, policy)
+            title = title or (info or {}).get("title")
+        fields = {"url": url, "save_path": save_path, "option": option, "title": title,
+                  "quality": policy}
+        journal = self._journal()
+        journal.record(job_id, jobs.RUNNING, **fields)
+        self.board.update(job_id, url=url, title=title, state=jobs.RUNNING)
+        self.events.emit("start", job_id=job_id, url=url, title=title,
+                         format=option.get("format_id"), save_path=save_path)
+
+        self._current = job_id
+        emitter = ProgressEmitter(self.board, self.events, self.interval).start()
+        try:
+            success = downloader.download(url, save_path, selected_quality=option, info=info)
+        except KeyboardInterrupt:
+            # الملف الجزئي يبقى ويكمله أمر resume
+            downloader.pause_download()
+            journal.record(job_id, jobs.PAUSED, **fields)
+            self.board.update(job_id, state=jobs.PAUSED)
+            self.events.emit("interrupted", job_id=job_id, url=url)
+            raise
+        finally:
+            self._current = None
+            emitter.stop()
+
+        metrics = downloader.retry_metrics
+        if success:
+            state, code = jobs.COMPLETED, EXIT_OK
+        elif metrics.last_kind in RETRYABLE:
+            state, code = jobs.QUEUED, EXIT_TRANSIENT
+        else:
+            state, code = jobs.FAILED, EXIT_PERMANENT
+        journal.record(job_id, state, retry=metrics.as_dict(), error=metrics.last_error,
+                       **fields)
+        if success:
+            self.events.emit("done", job_id=job_id, url=url, retry=metrics.as_dict())
+        else:
+            self.events.emit("failed", job_id=job_id, url=url,
+                             transient=code == EXIT_TRANSIENT,
+                             kind=metrics.last_kind, error=metrics.last_error)
+        return code
+
+    def batch(self, urls, save_path, format_id=None, policy=None):
+        """
+        تحميل عدة روابط بالترتيب (الروابط المكررة تُحمل مرة واحدة)
+
+        Returns:
+            int: رمز الخروج الكلي
+        """
+        results = [self.download(url, save_path, format_id, policy) for url in urls]
+        self.events.emit("summary", total=len(results), completed=results.count(EXIT_OK),
+                         failed=len(results) - results.count(EXIT_OK),
+                         transient=results.count(EXIT_TRANSIENT))
+        return exit_code_for(results)
+
+    def resume(self, save_path=None):
+        """
+        استئناف كل المهام غير المكتملة في سجل المهام (من الواجهة أو سطر الأوامر)
+
+        المهمة بلا خيار جودة محفوظ تُستأنف بسياسة جودتها، والسجل لا يُضغط إذا
+        كانت عملية أخرى تفتحه
+
+        Returns:
+            int: رمز الخروج الكلي
+        """
+        journal = self._journal()
+        results = []
+        for job in journal.unfinished():
+            if not job.get("url"):
+                journal.record(job["job_id"], jobs.CANCELLED)
+                continue
+            results.append(self.download(job["url"], job.get("save_path") or save_path,
+                                         policy=job.get("quality"), job_id=job["job_id"],
+                                         option=job.get("option"), title=job.get("title")))
+        journal.compact()
+        self.events.emit("summary", total=len(results), completed=results.count(EXIT_OK),
+                         failed=len(results) - results.count(EXIT_OK),
+                         transient=results.count(EXIT_TRANSIENT))
+        return exit_code_for(results)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+
+def read_urls(urls, path=None):
+    """
+    الروابط من المعاملات ومن ملف (سطر لكل رابط، "-" لـ stdin)
+
+    Returns:
+        tuple: (الروابط الصالحة دون تكرار، عدد الروابط غير الصالحة)
+    """
+    urls = list(urls)
+    if path:
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            urls += [line.strip() for line in stream
+                     if line.strip() and not line.startswith("#")]
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+    valid = [url for url in urls if validate_url(url)]
+    return unique_urls(valid), len(urls) - len(valid)
+
+
+def build_parser():
+    """معاملات سطر الأوامر"""
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="Non-interactive video downloader (NDJSON events on stdout)")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    def add_selection(command):
+        selection = command.add_mutually_exclusive_group()
+        selection.add_argument("--format", dest="format_id", metavar="ID",
+                               help="explicit yt-dlp format id or selector (e.g. 137+140)")
+        # بلا قيمة افتراضية حتى يكشف argparse تعارضه مع --format (السياسة الافتراضية best)
+        selection.add_argument("--policy",
+                               help="quality policy: best (default), worst, audio or max height "
+                                    "like 720p")
+
+    def add_output(command):
+        command.add_argument("--output", "-o", metavar="DIR",
+                             help="save directory (default: Downloads)")
+        command.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                             help="seconds between progress events")
+
+    info = commands.add_parser("info", help="print video info as NDJSON")
+    info.add_argument("urls", nargs="*", metavar="URL")
+    info.add_argument("--file", help="file with one URL per line ('-' for stdin)")
+    info.add_argument("--timeout", type=float, help="per-URL extraction timeout")
+
+    download = commands.add_parser("download", help="download one URL")
+    download.add_argument("url", metavar="URL")
+    add_selection(download)
+    add_output(download)
+
+    batch = commands.add_parser("batch", help="download many URLs in order")
+    batch.add_argument("urls", nargs="*", metavar="URL")
+    batch.add_argument("--file", help="file with one URL per line ('-' for stdin)")
+    add_selection(batch)
+    add_output(batch)
+
+    resume = commands.add_parser("resume", help="resume unfinished jobs from the journal")
+    add_output(resume)
+    return parser
+
+
+def main(argv=None, events=None, downloader_factory=None):
+    """
+    الدالة الرئيسية
+
+    Returns:
+        int: رمز الخروج
+    """
+    args = build_parser().parse_args(argv)
+    runner = CliRunner(events, args.interval if hasattr(args, "interval") else DEFAULT_INTERVAL,
+                       downloader_factory)
+    try:
+        if args.command in ("info", "batch"):
+            urls, invalid = read_urls(args.urls, args.file)
+            if invalid:
+                runner.events.emit("warning", message=f"{invalid} invalid URL(s) skipped")
+            if not urls:
+                runner.events.emit("error", message="no valid URLs")
+                return EXIT_USAGE
+        if args.command == "info":
+            return runner.info(urls, args.timeout)
+
+        save_path = args.output or get_default_download_path()
+        if args.command == "download":
+            if not validate_url(args.url):
+                runner.events.emit("error", message=f"invalid URL: {args.url}")
+                return EXIT_USAGE
+            return runner.download(args.url, save_path, args.format_id, args.policy)
+        if args.command == "batch":
+            return runner.batch(urls, save_path, args.format_id, args.policy)
+        return runner.resume(save_path)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except OSError as e:
+        runner.events.emit("error", message=str(e))
+        return EXIT_PERMANENT
+    finally:
+        runner.close()
+
+
+if __name__ == "__main__":
+    # مطلوب لمجمع عمليات المعالجة اللاحقة في الملف التنفيذي
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
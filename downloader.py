@@ -8,41 +8,501 @@ Video Downloader Module
 """
 
 import os
+import re
 import sys
-import json
 import time
 import threading
+import glob
 import subprocess
 from pathlib import Path
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 import requests
 from urllib.parse import urlparse
 
+import logger
+from utils import parse_size, normalize_url
+from checksum import (StreamingHasher, DEFAULT_ALGORITHM, normalize_expected,
+                      expected_from_headers, write_sidecar)
+from retry import (RetryPolicy, RetryMetrics, DownloadFailure, classify_output,
+                   run_with_retry, TRANSIENT)
+from postprocess import get_postprocessor, ffmpeg_available, audio_container
+from formats import (compact_info, iter_json_lines, shared_raw_store,
+                     MAX_JSON_LINE_BYTES)
+
+# رسالة فشل yt-dlp لفيديو: "ERROR: [youtube] VIDEO_ID: Video unavailable"
+_EXTRACT_ERROR_ID = re.compile(r"ERROR: \[[^\]]+\] ([^:\s]+):")
+
+# بروتوكولات التنسيقات المجزأة (HLS/DASH)
+FRAGMENTED_PROTOCOLS = ("m3u8", "http_dash_segments", "dash", "ism", "f4m")
+
+# عدد الأجزاء المتزامنة الافتراضي لكل تحميل
+DEFAULT_CONCURRENT_FRAGMENTS = 4
+
+# الحد الأقصى لمجموع اتصالات الأجزاء عبر كل التحميلات الجارية
+MAX_TOTAL_FRAGMENT_CONNECTIONS = 16
+
+class ConnectionBudget:
+    def __init__(self, total):
+        """
+        مجمع مشترك لاتصالات الأجزاء تحجز منه كل عملية تحميل وتعيد إليه
+        
+        Args:
+            total: الحد الأقصى لمجموع الاتصالات
+        """
+        self.total = total
+        self.in_use = 0
+        self._lock = threading.Lock()
+        
+    def reserve(self, wanted):
+        """
+        حجز اتصالات لعملية واحدة
+        
+        Args:
+            wanted: عدد الاتصالات المطلوب
+            
+        Returns:
+            int: عدد الاتصالات المحجوزة (0 إذا لم يتبق ما يكفي للتوازي)
+        """
+        with self._lock:
+            granted = min(wanted, self.total - self.in_use)
+            if granted <= 1:
+                return 0
+            self.in_use += granted
+            return granted
+            
+    def release(self, granted):
+        """إعادة اتصالات محجوزة إلى المجمع"""
+        if granted:
+            with self._lock:
+                self.in_use = max(0, self.in_use - granted)
+                
+# المجمع المشترك بين كل كائنات التحميل
+shared_fragment_budget = ConnectionBudget(MAX_TOTAL_FRAGMENT_CONNECTIONS)
+
+class MetadataCache:
+    def __init__(self, max_entries=64, ttl=1800):
+        """
+        ذاكرة مؤقتة لمعلومات الفيديوهات المجلوبة
+        
+        Args:
+            max_entries: الحد الأقصى لعدد الروابط المحفوظة
+            ttl: مدة صلاحية المعلومات بالثواني (الروابط الموقعة تنتهي صلاحيتها)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        
+    @staticmethod
+    def key_for(url):
+        """مفتاح الرابط: الصيغة الموحدة حتى تشترك صيغ نفس الفيديو في مدخل واحد"""
+        return normalize_url(url) or url
+        
+    def get(self, url):
+        """إرجاع المعلومات المحفوظة للرابط أو None"""
+        url = self.key_for(url)
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            stored_at, info = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[url]
+                return None
+            self._entries.move_to_end(url)
+            return info
+            
+    def put(self, url, info):
+        """حفظ معلومات الرابط (بالتمثيل المضغوط وليس قاموس yt-dlp الكامل)"""
+        url = self.key_for(url)
+        info = compact_info(info)
+        with self._lock:
+            self._entries[url] = (time.monotonic(), info)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                
+    def invalidate(self, url):
+        """حذف معلومات الرابط"""
+        url = self.key_for(url)
+        with self._lock:
+            self._entries.pop(url, None)
+            
+    def claim(self, url):
+        """
+        حجز الرابط للجلب
+        
+        Returns:
+            threading.Event: حدث الجلب الجاري إذا كان الرابط محجوزاً، أو None إذا تم الحجز
+        """
+        url = self.key_for(url)
+        with self._lock:
+            pending = self._inflight.get(url)
+            if pending is not None:
+                return pending
+            self._inflight[url] = threading.Event()
+            return None
+            
+    def release(self, url):
+        """إنهاء حجز الرابط وإيقاظ المنتظرين"""
+        url = self.key_for(url)
+        with self._lock:
+            pending = self._inflight.pop(url, None)
+        if pending is not None:
+            pending.set()
+            
+# الذاكرة المؤقتة المشتركة بين كل كائنات التحميل
+shared_info_cache = MetadataCache()
+
+# المهلة الافتراضية لجلب المعلومات حسب الموقع (بالثواني)
+SITE_INFO_TIMEOUTS = {
+    "youtube.com": 30,
+    "youtu.be": 30,
+    "vimeo.com": 30,
+    "dailymotion.com": 40,
+    "tiktok.com": 45,
+    "instagram.com": 45,
+    "twitter.com": 45,
+    "x.com": 45,
+    "facebook.com": 60,
+    "fb.watch": 60,
+}
+DEFAULT_INFO_TIMEOUT = 60
+MIN_INFO_TIMEOUT = 10
+MAX_INFO_TIMEOUT = 180
+
+class SiteTimeouts:
+    def __init__(self, defaults=None, factor=4.0, alpha=0.3):
+        """
+        مهلة جلب المعلومات المتكيفة مع كل موقع
+        
+        Args:
+            defaults: المهلة الابتدائية لكل نطاق
+            factor: مضاعف متوسط المدة المرصودة
+            alpha: معامل المتوسط المتحرك الأسي
+        """
+        self.defaults = dict(SITE_INFO_TIMEOUTS if defaults is None else defaults)
+        self.factor = factor
+        self.alpha = alpha
+        self._average = {}
+        self._lock = threading.Lock()
+        
+    def site_for(self, url):
+        """إرجاع النطاق المعروف للرابط أو اسم المضيف"""
+        host = (urlparse(url).hostname or "").lower()
+        for domain in self.defaults:
+            if host == domain or host.endswith("." + domain):
+                return domain
+        return host
+        
+    def timeout_for(self, url):
+        """
+        المهلة المناسبة للرابط
+        
+        Returns:
+            float: المهلة بالثواني
+        """
+        site = self.site_for(url)
+        with self._lock:
+            average = self._average.get(site)
+        if average is None:
+            return self.defaults.get(site, DEFAULT_INFO_TIMEOUT)
+        return min(MAX_INFO_TIMEOUT, max(MIN_INFO_TIMEOUT, average * self.factor))
+        
+    def record(self, url, duration):
+        """تسجيل مدة جلب فعلية لتحديث المتوسط"""
+        site = self.site_for(url)
+        with self._lock:
+            average = self._average.get(site)
+            if average is None:
+                self._average[site] = duration
+            else:
+                self._average[site] = self.alpha * duration + (1 - self.alpha) * average
+                
+# المهل المتكيفة المشتركة بين كل كائنات التحميل
+shared_site_timeouts = SiteTimeouts()
+
+class ExtractionTask:
+    def __init__(self, url, timeout):
+        """
+        مقبض مهمة جلب معلومات قابلة للإلغاء
+        
+        Args:
+            url: رابط الفيديو
+            timeout: المهلة القصوى بالثواني
+        """
+        self.url = url
+        self.timeout = timeout
+        self.cancel_event = threading.Event()
+        self.info = None
+        self._done = threading.Event()
+        self._process = None
+        self._lock = threading.Lock()
+        self._thread = None
+        
+    def start(self, target):
+        """تشغيل المهمة في خيط منفصل (target تستقبل المهمة نفسها)"""
+        self._thread = threading.Thread(target=self._run, args=(target,), daemon=True)
+        self._thread.start()
+        
+    def _run(self, target):
+        try:
+            self.info = target(self)
+        except Exception as e:
+            logger.error(f"Extraction task error: {e}", phase="extract")
+        finally:
+            self._done.set()
+            
+    def attach_process(self, process):
+        """ربط عملية yt-dlp بالمهمة حتى يمكن إنهاؤها عند الإلغاء"""
+        with self._lock:
+            self._process = process
+        if self.cancel_event.is_set():
+            self._kill()
+            
+    def _kill(self):
+        with self._lock:
+            process = self._process
+        if process is not None and process.poll() is None:
+            try:
+                process.kill()
+            except Exception:
+                pass
+                
+    def cancel(self):
+        """إلغاء المهمة وإنهاء عملية yt-dlp فوراً"""
+        self.cancel_event.set()
+        self._kill()
+        
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+        
+    def done(self):
+        return self._done.is_set()
+        
+    def wait(self, timeout=None):
+        """
+        انتظار انتهاء المهمة
+        
+        Returns:
+            dict: المعلومات أو None (فشل، إلغاء، أو لم تنته بعد)
+        """
+        if not self._done.wait(timeout):
+            return None
+        return None if self.cancelled else self.info
+
+# مهلة خروج عملية yt-dlp بعد طلب إنهائها قبل قتلها قسرياً (الثواني)
+TERMINATE_GRACE = 5
+
+# الحد الأقصى لمدة إيقاف كل التحميلات عند إغلاق البرنامج (الثواني)
+SHUTDOWN_TIMEOUT = 6
+
+# مدة عدم التقدم (لا مخرجات من yt-dlp) التي يُعد بعدها التحميل متوقفاً (الثواني)
+STALL_TIMEOUT = 120
+
+# مراحل المعالجة اللاحقة في yt-dlp: تعمل دون مخرجات تقدم فلا يُكشف فيها التوقف
+POSTPROCESS_PREFIXES = ("[Merger]", "[ffmpeg]", "[ExtractAudio]", "[Fixup", "[VideoRemuxer]",
+                        "[VideoConvertor]", "[EmbedThumbnail]", "[Metadata]")
+
+# نتيجة عملية أُنهيت لإعادة تشغيلها بإعدادات جديدة (مثل حد السرعة)
+RESTARTED = "restarted"
+
+class ProcessReaper:
+    def __init__(self, grace=TERMINATE_GRACE, interval=0.1):
+        """
+        إنهاء العمليات في الخلفية: طلب الإنهاء فوراً، ثم القتل القسري بعد المهلة
+        
+        بدلاً من انتظار كل عملية في خيط الواجهة (حتى 5 ثوانٍ لكل عملية)،
+        يتابع خيط واحد كل العمليات المطلوب إنهاؤها ويبلغ عند خروجها
+        
+        Args:
+            grace: المهلة قبل القتل القسري بالثواني
+            interval: فترة فحص العمليات
+        """
+        self.grace = grace
+        self.interval = interval
+        self._entries = []  # [العملية، وقت القتل القسري، المجموعة]
+        self._lock = threading.Lock()
+        self._thread = None
+        
+    def reap(self, processes, callback=None):
+        """
+        إنهاء مجموعة عمليات دون انتظار
+        
+        Args:
+            processes: العمليات
+            callback: دالة تُستدعى (في خيط الإنهاء) بعد خروج كل العمليات
+            
+        Returns:
+            threading.Event: يُضبط بعد خروج كل العمليات
+        """
+        group = {"pending": 0, "done": threading.Event(), "callback": callback}
+        deadline = time.monotonic() + self.grace
+        with self._lock:
+            for process in processes:
+                try:
+                    if process.poll() is None:
+                        process.terminate()
+                        self._entries.append([process, deadline, group])
+                        group["pending"] += 1
+                except Exception:
+                    pass
+            if group["pending"] and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="process-reaper",
+                                                daemon=True)
+                self._thread.start()
+        if not group["pending"]:
+            self._complete(group)
+        return group["done"]
+        
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            finished = []
+            with self._lock:
+                for entry in list(self._entries):
+                    process, deadline, group = entry
+                    if process.poll() is not None:
+                        self._entries.remove(entry)
+                        group["pending"] -= 1
+                        if not group["pending"]:
+                            finished.append(group)
+                    elif deadline is not None and now >= deadline:
+                        # العملية تجاهلت طلب الإنهاء
+                        logger.warning("Process ignored terminate, killing", phase="cancel")
+                        try:
+                            process.kill()
+                        except Exception:
+                            pass
+                        entry[1] = None
+                idle = not self._entries
+                if idle:
+                    # reap يبدأ خيطاً جديداً عند الحاجة
+                    self._thread = None
+            for group in finished:
+                self._complete(group)
+            if idle:
+                return
+                
+    def _complete(self, group):
+        group["done"].set()
+        if group["callback"]:
+            try:
+                group["callback"]()
+            except Exception as e:
+                logger.error(f"Reaper callback error: {e}", phase="cancel")
+                
+# خيط الإنهاء المشترك بين كل كائنات التحميل
+shared_reaper = ProcessReaper()
+
+def stop_downloaders(downloaders, cancel=False, timeout=SHUTDOWN_TIMEOUT):
+    """
+    إيقاف عدة تحميلات بالتوازي خلال مدة كلية محددة (مثل إغلاق البرنامج)
+    
+    Args:
+        downloaders: كائنات التحميل
+        cancel: الإلغاء بدلاً من الإيقاف المؤقت (الإيقاف يبقي الملفات الجزئية للاستئناف)
+        timeout: المدة الكلية القصوى بالثواني
+        
+    Returns:
+        bool: True إذا خرجت كل العمليات قبل انتهاء المدة
+    """
+    events = []
+    for downloader in downloaders:
+        if cancel:
+            events.append(downloader.cancel_download())
+        else:
+            downloader.pause_download()
+            events.append(downloader.processes_stopped)
+    deadline = time.monotonic() + timeout
+    for event in events:
+        if not event.wait(max(0, deadline - time.monotonic())):
+            logger.warning("Shutdown timed out waiting for downloads to stop", phase="cancel")
+            return False
+    return True
+
 class VideoDownloader:
-    def __init__(self, progress_callback=None, status_callback=None):
+    def __init__(self, progress_callback=None, status_callback=None,
+                 postprocessor=None, async_postprocess=False, postprocess_callback=None,
+                 concurrent_fragments=DEFAULT_CONCURRENT_FRAGMENTS, info_cache=None,
+                 fragment_budget=None, site_timeouts=None, checkpoint_callback=None,
+                 retry_policy=None, raw_store=None, worker_pool=None, reaper=None,
+                 stall_timeout=STALL_TIMEOUT, rate_limit=None):
         """
         تهيئة منزل الفيديوهات
         
         Args:
             progress_callback: دالة لتحديث التقدم (تستقبل نسبة مئوية)
             status_callback: دالة لتحديث الحالة (تستقبل نص الحالة)
+            postprocessor: مجمع المعالجة اللاحقة (افتراضياً المجمع المشترك)
+            async_postprocess: إنهاء التحميل قبل انتهاء الدمج ليبدأ التحميل التالي
+            postprocess_callback: دالة تُستدعى عند انتهاء المعالجة (تستقبل success, path_or_error)
+            concurrent_fragments: عدد أجزاء HLS/DASH المحملة بالتوازي (1 لتعطيله)
+            info_cache: ذاكرة معلومات الفيديوهات (افتراضياً الذاكرة المشتركة)
+            fragment_budget: مجمع اتصالات الأجزاء (افتراضياً المجمع المشترك)
+            site_timeouts: مهل جلب المعلومات لكل موقع (افتراضياً المهل المشتركة)
+            checkpoint_callback: دالة تستقبل (downloaded_bytes, total_bytes) لحفظ نقاط التقدم
+            retry_policy: سياسة إعادة المحاولة عند الأخطاء المؤقتة
+            raw_store: مخزن معلومات yt-dlp الكاملة على القرص (افتراضياً المخزن المشترك)
+            worker_pool: مجمع عمليات yt-dlp الجاهزة (None لتشغيل عملية جديدة لكل أمر)
+            reaper: خيط إنهاء العمليات في الخلفية (افتراضياً الخيط المشترك)
+            stall_timeout: إنهاء التحميل وإعادة محاولته بعد هذه المدة دون تقدم (None لتعطيله)
+            rate_limit: حد سرعة كل عملية yt-dlp بالبايت/ثانية (None بلا حد)
         """
         self.progress_callback = progress_callback
+        self.checkpoint_callback = checkpoint_callback
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_metrics = RetryMetrics()  # إحصائيات إعادة المحاولة للتحميل الحالي
+        self._byte_progress = {}  # التقدم بالبايت لكل مكون (حسب معرف التنسيق)
         self.status_callback = status_callback
         
+        # المعالجة اللاحقة (الدمج) في مرحلة منفصلة
+        self.postprocessor = postprocessor or get_postprocessor()
+        self.async_postprocess = async_postprocess
+        self.postprocess_callback = postprocess_callback
+        self.last_postprocess = None
+        self.last_checksum = None  # بصمة آخر ملف محمل بـ download_file
+        
+        # تحميل أجزاء HLS/DASH بالتوازي
+        self.concurrent_fragments = concurrent_fragments
+        self.fragment_budget = fragment_budget or shared_fragment_budget
+        
         # متغيرات التحكم في التحميل
         self.is_downloading = False
         self.is_paused = False
         self.is_cancelled = False
+        self.keep_partial = False  # إبقاء الملفات الجزئية عند الإلغاء
+        self._resume_event = threading.Event()  # مضبوط ما دام التحميل غير متوقف
+        self._resume_event.set()
         self.current_process = None
+        self.active_processes = []  # كل عمليات yt-dlp الجارية (مثل الفيديو والصوت معاً)
+        self._process_lock = threading.Lock()
         self.download_thread = None
+        self.reaper = reaper or shared_reaper
+        # يُضبط بعد خروج العمليات التي طُلب إنهاؤها آخر مرة (إيقاف أو إلغاء)
+        self.processes_stopped = threading.Event()
+        self.processes_stopped.set()
+        self.stall_timeout = stall_timeout
+        self.rate_limit = rate_limit
+        self._restarting = set()  # عمليات أُنهيت لإعادة تشغيلها وليس لإيقافها
         
         # معلومات التحميل الحالي
         self.current_info = None
+        self.info_cache = info_cache if info_cache is not None else shared_info_cache
+        self.raw_store = raw_store if raw_store is not None else shared_raw_store
+        self.site_timeouts = site_timeouts or shared_site_timeouts
+        self.info_tasks = set()  # مهام جلب المعلومات الجارية
         self.download_path = None
         self.temp_path = None
+        self.worker_pool = worker_pool
         
         # التحقق من وجود yt-dlp
-        self._check_ytdlp()
+        if worker_pool is None:
+            self._check_ytdlp()
         
     def _check_ytdlp(self):
         """التحقق من وجود yt-dlp وتثبيته إذا لزم الأمر"""
@@ -50,60 +510,437 @@ class VideoDownloader:
             result = subprocess.run(["yt-dlp", "--version"],
                                   capture_output=True, text=True, timeout=10)
             if result.returncode == 0:
-                print(f"yt-dlp version: {result.stdout.strip()}")
+                logger.info(f"yt-dlp version: {result.stdout.strip()}", phase="setup")
                 return True
         except (subprocess.TimeoutExpired, FileNotFoundError):
             pass
             
         # محاولة تثبيت yt-dlp
         try:
-            print("Installing yt-dlp...")
+            logger.info("Installing yt-dlp...", phase="setup")
             subprocess.run([sys.executable, "-m", "pip", "install", "yt-dlp"],
                           check=True, capture_output=True)
             return True
         except subprocess.CalledProcessError as e:
-            print(f"Failed to install yt-dlp: {e}")
+            logger.error(f"Failed to install yt-dlp: {e}", phase="setup")
             return False
             
-    def get_video_info(self, url):
+    def _popen(self, cmd, **kwargs):
+        """
+        تشغيل أمر yt-dlp: في مجمع العمليات الجاهزة إن وجد، وإلا في عملية جديدة
+        
+        Returns:
+            عملية بواجهة subprocess.Popen
+        """
+        if self.worker_pool is not None and kwargs.get("stdin") != subprocess.PIPE:
+            return self.worker_pool.popen(cmd, **kwargs)
+        return subprocess.Popen(cmd, **kwargs)
+        
+    def get_video_info(self, url, cancel_event=None, use_cache=True, timeout=None):
         """
         جلب معلومات الفيديو من الرابط
         
         Args:
             url: رابط الفيديو
+            cancel_event: حدث (threading.Event) لإلغاء الجلب الجاري
+            use_cache: استخدام ذاكرة المعلومات المؤقتة
+            timeout: المهلة القصوى بالثواني (افتراضياً مهلة تتكيف مع الموقع)
+            
+        Returns:
+            CompactInfo: معلومات الفيديو المضغوطة أو None في حالة الفشل
+        """
+        task = self.start_info_task(url, timeout=timeout, use_cache=use_cache)
+        while not task.done():
+            if cancel_event is not None and cancel_event.is_set():
+                task.cancel()
+            task.wait(0.1)
+        info = task.wait()
+        if info:
+            self.current_info = info
+        return info
+        
+    def prefetch_video_info(self, url, cancel_event=None):
+        """
+        جلب معلومات الفيديو مسبقاً إلى الذاكرة المؤقتة دون تغيير المعلومات الحالية
+        
+        Args:
+            url: رابط الفيديو
+            cancel_event: حدث لإلغاء الجلب إذا تغير الرابط
+            
+        Returns:
+            CompactInfo: معلومات الفيديو المضغوطة أو None في حالة الفشل أو الإلغاء
+        """
+        return self._fetch_info(url, cancel_event, use_cache=True)
+        
+    def start_info_task(self, url, timeout=None, use_cache=True):
+        """
+        بدء جلب المعلومات كمهمة قابلة للإلغاء
+        
+        Args:
+            url: رابط الفيديو
+            timeout: المهلة القصوى بالثواني (مثل مهلة كل رابط في التحميل الجماعي)
+            use_cache: استخدام ذاكرة المعلومات المؤقتة
+            
+        Returns:
+            ExtractionTask: مقبض المهمة (cancel و wait)
+        """
+        timeout = timeout or self.site_timeouts.timeout_for(url)
+        
+        def target(task):
+            try:
+                return self._fetch_info(url, task.cancel_event, use_cache, timeout,
+                                        task.attach_process)
+            finally:
+                with self._process_lock:
+                    self.info_tasks.discard(task)
+                    
+        task = ExtractionTask(url, timeout)
+        with self._process_lock:
+            self.info_tasks.add(task)
+        task.start(target)
+        return task
+        
+    def get_videos_info(self, urls, per_url_timeout=None, max_parallel=4, cancel_event=None):
+        """
+        جلب معلومات عدة روابط مع مهلة مستقلة لكل رابط
+        
+        كل رابط يعمل كمهمة قابلة للإلغاء، والرابط الذي يتجاوز مهلته تُنهى
+        عمليته فوراً دون أن يؤخر بقية الروابط
+        
+        Args:
+            urls: قائمة الروابط
+            per_url_timeout: المهلة القصوى لكل رابط (افتراضياً مهلة الموقع)
+            max_parallel: عدد الروابط التي تُجلب في نفس الوقت
+            cancel_event: حدث لإلغاء الدفعة كلها
             
         Returns:
-            dict: معلومات الفيديو أو None في حالة الفشل
+            dict: معلومات كل رابط أو None إذا فشل أو تجاوز مهلته
         """
+        results = {url: None for url in urls}
+        pending = list(results)
+        running = {}  # task -> وقت انتهاء المهلة
+        
         try:
-            cmd = [
-                "yt-dlp",
-                "--dump-json",
-                "--no-playlist",
-                url
-            ]
+            while pending or running:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                while pending and len(running) < max(1, max_parallel):
+                    task = self.start_info_task(pending.pop(0), timeout=per_url_timeout)
+                    running[task] = time.monotonic() + task.timeout
+                    
+                now = time.monotonic()
+                for task, deadline in list(running.items()):
+                    if task.done():
+                        results[task.url] = task.wait()
+                        del running[task]
+                    elif now > deadline:
+                        # احتياط: المهلة تُفرض داخل المهمة، لكن لا نترك عملية معلقة
+                        logger.warning(f"Info deadline exceeded: {task.url}", phase="extract")
+                        task.cancel()
+                        del running[task]
+                time.sleep(0.05)
+        finally:
+            for task in running:
+                task.cancel()
+        return results
+        
+    def cancel_info_fetches(self):
+        """إلغاء كل عمليات جلب المعلومات الجارية فوراً"""
+        with self._process_lock:
+            tasks = list(self.info_tasks)
+        for task in tasks:
+            task.cancel()
+        
+    def _fetch_info(self, url, cancel_event=None, use_cache=True, timeout=None, on_process=None):
+        """جلب المعلومات مع الذاكرة المؤقتة ومنع تكرار الجلب لنفس الرابط"""
+        while use_cache:
+            cached = self.info_cache.get(url)
+            if cached:
+                return cached
+                
+            # إذا كان هناك جلب جارٍ لنفس الرابط (مثل الجلب المسبق) ننتظره
+            pending = self.info_cache.claim(url)
+            if pending is None:
+                break
+            while not pending.wait(0.1):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                    
+        try:
+            info = self._extract_info(url, cancel_event, timeout, on_process)
+            if info and use_cache:
+                self.info_cache.put(url, info)
+            return info
+        finally:
+            if use_cache:
+                self.info_cache.release(url)
+                
+    def _extract_info(self, url, cancel_event=None, timeout=None, on_process=None):
+        """
+        تشغيل yt-dlp لاستخراج معلومات فيديو واحد مع إمكانية الإلغاء
+        
+        Args:
+            url: رابط الفيديو
+            cancel_event: حدث الإلغاء
+            timeout: المهلة القصوى بالثواني
+            on_process: دالة تستقبل العملية فور تشغيلها (لإنهائها عند الإلغاء)
+        """
+        entries = self.iter_video_entries(url, cancel_event, timeout, playlist=False,
+                                          on_process=on_process)
+        try:
+            return next(entries, None)
+        finally:
+            entries.close()
             
-            # زيادة المهلة إلى 60 ثانية
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    def iter_video_entries(self, url, cancel_event=None, timeout=None, playlist=True,
+                           on_process=None, max_line_bytes=MAX_JSON_LINE_BYTES):
+        """
+        استخراج معلومات كل فيديوهات الرابط (مثل قائمة تشغيل) وإرجاعها تدريجياً
+        
+        yt-dlp يكتب سطر JSON لكل فيديو، فيُحلل كل سطر فور وصوله دون انتظار
+        انتهاء العملية أو تحميل كل المخرجات في الذاكرة
+        
+        Args:
+            url: الرابط
+            cancel_event: حدث الإلغاء
+            timeout: أقصى مدة انتظار للمدخل التالي بالثواني (لا يُحسب وقت معالجة المستهلك)
+            playlist: استخراج كل فيديوهات القائمة أو الفيديو المحدد فقط
+            on_process: دالة تستقبل العملية فور تشغيلها
+            max_line_bytes: أقصى حجم لسطر JSON واحد
             
-            if result.returncode == 0:
-                info = json.loads(result.stdout)
-                self.current_info = info
-                return info
-            else:
-                print(f"yt-dlp error: {result.stderr}")
-                return None
+        Yields:
+            CompactInfo: معلومات كل فيديو فور وصولها
+        """
+        timeout = timeout or self.site_timeouts.timeout_for(url)
+        cmd = ["yt-dlp", "--dump-json", "--yes-playlist" if playlist else "--no-playlist", url]
+        started = time.monotonic()
+        state = {}
+        count = 0
+        entries = self._stream_json(cmd, state, cancel_event, timeout, on_process,
+                                    max_line_bytes=max_line_bytes)
+        try:
+            for entry in entries:
+                # نحتفظ في الذاكرة بجدول التنسيقات المضغوط فقط، والنص الكامل على القرص
+                info = compact_info(entry, self.raw_store)
+                count += 1
+                if count == 1:
+                    duration = time.monotonic() - started
+                    self.site_timeouts.record(url, duration)
+                    logger.info(f"Fetched video info: {url}", phase="extract", duration=duration)
+                yield info
                 
-        except subprocess.TimeoutExpired:
-            print("Timeout while fetching video info")
-            return None
-        except json.JSONDecodeError:
-            print("Failed to parse video info JSON")
-            return None
+            if state.get("reason") == "cancelled":
+                logger.debug(f"Cancelled video info fetch: {url}", phase="extract")
+            elif state.get("reason") == "timeout":
+                if not count:
+                    self.site_timeouts.record(url, timeout)
+                logger.warning(f"Timeout while fetching video info ({timeout:.0f}s)",
+                               phase="extract")
+            elif state.get("returncode") and not count:
+                logger.error(f"yt-dlp error: {' | '.join(state['stderr'])}", phase="extract")
+            elif count > 1:
+                logger.info(f"Extracted {count} entries: {url}", phase="extract")
         except Exception as e:
-            print(f"Error fetching video info: {e}")
-            return None
+            logger.error(f"Error fetching video info: {e}", phase="extract")
+        finally:
+            entries.close()
+            
+    def iter_videos_info(self, urls, cancel_event=None, per_url_timeout=None, use_cache=True,
+                         max_line_bytes=MAX_JSON_LINE_BYTES, failures=None):
+        """
+        جلب معلومات عدد كبير من الروابط بعملية yt-dlp واحدة (ملف دفعة)
+        
+        بدلاً من تشغيل yt-dlp لكل رابط (وتكرار وقت بدء Python وتحميل
+        المستخرجات)، تُمرر الروابط كلها إلى عملية واحدة تكتب سطر JSON لكل
+        فيديو، وتُرجع النتيجة فور وصولها. الرابط الذي يفشل لا يوقف الدفعة،
+        والرابط الذي يتجاوز مهلته تُنهى عمليته وتُستأنف الدفعة من الرابط التالي
+        
+        Args:
+            urls: الروابط (فيديو واحد لكل رابط، بدون قوائم التشغيل)
+            cancel_event: حدث لإلغاء الدفعة كلها
+            per_url_timeout: أقصى مدة انتظار لكل رابط (افتراضياً أطول مهلة بين مواقع الدفعة)
+            use_cache: استخدام ذاكرة المعلومات المؤقتة
+            max_line_bytes: أقصى حجم لسطر JSON واحد
+            failures: قاموس يُملأ بنوع فشل كل رابط فاشل (المهلة مؤقتة، والباقي
+                      من رسالة yt-dlp عنه، وبلا رسالة مؤقت)
+            
+        Yields:
+            tuple: (الرابط، CompactInfo أو None إذا فشل) بترتيب الروابط
+        """
+        failures = {} if failures is None else failures
+        pending = []
+        for url in urls:
+            cached = self.info_cache.get(url) if use_cache else None
+            if cached:
+                yield url, cached
+            else:
+                pending.append(url)
+                
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            timeout = per_url_timeout or max(self.site_timeouts.timeout_for(url)
+                                             for url in pending)
+            # موضع كل رابط في الدفعة (لمطابقة المدخلات مع روابطها)
+            positions = {}
+            for index, url in enumerate(pending):
+                positions.setdefault(MetadataCache.key_for(url), deque()).append(index)
+            cmd = ["yt-dlp", "--dump-json", "--no-playlist", "--ignore-errors",
+                   "--batch-file", "-"]
+            state = {}
+            done = 0
+            last = time.monotonic()
+            entries = self._stream_json(cmd, state, cancel_event, timeout, stdin_lines=pending,
+                                        max_line_bytes=max_line_bytes)
+            try:
+                for entry in entries:
+                    # yt-dlp يعالج الروابط بالترتيب؛ الروابط السابقة التي لم تُرجع مدخلاً فشلت
+                    source = entry.get("original_url") or entry.get("webpage_url")
+                    candidates = positions.get(MetadataCache.key_for(source or ""), ())
+                    while candidates and candidates[0] < done:
+                        candidates.popleft()
+                    index = candidates.popleft() if candidates else done
+                    for failed in pending[done:index]:
+                        logger.warning(f"Batch extraction failed: {failed}", phase="extract")
+                        failures[failed] = self._extract_failure_kind(failed, state) or TRANSIENT
+                        yield failed, None
+                    url = pending[index]
+                    info = compact_info(entry, self.raw_store)
+                    now = time.monotonic()
+                    self.site_timeouts.record(url, now - last)
+                    last = now
+                    if use_cache:
+                        self.info_cache.put(url, info)
+                    done = index + 1
+                    yield url, info
+            finally:
+                entries.close()
+                
+            if state.get("reason") == "cancelled":
+                return
+            if state.get("reason") == "timeout" and done < len(pending):
+                # الروابط التي ذكرتها رسائل الأخطاء فشلت قبل الرابط المعلق
+                while done < len(pending) - 1:
+                    kind = self._extract_failure_kind(pending[done], state)
+                    if kind is None:
+                        break
+                    logger.warning(f"Batch extraction failed: {pending[done]}", phase="extract")
+                    failures[pending[done]] = kind
+                    yield pending[done], None
+                    done += 1
+                # الرابط المعلق هو التالي في الترتيب؛ نتجاوزه ونكمل ببقية الدفعة
+                url = pending[done]
+                self.site_timeouts.record(url, timeout)
+                logger.warning(f"Timeout while fetching video info ({timeout:.0f}s): {url}",
+                               phase="extract")
+                failures[url] = TRANSIENT
+                yield url, None
+                done += 1
+            else:
+                for failed in pending[done:]:
+                    logger.warning(f"Batch extraction failed: {failed}", phase="extract")
+                    failures[failed] = self._extract_failure_kind(failed, state) or TRANSIENT
+                    yield failed, None
+                done = len(pending)
+            pending = pending[done:]
+            
+    @staticmethod
+    def _extract_failure_kind(url, state):
+        """
+        نوع فشل استخراج رابط من رسالة yt-dlp التي تذكره أو تذكر معرف الفيديو
+        
+        Returns:
+            str: نوع الخطأ، أو None إذا لم تذكره رسالة
+        """
+        for line in reversed(state.get("stderr") or ()):
+            match = _EXTRACT_ERROR_ID.search(line)
+            if url in line or (match and match.group(1) in url):
+                return classify_output(line)
+        return None
+            
+    def _stream_json(self, cmd, state, cancel_event=None, timeout=60, on_process=None,
+                     stdin_lines=None, max_line_bytes=MAX_JSON_LINE_BYTES):
+        """
+        تشغيل yt-dlp وإرجاع أسطر JSON من مخرجاته فور وصولها
+        
+        Args:
+            cmd: الأمر
+            state: قاموس تُكتب فيه النتيجة: reason ("cancelled" أو "timeout")
+                   و returncode و stderr (آخر أسطر الأخطاء)
+            cancel_event: حدث الإلغاء
+            timeout: أقصى مدة انتظار للسطر التالي (لا يُحسب وقت معالجة المستهلك)
+            on_process: دالة تستقبل العملية فور تشغيلها
+            stdin_lines: أسطر تُكتب في مدخل العملية (مثل روابط ملف الدفعة)
+            max_line_bytes: أقصى حجم لسطر JSON واحد
             
+        Yields:
+            dict: كل مدخل بعد تحليله
+        """
+        process = None
+        state.update(deadline=time.monotonic() + timeout, waiting=True, reason=None,
+                     returncode=None, stderr=deque(maxlen=20))
+        finished = threading.Event()
+        
+        def watchdog():
+            # readline لا يمكن مقاطعته، فننهي العملية عند الإلغاء أو انتهاء المهلة
+            while not finished.wait(0.1):
+                if cancel_event is not None and cancel_event.is_set():
+                    state["reason"] = "cancelled"
+                elif state["waiting"] and time.monotonic() > state["deadline"]:
+                    state["reason"] = "timeout"
+                else:
+                    continue
+                process.kill()
+                return
+                
+        def drain_stderr():
+            for line in process.stderr:
+                state["stderr"].append(line.decode("utf-8", "replace").rstrip())
+                
+        def feed_stdin():
+            # الكتابة في خيط منفصل حتى لا تتوقف القراءة إذا امتلأ أنبوب المدخلات
+            try:
+                for line in stdin_lines:
+                    process.stdin.write(line.encode("utf-8") + b"\n")
+                process.stdin.close()
+            except OSError:
+                pass
+                
+        try:
+            process = self._popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  stdin=subprocess.PIPE if stdin_lines is not None
+                                  else subprocess.DEVNULL)
+            if on_process:
+                on_process(process)
+            threading.Thread(target=watchdog, name="extract-watchdog", daemon=True).start()
+            stderr_thread = threading.Thread(target=drain_stderr, name="extract-stderr",
+                                             daemon=True)
+            stderr_thread.start()
+            if stdin_lines is not None:
+                threading.Thread(target=feed_stdin, name="extract-stdin", daemon=True).start()
+                
+            for entry in iter_json_lines(process.stdout, max_line_bytes):
+                if state["reason"]:
+                    break
+                state["waiting"] = False
+                yield entry
+                state["deadline"] = time.monotonic() + timeout
+                state["waiting"] = True
+                
+            if not state["reason"]:
+                state["returncode"] = process.wait()
+                # رسائل الأخطاء الأخيرة تُصنف بها الروابط الفاشلة
+                stderr_thread.join(1)
+        finally:
+            finished.set()
+            # عدم ترك أي عملية yt-dlp معلقة بعد الإلغاء أو انتهاء المهلة أو التوقف المبكر
+            if process is not None and process.poll() is None:
+                process.kill()
+                try:
+                    process.wait(timeout=5)
+                except Exception:
+                    pass
+                    
     def get_quality_options(self, formats):
         """
         استخراج خيارات الجودة المتاحة من معلومات الفيديو
@@ -143,7 +980,8 @@ class VideoDownloader:
                         "height": height,
                         "ext": ext,
                         "filesize": filesize,
-                        "type": "combined"
+                        "type": "combined",
+                        "protocol": fmt.get("protocol", "")
                     })
                     seen_qualities.add(quality_key)
                     
@@ -171,7 +1009,21 @@ class VideoDownloader:
                         "height": height,
                         "ext": ext,
                         "filesize": filesize,
-                        "type": "separate"
+                        "type": "separate",
+                        "components": [
+                            {
+                                "format_id": fmt.get("format_id"),
+                                "ext": ext,
+                                "filesize": fmt.get("filesize") or fmt.get("filesize_approx", 0),
+                                "protocol": fmt.get("protocol", "")
+                            },
+                            {
+                                "format_id": best_audio_format.get("format_id"),
+                                "ext": best_audio_format.get("ext", "m4a"),
+                                "filesize": best_audio_format.get("filesize") or best_audio_format.get("filesize_approx", 0),
+                                "protocol": best_audio_format.get("protocol", "")
+                            }
+                        ]
                     })
                     seen_qualities.add(quality_key)
                     
@@ -194,7 +1046,9 @@ class VideoDownloader:
                     "height": 0,
                     "ext": ext,
                     "filesize": filesize,
-                    "type": "audio"
+                    "type": "audio",
+                    "acodec": fmt.get("acodec"),
+                    "protocol": fmt.get("protocol", "")
                 })
                 seen_qualities.add(quality_key)
                 
@@ -203,7 +1057,43 @@ class VideoDownloader:
         
         return quality_options
         
-    def download_video(self, url, quality_index, save_path):
+    def select_quality(self, quality_options, policy="best"):
+        """
+        اختيار خيار جودة حسب سياسة نصية (للتحميل دون واجهة)
+        
+        Args:
+            quality_options: الخيارات من get_quality_options
+            policy: "best" أو "worst" أو "audio" أو أقصى ارتفاع مثل "720p"
+            
+        Returns:
+            dict: الخيار المختار (أو محدد yt-dlp عام إذا لم تتوفر خيارات مطابقة)
+        """
+        policy = (policy or "best").strip().lower()
+        videos = [q for q in quality_options if q.get("type") != "audio"]
+        audios = [q for q in quality_options if q.get("type") == "audio"]
+        
+        if policy == "audio":
+            if audios:
+                return audios[0]
+            return {"format_id": "bestaudio", "label": "bestaudio", "type": "audio"}
+        if policy == "worst":
+            if videos:
+                return videos[-1]
+            return {"format_id": "worst", "label": "worst", "type": "worst"}
+        if policy.endswith("p") and policy[:-1].isdigit():
+            max_height = int(policy[:-1])
+            fitting = [q for q in videos if (q.get("height") or 0) <= max_height]
+            if fitting:
+                return fitting[0]
+            if videos:
+                return videos[-1]
+            selector = f"best[height<={max_height}]/best"
+            return {"format_id": selector, "label": selector, "type": "best"}
+        if videos:
+            return videos[0]
+        return {"format_id": "best", "label": "best", "type": "best"}
+        
+    def download_video(self, url, quality_index, save_path, selected_quality=None, info=None):
         """
         تحميل الفيديو
         
@@ -211,32 +1101,93 @@ class VideoDownloader:
             url: رابط الفيديو
             quality_index: فهرس الجودة المختارة
             save_path: مسار الحفظ
+            selected_quality: خيار الجودة الذي اختاره المستخدم (يُفضَّل على الفهرس)
+            info: معلومات الفيديو التي بُنيت منها الخيارات المعروضة
             
         Returns:
             bool: True إذا نجح التحميل، False إذا فشل
         """
-        if not self.current_info:
-            # حاول جلب المعلومات مرة أخرى إذا لم تكن متاحة
-            if not self.get_video_info(url):
+        if selected_quality is None:
+            info = info or self.info_cache.get(url) or self.get_video_info(url)
+            if not info:
+                return False
+            quality_options = self.get_quality_options(info.get("formats", []))
+            
+            if not quality_options or quality_index >= len(quality_options):
+                logger.warning("لا توجد خيارات جودة متاحة أو الفهرس غير صالح.", phase="download")
                 return False
                 
-        formats = self.current_info.get("formats", [])
-        quality_options = self.get_quality_options(formats)
+            selected_quality = quality_options[quality_index]
+        return self.download(url, save_path, selected_quality=selected_quality, info=info)
         
-        if not quality_options or quality_index >= len(quality_options):
-            print("لا توجد خيارات جودة متاحة أو الفهرس غير صالح.")
-            return False
+    def resolve_quality(self, url, format_id=None, policy=None, info=None):
+        """
+        تحويل معرف تنسيق صريح أو سياسة اختيار إلى خيار جودة
+        
+        Args:
+            url: رابط الفيديو
+            format_id: معرف تنسيق أو محدد yt-dlp صريح (لا يحتاج إلى معلومات الفيديو)
+            policy: سياسة اختيار الجودة (تُجلب المعلومات إذا لم تُمرر)
+            info: معلومات الفيديو
+            
+        Returns:
+            tuple: (خيار الجودة، معلومات الفيديو أو None)
+        """
+        if format_id:
+            return {"format_id": format_id, "label": format_id,
+                    "type": "separate" if "+" in format_id else "format"}, info
+        info = info or self.info_cache.get(url) or self.get_video_info(url)
+        options = self.get_quality_options(info.get("formats", [])) if info else []
+        # دون معلومات تُطبق السياسة كمحدد yt-dlp عام
+        return self.select_quality(options, policy), info
+        
+    def download(self, url, save_path, format_id=None, policy=None, selected_quality=None,
+                 info=None):
+        """
+        نقطة الدخول الموحدة للتحميل: كل الطرق تمر بنفس التنفيذ (تقدم، إيقاف
+        مؤقت، إلغاء، إعادة محاولة، وكشف التوقف بدلاً من مهلة كلية)
+        
+        Args:
+            url: رابط الفيديو
+            save_path: مسار الحفظ
+            format_id: معرف تنسيق أو محدد yt-dlp صريح (مثل "137+140" أو "bestaudio")
+            policy: سياسة اختيار الجودة ("best" أو "worst" أو "audio" أو "720p")
+            selected_quality: خيار جودة جاهز من get_quality_options
+            info: معلومات الفيديو (اختيارية للمعرف الصريح)
+            
+        Returns:
+            bool: True إذا نجح التحميل، False إذا فشل
+        """
+        if selected_quality is None:
+            selected_quality, info = self.resolve_quality(url, format_id, policy, info)
             
-        selected_quality = quality_options[quality_index]
+        if info:
+            # نستخدم نفس المعلومات التي رآها المستخدم حتى لو تغيرت الذاكرة المؤقتة
+            self.current_info = compact_info(info)
+        else:
+            # المعلومات المجلوبة مسبقاً لهذا الرابط إن وجدت؛ المحددات العامة لا تحتاجها
+            self.current_info = self.info_cache.get(url)
+            if not self.current_info and selected_quality.get("components"):
+                # خيار بُني من معلومات الفيديو: نحتاجها للدمج وللعنوان
+                if not self.get_video_info(url):
+                    return False
         format_id = selected_quality["format_id"]
         
         # تحضير مسار الحفظ
-        title = self.current_info.get("title", "video")
-        # تنظيف اسم الملف من الأحرف غير المسموحة
-        safe_title = "".join(c for c in title if c.isalnum() or c in (" ", "-", "_")).rstrip()
-        safe_title = safe_title[:100]  # تحديد طول الاسم
+        if self.current_info:
+            title = self.current_info.get("title", "video")
+            # تنظيف اسم الملف من الأحرف غير المسموحة
+            safe_title = "".join(c for c in title if c.isalnum() or c in (" ", "-", "_")).rstrip()
+            safe_title = safe_title[:100]  # تحديد طول الاسم
+            output_template = os.path.join(save_path, f"{safe_title}.%(ext)s")
+        else:
+            output_template = os.path.join(save_path, "%(title)s.%(ext)s")
         
-        output_template = os.path.join(save_path, f"{safe_title}.%(ext)s")
+        # الدمج في مرحلة المعالجة اللاحقة بدلاً من داخل عملية التحميل
+        if selected_quality["type"] == "separate" and selected_quality.get("components") \
+                and self.postprocessor is not None and ffmpeg_available():
+            metadata = {"title": title, "artist": self.current_info.get("uploader")}
+            return self._download_separate(url, selected_quality, save_path, safe_title, metadata)
         
         # بناء أمر yt-dlp
         cmd = [
@@ -252,57 +1203,588 @@ class VideoDownloader:
         if selected_quality["type"] == "separate":
             cmd.extend(["--merge-output-format", "mp4"])
             
-        self.is_downloading = True
-        self.is_cancelled = False
-        self.is_paused = False
+        protocols = self.get_format_protocols(format_id, self.current_info)
+        if not self._run_download(cmd, url, format_id, protocols=protocols):
+            return False
+            
+        # صوت فقط أو ملف مدمج: استخراج الصوت أو إعادة التغليف مع البيانات الوصفية
+        if selected_quality["type"] in ("audio", "combined") and self.current_info \
+                and selected_quality.get("ext") and self.postprocessor is not None \
+                and ffmpeg_available():
+            metadata = {"title": title, "artist": self.current_info.get("uploader")}
+            path = os.path.join(save_path, f"{safe_title}.{selected_quality['ext']}")
+            self._postprocess_file(path, selected_quality, url, metadata)
+        return True
         
-        try:
-            # تشغيل عملية التحميل
-            self.current_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                universal_newlines=True
-            )
+    def get_format_protocols(self, format_id, info=None):
+        """
+        استخراج بروتوكولات التنسيقات المقابلة لمعرف تنسيق أو محدد
+        
+        Args:
+            format_id: معرف التنسيق (مثل "137+140") أو محدد مثل "best"
+            info: معلومات الفيديو (افتراضياً المعلومات الحالية)
             
-            # تتبع التقدم
-            self._monitor_progress()
+        Returns:
+            list: قائمة البروتوكولات المعروفة
+        """
+        info = info or self.current_info
+        if not info or not format_id:
+            return []
             
-            # انتظار انتهاء العملية
-            return_code = self.current_process.wait()
+        formats = info.get("formats") or []
+        by_id = {f.get("format_id"): f.get("protocol", "") for f in formats}
+        protocols = []
+        for part in format_id.split("+"):
+            if part in by_id:
+                protocols.append(by_id[part])
+                continue
+            # محدد مثل best/worst: نحدد التنسيق الذي سيختاره yt-dlp فعلاً
+            selected = self._resolve_selector(part, formats)
+            if selected is None:
+                return []
+            protocols.append(selected.get("protocol", ""))
+        return protocols
+        
+    def _resolve_selector(self, selector, formats):
+        """
+        تحديد التنسيق المقابل لمحدد بسيط (best, worst, bestaudio, bestvideo...)
+        
+        yt-dlp يرتب التنسيقات من الأسوأ إلى الأفضل
+        
+        Returns:
+            dict: التنسيق المختار أو None إذا تعذر التحديد
+        """
+        def has_video(f):
+            return f.get("vcodec", "none") != "none"
+            
+        def has_audio(f):
+            return f.get("acodec", "none") != "none"
+            
+        filters = {
+            "best": lambda f: has_video(f) and has_audio(f),
+            "worst": lambda f: has_video(f) and has_audio(f),
+            "bestaudio": lambda f: has_audio(f) and not has_video(f),
+            "worstaudio": lambda f: has_audio(f) and not has_video(f),
+            "bestvideo": lambda f: has_video(f) and not has_audio(f),
+            "worstvideo": lambda f: has_video(f) and not has_audio(f),
+        }
+        if selector not in filters:
+            return None
+        candidates = [f for f in formats if filters[selector](f)]
+        if not candidates:
+            return None
+        return candidates[0] if selector.startswith("worst") else candidates[-1]
+        
+    def is_fragmented(self, protocols):
+        """هل أحد البروتوكولات مجزأ (HLS/DASH)"""
+        return any(protocol and protocol.startswith(FRAGMENTED_PROTOCOLS) for protocol in protocols)
+        
+
+    @contextmanager
+    def reserve_fragments(self, protocols):
+        """
+        حجز اتصالات أجزاء لعملية yt-dlp واحدة طوال مدة تشغيلها
+        
+        Args:
+            protocols: بروتوكولات التنسيقات التي ستحملها العملية
+            
+        Yields:
+            list: معاملات yt-dlp (فارغة إذا لم تكن التنسيقات مجزأة أو نفدت الاتصالات)
+        """
+        granted = 0
+        if self.concurrent_fragments and self.concurrent_fragments > 1 \
+                and self.is_fragmented(protocols or []):
+            granted = self.fragment_budget.reserve(self.concurrent_fragments)
+        try:
+            yield ["--concurrent-fragments", str(granted)] if granted else []
+        finally:
+            self.fragment_budget.release(granted)
+        
+    def _run_download(self, cmd, url, format_id, final=True, protocols=None):
+        """
+        تشغيل عملية yt-dlp ومتابعة تقدمها
+        
+        Args:
+            cmd: أمر yt-dlp
+            url: رابط الفيديو
+            format_id: معرف التنسيق (للتسجيل)
+            final: هل هذه آخر مرحلة تحميل (لعرض رسالة النجاح)
+            protocols: بروتوكولات التنسيقات (لتفعيل تحميل الأجزاء بالتوازي)
+            
+        Returns:
+            bool: True إذا نجح التحميل، False إذا فشل
+        """
+        self.is_downloading = True
+        self.is_cancelled = False
+        self._set_paused(False)
+        self._byte_progress = {}
+        self.retry_metrics = RetryMetrics()
+        started = time.monotonic()
+        
+        try:
+            return_code = self._run_process(cmd, protocols=protocols)
             
             if return_code == 0 and not self.is_cancelled:
-                if self.status_callback:
+                logger.info(f"Downloaded {url} [{format_id}]", phase="download",
+                            duration=time.monotonic() - started,
+                            retries=self.retry_metrics.retries)
+                if final and self.status_callback:
                     self.status_callback("تم التحميل بنجاح")
                 return True
             else:
+                logger.warning(f"Download failed or cancelled: {url} (code {return_code})",
+                               phase="download", duration=time.monotonic() - started)
                 if self.status_callback:
                     self.status_callback("فشل التحميل أو تم إلغاؤه")
                 return False
                 
         except Exception as e:
-            print(f"Download error: {e}")
+            logger.error(f"Download error: {e}", phase="download")
             if self.status_callback:
                 self.status_callback(f"خطأ في التحميل: {str(e)}")
             return False
         finally:
             self.is_downloading = False
-            self.current_process = None
             
-    def _monitor_progress(self):
-        """مراقبة تقدم التحميل"""
-        if not self.current_process:
+    def _run_process(self, cmd, progress_handler=None, protocols=None, abort_event=None):
+        """
+        تشغيل عملية yt-dlp واحدة وانتظار انتهائها
+        
+        Args:
+            cmd: أمر yt-dlp
+            progress_handler: دالة تستقبل (percentage, status_parts) بدلاً من الاستدعاءات العامة
+            protocols: بروتوكولات التنسيقات (تحجز العملية حصتها من اتصالات الأجزاء)
+            abort_event: حدث مشترك بين المكونات يمنع بدء العملية بعد فشل مكون آخر
+            
+        Returns:
+            int: رمز الخروج (-1 إذا أُلغيت قبل أن تبدأ)
+        """
+        with self.reserve_fragments(protocols) as fragment_args:
+            return self._run_reserved_process(cmd[:1] + fragment_args + cmd[1:],
+                                              progress_handler, abort_event)
+            
+    def _should_abort(self, abort_event):
+        """هل أُلغي التحميل أو فشل مكون آخر"""
+        return self.is_cancelled or (abort_event is not None and abort_event.is_set())
+            
+    def _run_reserved_process(self, cmd, progress_handler=None, abort_event=None):
+        """
+        تشغيل العملية بعد حجز اتصالاتها
+        
+        الإيقاف المؤقت ينهي العملية ويحتفظ بالملف الجزئي، وعند الاستئناف
+        تُشغَّل العملية من جديد فيكمل yt-dlp من الملف الجزئي (--continue).
+        الأخطاء المؤقتة يُعاد تشغيلها بنفس الطريقة بعد تأخير حسب نوع الخطأ
+        """
+        last_code = [-1]
+        
+        def attempt(number):
+            while True:
+                if not self._wait_while_paused(abort_event):
+                    return -1
+                errors = []
+                return_code = self._run_single_process(cmd, progress_handler, abort_event,
+                                                       errors)
+                if return_code == RESTARTED:
+                    logger.info("Download process restarted", phase="download")
+                    continue
+                last_code[0] = return_code
+                if self.is_paused and not self._should_abort(abort_event):
+                    logger.info("Download paused, process released", phase="pause")
+                    continue
+                if return_code == 0 or self._should_abort(abort_event):
+                    return return_code
+                message = " ".join(errors[-3:]) or f"yt-dlp exited with code {return_code}"
+                raise DownloadFailure(message, classify_output(message, return_code))
+                
+        try:
+            return run_with_retry(attempt, self.retry_policy, self.retry_metrics,
+                                  should_stop=lambda: self._should_abort(abort_event),
+                                  # yt-dlp يعيد الاستخراج بنفسه؛ نُسقط المعلومات القديمة فقط
+                                  on_expired=lambda: self.info_cache.invalidate(cmd[-1]),
+                                  job_id=cmd[-1])
+        except DownloadFailure:
+            return last_code[0] or -1
+            
+    def _wait_while_paused(self, abort_event=None):
+        """
+        انتظار الاستئناف إذا كان التحميل متوقفاً
+        
+        Returns:
+            bool: False إذا أُلغي التحميل أثناء الانتظار
+        """
+        while not self._resume_event.wait(0.2):
+            if self._should_abort(abort_event):
+                return False
+        return not self._should_abort(abort_event)
+        
+    def _set_paused(self, paused):
+        self.is_paused = paused
+        if paused:
+            self._resume_event.clear()
+        else:
+            self._resume_event.set()
+            
+    def _run_single_process(self, cmd, progress_handler=None, abort_event=None, errors=None):
+        """
+        تشغيل عملية yt-dlp واحدة ومتابعتها حتى تنتهي (errors تستقبل رسائل الخطأ)
+        
+        Raises:
+            DownloadFailure: خطأ مؤقت إذا توقف التقدم stall_timeout ثانية فأُنهيت العملية
+        """
+        if self._should_abort(abort_event):
+            return -1
+        if self.rate_limit:
+            # الحد يُقرأ عند كل تشغيل، فيطبق الحد الجديد بعد إعادة التشغيل
+            cmd = cmd[:1] + ["--limit-rate", str(int(self.rate_limit))] + cmd[1:]
+            
+        # تشغيل عملية التحميل
+        process = self._popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            universal_newlines=True
+        )
+        with self._process_lock:
+            self.active_processes.append(process)
+            if self.current_process is None:
+                self.current_process = process
+            # إذا فشل مكون آخر بين الفحص وبدء العملية فإن الإنهاء قد فاتها
+            if self._should_abort(abort_event):
+                process.terminate()
+                
+        # وقت آخر تقدم (None أثناء المعالجة اللاحقة)
+        activity = [time.monotonic()]
+        stalled = threading.Event()
+        if self.stall_timeout:
+            watchdog = threading.Thread(target=self._watch_stall,
+                                        args=(process, activity, stalled), daemon=True)
+            watchdog.start()
+        try:
+            # تتبع التقدم
+            self._monitor_progress(process, progress_handler, errors, activity)
+            
+            # انتظار انتهاء العملية
+            return_code = process.wait()
+            with self._process_lock:
+                restarted = process in self._restarting
+                self._restarting.discard(process)
+            if restarted and not self.is_paused and not self._should_abort(abort_event):
+                return RESTARTED
+            if stalled.is_set() and not self.is_paused and not self._should_abort(abort_event):
+                # يُعاد التشغيل فيكمل yt-dlp من الملف الجزئي
+                raise DownloadFailure(f"No progress for {self.stall_timeout}s", TRANSIENT)
+            return return_code
+        finally:
+            with self._process_lock:
+                if process in self.active_processes:
+                    self.active_processes.remove(process)
+                if self.current_process is process:
+                    self.current_process = self.active_processes[0] if self.active_processes else None
+                    
+    def _watch_stall(self, process, activity, stalled):
+        """إنهاء العملية إذا لم تتقدم stall_timeout ثانية (خيط مراقبة لكل عملية)"""
+        interval = min(1.0, self.stall_timeout / 4)
+        while process.poll() is None:
+            time.sleep(interval)
+            last = activity[0]
+            if last is not None and time.monotonic() - last > self.stall_timeout:
+                logger.warning(f"Download stalled for {self.stall_timeout}s, restarting",
+                               job_id=process.args[-1] if getattr(process, "args", None) else None,
+                               phase="download")
+                stalled.set()
+                self.reaper.reap([process])
+                return
+                
+    def set_rate_limit(self, rate):
+        """
+        تغيير حد السرعة أثناء التحميل
+        
+        yt-dlp لا يغير حده أثناء التشغيل، فتُعاد العمليات الجارية وتكمل من
+        ملفاتها الجزئية بالحد الجديد
+        
+        Args:
+            rate: الحد بالبايت/ثانية (None بلا حد)
+            
+        Returns:
+            bool: True إذا تغير الحد
+        """
+        if rate == self.rate_limit:
+            return False
+        self.rate_limit = rate
+        if not self.is_paused:
+            self.restart_processes()
+        return True
+        
+    def restart_processes(self):
+        """إنهاء العمليات الجارية لإعادة تشغيلها فوراً (دون عدها إيقافاً أو فشلاً)"""
+        with self._process_lock:
+            processes = list(self.active_processes)
+            self._restarting.update(processes)
+        if processes:
+            self.reaper.reap(processes)
+            
+    def _terminate_processes(self, callback=None):
+        """
+        إنهاء كل عمليات التحميل الجارية دون انتظار (القتل القسري في الخلفية بعد المهلة)
+        
+        Returns:
+            threading.Event: يُضبط بعد خروج كل العمليات
+        """
+        with self._process_lock:
+            processes = list(self.active_processes)
+        self.processes_stopped = self.reaper.reap(processes, callback)
+        return self.processes_stopped
+            
+    def _component_weights(self, components):
+        """
+        أوزان مكونات التحميل حسب أحجامها التقديرية
+        
+        Returns:
+            list: وزن كل مكون (مجموعها 1)
+        """
+        sizes = [component.get("filesize") or 0 for component in components]
+        total = sum(sizes)
+        if total <= 0 or not all(sizes):
+            return [1.0 / len(components)] * len(components)
+        return [size / total for size in sizes]
+            
+    def _download_separate(self, url, selected_quality, save_path, safe_title, metadata=None):
+        """
+        تحميل مسارات الفيديو والصوت بالتوازي كملفات مؤقتة ثم إرسالها للدمج
+        
+        Args:
+            url: رابط الفيديو
+            selected_quality: خيار الجودة المختار (يحتوي على components)
+            save_path: مسار الحفظ
+            safe_title: اسم الملف المنظف
+            metadata: بيانات وصفية تُضمَّن أثناء الدمج
+            
+        Returns:
+            bool: True إذا نجح التحميل (والدمج في الوضع المتزامن)
+        """
+        components = selected_quality["components"]
+        component_paths = []
+        commands = []
+        for component in components:
+            path = os.path.join(save_path, "{0}.f{1}.{2}".format(
+                safe_title, component["format_id"], component["ext"]))
+            cmd = [
+                "yt-dlp",
+                "-f", component["format_id"],
+                "-o", path,
+                "--no-playlist",
+                "--newline",
+                url
+            ]
+            component_paths.append(path)
+            commands.append(cmd)
+            
+        # دمج التقدم حسب وزن كل مكون بالبايت
+        weights = self._component_weights(components)
+        progress = [0.0] * len(components)
+        return_codes = [None] * len(components)
+        progress_lock = threading.Lock()
+        failed = threading.Event()
+        
+        def on_progress(index, percentage, status_parts):
+            with progress_lock:
+                progress[index] = percentage
+                combined = sum(w * p for w, p in zip(weights, progress))
+                snapshot = list(progress)
+            if self.progress_callback:
+                self.progress_callback(combined)
+            if self.status_callback:
+                details = " | ".join(f"{name}: {value:.0f}%" for name, value in
+                                     zip(("الفيديو", "الصوت"), snapshot))
+                self.status_callback(f"{combined:.1f}% - {details}")
+                
+        def fetch(index):
+            try:
+                return_codes[index] = self._run_process(
+                    commands[index], lambda pct, parts: on_progress(index, pct, parts),
+                    protocols=[components[index].get("protocol", "")],
+                    abort_event=failed)
+            except Exception as e:
+                logger.error(f"Component download error: {e}", phase="download")
+                return_codes[index] = -1
+            # إيقاف المكون الآخر إذا فشل أحدهما (أو منعه من البدء)
+            if return_codes[index] != 0:
+                failed.set()
+                self._terminate_processes()
+                
+        self.is_downloading = True
+        self.is_cancelled = False
+        self._set_paused(False)
+        self._byte_progress = {}
+        self.retry_metrics = RetryMetrics()
+        started = time.monotonic()
+            
+        try:
+            threads = [threading.Thread(target=fetch, args=(index,), daemon=True)
+                       for index in range(len(components))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.is_downloading = False
+            
+        if self.is_cancelled or any(code != 0 for code in return_codes):
+            logger.warning(f"Component download failed or cancelled: {url} (codes {return_codes})",
+                           phase="download", duration=time.monotonic() - started)
+            if not (self.is_cancelled and self.keep_partial):
+                self._remove_partial_files(component_paths)
+            if self.status_callback:
+                self.status_callback("فشل التحميل أو تم إلغاؤه")
+            return False
+            
+        logger.info(f"Downloaded components of {url} [{selected_quality['format_id']}]",
+                    phase="download", duration=time.monotonic() - started)
+        output_path = os.path.join(save_path, f"{safe_title}.mp4")
+        return self._submit_merge(component_paths[0], component_paths[1], output_path, url,
+                                  metadata)
+        
+    def _remove_partial_files(self, paths):
+        """حذف ملفات المكونات المؤقتة وبقاياها (.part و .ytdl)"""
+        for path in paths:
+            candidates = [path, path + ".ytdl"] + glob.glob(glob.escape(path) + ".part*")
+            for candidate in candidates:
+                try:
+                    os.remove(candidate)
+                except OSError:
+                    pass
+        
+    def _submit_merge(self, video_path, audio_path, output_path, url, metadata=None):
+        """إرسال الدمج إلى مرحلة المعالجة اللاحقة"""
+        # ملفات المكونات تُحذف داخل merge_streams بعد الدمج سواء نجح أو فشل
+        return self._submit_postprocess("merge", (video_path, audio_path, output_path), url,
+                                        metadata, "جاري دمج الفيديو والصوت...", "فشل الدمج",
+                                        cleanup_paths=[video_path, audio_path])
+        
+    def _postprocess_file(self, path, selected_quality, url, metadata):
+        """
+        إرسال ملف محمل (صوت فقط أو مدمج) إلى المعالجة اللاحقة
+        
+        الصوت داخل حاوية فيديو (مثل opus في webm) يُستخرج إلى حاويته الصوتية،
+        وغير ذلك يُعاد تغليفه في مكانه لتضمين البيانات الوصفية. فشل المعالجة
+        لا يُفشل التحميل لأن الملف المحمل يبقى كما هو
+        
+        Args:
+            path: مسار الملف المحمل
+            selected_quality: خيار الجودة المحمل
+            url: رابط الفيديو
+            metadata: البيانات الوصفية المراد تضمينها
+            
+        Returns:
+            bool: True إذا نجحت المعالجة أو أُرسلت للمعالجة غير المتزامنة
+        """
+        if not os.path.exists(path):
+            # yt-dlp اختار امتداداً آخر: لا نخمّن اسم الملف
+            return False
+        container = None
+        if selected_quality["type"] == "audio":
+            container = audio_container(selected_quality["ext"], selected_quality.get("acodec"))
+        if container:
+            output_path = f"{os.path.splitext(path)[0]}.{container}"
+            return self._submit_postprocess("extract_audio", (path, output_path), url, metadata,
+                                            "جاري استخراج الصوت...",
+                                            "فشل استخراج الصوت (بقي الملف المحمل)")
+        return self._submit_postprocess("remux", (path,), url, metadata,
+                                        "جاري تضمين البيانات الوصفية...",
+                                        "فشل تضمين البيانات الوصفية (بقي الملف المحمل)")
+        
+    def _submit_postprocess(self, stage, args, url, metadata, running_message, failed_message,
+                            cleanup_paths=None):
+        """
+        إرسال مرحلة إلى المعالجة اللاحقة وانتظارها إلا في الوضع غير المتزامن
+        
+        Args:
+            stage: اسم المرحلة (merge أو extract_audio أو remux)
+            args: معاملات دالة المرحلة
+            url: رابط الفيديو (معرف المهمة للتسجيل)
+            metadata: البيانات الوصفية المراد تضمينها
+            running_message: رسالة الحالة أثناء المعالجة
+            failed_message: بادئة رسالة الحالة عند الفشل
+            cleanup_paths: ملفات تُحذف إذا تعذر إرسال المرحلة
+            
+        Returns:
+            bool: True إذا نجحت المرحلة أو أُرسلت للمعالجة غير المتزامنة
+        """
+        if self.status_callback:
+            self.status_callback(running_message)
+            
+        try:
+            future = self.postprocessor.submit(stage, *args, metadata=metadata, job_id=url,
+                                               callback=self._on_postprocess_done)
+        except Exception as e:
+            logger.error(f"Failed to queue {stage}: {e}", job_id=url, phase="postprocess")
+            if cleanup_paths:
+                self._remove_partial_files(cleanup_paths)
+            if self.status_callback:
+                self.status_callback(f"{failed_message}: {e}")
+            return False
+        self.last_postprocess = future
+        
+        if self.async_postprocess:
+            # لا ننتظر المعالجة حتى يبدأ التحميل التالي
+            return True
+            
+        try:
+            future.result()
+        except Exception as e:
+            if self.status_callback:
+                self.status_callback(f"{failed_message}: {e}")
+            return False
+            
+        if self.status_callback:
+            self.status_callback("تم التحميل بنجاح")
+        return True
+        
+    def _on_postprocess_done(self, success, result):
+        """استدعاء عند انتهاء المعالجة اللاحقة"""
+        if not self.async_postprocess:
+            return
+        if self.postprocess_callback:
+            self.postprocess_callback(success, result)
+            
+    def pipeline_stats(self):
+        """
+        أعماق الطوابير لكل مرحلة من مراحل المعالجة اللاحقة
+        
+        Returns:
+            dict: إحصائيات كل مرحلة (queued, running, completed, failed)
+        """
+        if self.postprocessor is None:
+            return {}
+        return self.postprocessor.stats()
+            
+    def _monitor_progress(self, process=None, progress_handler=None, errors=None, activity=None):
+        """
+        مراقبة تقدم التحميل
+        
+        Args:
+            process: العملية المراقبة (افتراضياً العملية الحالية)
+            progress_handler: دالة تستقبل (percentage, status_parts) بدلاً من الاستدعاءات العامة
+            errors: قائمة تُضاف إليها رسائل الخطأ (لتصنيف الفشل)
+            activity: قائمة من عنصر واحد يُحدَّث فيها وقت آخر تقدم (لكشف التوقف)
+        """
+        process = process or self.current_process
+        if not process:
             return
             
         try:
-            for line in self.current_process.stdout:
+            for line in process.stdout:
                 if self.is_cancelled:
                     break
                     
                 line = line.strip()
                 if not line:
                     continue
+                if activity is not None:
+                    # المعالجة اللاحقة لا تطبع تقدماً، فيتوقف الكشف حتى نهايتها
+                    activity[0] = None if line.startswith(POSTPROCESS_PREFIXES) \
+                        else time.monotonic()
                     
                 # تحليل خط التقدم من yt-dlp
                 if "[download]" in line and "%" in line:
@@ -314,9 +1796,6 @@ class VideoDownloader:
                                 percentage_str = part.replace("%", "")
                                 percentage = float(percentage_str)
                                 
-                                if self.progress_callback:
-                                    self.progress_callback(percentage)
-                                    
                                 # استخراج معلومات إضافية (السرعة، الوقت المتبقي)
                                 status_parts = []
                                 for i, p in enumerate(parts):
@@ -325,7 +1804,22 @@ class VideoDownloader:
                                     elif "ETA" in p and i + 1 < len(parts):  # الوقت المتبقي
                                         eta = parts[i + 1]
                                         status_parts.append(f"الوقت المتبقي: {eta}")
+                                    elif p == "(frag" and i + 1 < len(parts):  # الأجزاء المكتملة
+                                        fragments = parts[i + 1].rstrip(")")
+                                        status_parts.append(f"الأجزاء: {fragments}")
+                                    elif p == "of" and i + 1 < len(parts):  # الحجم الكلي
+                                        size = " ".join(parts[i + 1:i + 3]) \
+                                            if parts[i + 1] == "~" else parts[i + 1]
+                                        self._report_bytes(process, percentage,
+                                                           parse_size(size))
                                         
+                                if progress_handler:
+                                    progress_handler(percentage, status_parts)
+                                    break
+                                    
+                                if self.progress_callback:
+                                    self.progress_callback(percentage)
+                                    
                                 status_text = f"{percentage:.1f}%"
                                 if status_parts:
                                     status_text += " - " + " | ".join(status_parts)
@@ -335,70 +1829,107 @@ class VideoDownloader:
                                 break
                     except (ValueError, IndexError):
                         continue
+                else:
+                    if errors is not None and line.startswith("ERROR"):
+                        errors.append(line)
+                    logger.debug(line, phase="download")
                         
         except Exception as e:
-            print(f"Progress monitoring error: {e}")
+            logger.error(f"Progress monitoring error: {e}", phase="download")
+            
+    def _report_bytes(self, process, percentage, total_bytes):
+        """
+        تحويل نسبة التقدم إلى بايتات وتمريرها إلى checkpoint_callback
+        
+        التقدم يُجمع لكل مكون حسب معرف التنسيق حتى لا تُحسب العملية
+        المعاد تشغيلها بعد الاستئناف مرتين
+        """
+        if not self.checkpoint_callback or not total_bytes:
+            return
+        args = list(getattr(process, "args", None) or [])
+        key = args[args.index("-f") + 1] if "-f" in args[:-1] else None
+        self._byte_progress[key] = (int(total_bytes * percentage / 100), total_bytes)
+        progress = list(self._byte_progress.values())
+        try:
+            self.checkpoint_callback(sum(d for d, _ in progress), sum(t for _, t in progress))
+        except Exception as e:
+            logger.error(f"Checkpoint callback error: {e}", phase="download")
             
     def pause_download(self):
-        """إيقاف التحميل مؤقتاً"""
-        if self.current_process and self.is_downloading:
-            self.is_paused = True
-            try:
-                # إرسال إشارة SIGSTOP (Linux/Mac) أو محاولة إيقاف العملية
-                if hasattr(self.current_process, "suspend"):
-                    self.current_process.suspend()
-                else:
-                    # في Windows، نحتاج لطريقة مختلفة
-                    import signal
-                    os.kill(self.current_process.pid, signal.SIGSTOP)
-            except:
-                # إذا فشل الإيقاف المؤقت، نلغي التحميل
-                self.cancel_download()
-                
+        """
+        إيقاف التحميل مؤقتاً
+        
+        تُنهى عمليات yt-dlp (فتُغلق الاتصالات) ويبقى الملف الجزئي على القرص،
+        ويعمل ذلك على كل الأنظمة بما فيها Windows
+        
+        Returns:
+            bool: True إذا أُوقف التحميل
+        """
+        if not self.is_downloading or self.is_paused:
+            return False
+        self._set_paused(True)
+        self._terminate_processes()
+        logger.info("Pause requested", phase="pause")
+        return True
+        
     def resume_download(self):
-        """استئناف التحميل"""
-        if self.current_process and self.is_paused:
-            self.is_paused = False
-            try:
-                # إرسال إشارة SIGCONT (Linux/Mac) أو استئناف العملية
-                if hasattr(self.current_process, "resume"):
-                    self.current_process.resume()
-                else:
-                    import signal
-                    os.kill(self.current_process.pid, signal.SIGCONT)
-            except:
-                pass
-                
-    def cancel_download(self):
-        """إلغاء التحميل"""
+        """
+        استئناف التحميل من الملف الجزئي
+        
+        Returns:
+            bool: True إذا كان التحميل متوقفاً واستؤنف
+        """
+        if not self.is_paused:
+            return False
+        self._set_paused(False)
+        logger.info("Resume requested", phase="pause")
+        return True
+        
+    def cancel_download(self, keep_partial=False, callback=None):
+        """
+        إلغاء التحميل دون انتظار خروج العمليات (آمن للاستدعاء من خيط الواجهة)
+        
+        Args:
+            keep_partial: إبقاء الملفات الجزئية (مثل تسليم المهمة لجهاز آخر يكملها)
+            callback: دالة تُستدعى (في خيط الإنهاء) بعد خروج كل العمليات
+            
+        Returns:
+            threading.Event: يُضبط بعد خروج كل العمليات
+        """
+        self.keep_partial = keep_partial
         self.is_cancelled = True
-        if self.current_process:
-            try:
-                self.current_process.terminate()
-                # انتظار قصير ثم القتل القسري إذا لزم الأمر
-                try:
-                    self.current_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.current_process.kill()
-            except:
-                pass
-            finally:
-                self.current_process = None
+        # إيقاظ أي خيط ينتظر الاستئناف حتى يخرج
+        self._resume_event.set()
+        self.cancel_info_fetches()
+        stopped = self._terminate_processes(callback)
+                
+        with self._process_lock:
+            self.current_process = None
                 
         self.is_downloading = False
         self.is_paused = False
+        return stopped
         
-    def download_file(self, url, save_path, filename=None):
+    def download_file(self, url, save_path, filename=None, resume=False,
+                      expected_checksum=None, algorithm=DEFAULT_ALGORITHM, sidecar=True):
         """
         تحميل ملف عادي (غير فيديو) باستخدام requests
         
+        الأخطاء المؤقتة وتحديد المعدل يُعاد تحميلها من الجزء المحمل (HTTP Range).
+        البصمة تُحسب أثناء الكتابة فلا يُعاد قراءة الملف للتحقق منه
+        
         Args:
             url: رابط الملف
             save_path: مسار الحفظ
             filename: اسم الملف (اختياري)
+            resume: الإكمال من ملف جزئي موجود (طلب HTTP Range)
+            expected_checksum: البصمة المتوقعة ("sha256:..." أو بصمة ست عشرية)؛
+                وإلا تُؤخذ من ترويسات X-Checksum أو Digest أو Content-MD5 إن وجدت
+            algorithm: خوارزمية البصمة المحفوظة في الملف الجانبي
+            sidecar: حفظ البصمة في ملف جانبي (مثل file.bin.sha256)
             
         Returns:
-            bool: True إذا نجح التحميل، False إذا فشل
+            bool: True إذا نجح التحميل (وتطابقت البصمة)، False إذا فشل
         """
         try:
             # تحديد اسم الملف
@@ -410,25 +1941,115 @@ class VideoDownloader:
                     
             file_path = os.path.join(save_path, filename)
             
-            # بدء التحميل
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get("content-length", 0))
-            downloaded_size = 0
+            expected = None
+            if expected_checksum:
+                expected = normalize_expected(expected_checksum, algorithm)
+                if expected is None:
+                    raise ValueError(f"Invalid expected checksum: {expected_checksum}")
+            verify = {
+                "hasher": StreamingHasher(dict.fromkeys((algorithm, expected[0]) if expected
+                                                        else (algorithm,))),
+                "expected": expected,
+            }
+            self.last_checksum = None
             
             self.is_downloading = True
             self.is_cancelled = False
+            self._set_paused(False)
+            self.retry_metrics = RetryMetrics()
+            
+            # المحاولات التالية تكمل من الجزء المحمل
+            run_with_retry(lambda attempt: self._fetch_file(url, file_path, resume or attempt > 1,
+                                                            verify),
+                           self.retry_policy, self.retry_metrics,
+                           should_stop=lambda: self.is_cancelled, job_id=url)
+                                
+            if not self.is_cancelled:
+                hasher = verify["hasher"]
+                self.last_checksum = {
+                    "algorithm": algorithm,
+                    "hexdigest": hasher.hexdigest(algorithm),
+                    "verified": verify["expected"] is not None,
+                }
+                if sidecar:
+                    write_sidecar(file_path, self.last_checksum["hexdigest"], algorithm)
+                    
+            if self.is_cancelled:
+                # حذف الملف المؤقت في حالة الإلغاء
+                try:
+                    os.remove(file_path)
+                except:
+                    pass
+                return False
+                
+            return True
             
-            with open(file_path, "wb") as file:
+        except Exception as e:
+            logger.error(f"File download error: {e}", phase="download")
+            if self.status_callback:
+                self.status_callback(f"خطأ في تحميل الملف: {str(e)}")
+            return False
+        finally:
+            self.is_downloading = False
+            
+    def _fetch_file(self, url, file_path, resume=False, verify=None):
+        """
+        محاولة تحميل واحدة (ترفع استثناء عند فشل الشبكة أو الخادم)
+        
+        Args:
+            url: رابط الملف
+            file_path: مسار الملف
+            resume: الإكمال من الملف الجزئي إن وجد
+            verify: قاموس {hasher, expected} لحساب البصمة أثناء الكتابة
+        """
+        verify = verify or {"hasher": StreamingHasher(), "expected": None}
+        hasher = verify["hasher"]
+        downloaded_size = 0
+        if resume and os.path.exists(file_path):
+            downloaded_size = os.path.getsize(file_path)
+        if hasher.bytes_hashed != downloaded_size:
+            # إكمال ملف جزئي من جلسة سابقة: تُقرأ البادئة مرة واحدة فقط
+            hasher.seed_from_file(file_path, downloaded_size)
+            
+        while True:
+            # بدء التحميل (أو إكماله من حيث توقف)
+            headers = {"Range": f"bytes={downloaded_size}-"} if downloaded_size else {}
+            response = requests.get(url, stream=True, headers=headers, timeout=(15, 60))
+            if downloaded_size and response.status_code == 416:
+                # الملف الجزئي مكتمل بالفعل
+                response.close()
+                self._verify_checksum(file_path, verify)
+                return
+            response.raise_for_status()
+            
+            if downloaded_size and response.status_code != 206:
+                # الخادم لا يدعم Range: نبدأ من جديد
+                logger.info(f"Range not supported, restarting: {url}", phase="download")
+                downloaded_size = 0
+                hasher.reset()
+                
+            if verify["expected"] is None:
+                verify["expected"] = expected_from_headers(response.headers,
+                                                           partial=response.status_code == 206)
+                if verify["expected"]:
+                    hasher.add_algorithm(verify["expected"][0], file_path)
+                
+            content_length = int(response.headers.get("content-length", 0))
+            total_size = downloaded_size + content_length if content_length else 0
+            
+            with response, open(file_path, "ab" if downloaded_size else "wb") as file:
                 for chunk in response.iter_content(chunk_size=8192):
-                    if self.is_cancelled:
+                    if self.is_cancelled or self.is_paused:
                         break
                         
                     if chunk:
                         file.write(chunk)
+                        hasher.update(chunk)
                         downloaded_size += len(chunk)
                         
+                        if self.checkpoint_callback:
+                            self.checkpoint_callback(downloaded_size, total_size or None)
+                            
                         # تحديث التقدم
                         if total_size > 0:
                             percentage = (downloaded_size / total_size) * 100
@@ -442,21 +2063,37 @@ class VideoDownloader:
                             if self.status_callback:
                                 self.status_callback(status)
                                 
-            if self.is_cancelled:
-                # حذف الملف المؤقت في حالة الإلغاء
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
-                return False
+            # الإيقاف المؤقت يغلق الاتصال ويحتفظ بالملف الجزئي
+            if self.is_paused and not self.is_cancelled:
+                if self._wait_while_paused():
+                    continue
+                return
                 
-            return True
+            if not self.is_cancelled and total_size and downloaded_size < total_size:
+                # انقطع الاتصال قبل اكتمال الملف
+                raise DownloadFailure(f"Connection closed at {downloaded_size}/{total_size} bytes")
+            if not self.is_cancelled:
+                self._verify_checksum(file_path, verify)
+            return
             
-        except Exception as e:
-            print(f"File download error: {e}")
-            if self.status_callback:
-                self.status_callback(f"خطأ في تحميل الملف: {str(e)}")
-            return False
-        finally:
-            self.is_downloading = False
-
+    def _verify_checksum(self, file_path, verify):
+        """
+        مقارنة البصمة المحسوبة أثناء الكتابة بالبصمة المتوقعة
+        
+        عند عدم التطابق يُحذف الملف ويُرفع خطأ مؤقت فيُعاد التحميل من البداية
+        """
+        expected = verify.get("expected")
+        if not expected:
+            return
+        algorithm, hexdigest = expected
+        actual = verify["hasher"].hexdigest(algorithm)
+        if actual == hexdigest:
+            logger.info(f"Checksum verified ({algorithm})", phase="verify")
+            return
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        verify["hasher"].reset()
+        raise DownloadFailure(f"Checksum mismatch ({algorithm}): expected {hexdigest}, "
+                              f"got {actual}")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة تمثيل معلومات الفيديو المضغوط
+Compact Video Info Module
+
+تحويل مخرجات yt-dlp --dump-json (التي قد تبلغ عدة ميغابايت مع الصور
+المصغرة والترجمات والترويسات وقوائم الأجزاء) إلى جدول تنسيقات صغير يحتوي
+فقط على الحقول التي يستخدمها البرنامج، مع حفظ النص الكامل على القرص
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+import logger
+from jobs import state_dir
+
+# حقول التنسيق التي يستخدمها البرنامج (اختيار الجودة والبروتوكول والحجم)
+FORMAT_FIELDS = ("format_id", "ext", "protocol", "vcodec", "acodec",
+                 "height", "width", "abr", "filesize", "filesize_approx")
+
+# حقول الفيديو العامة المعروضة أو المستخدمة في اسم الملف
+INFO_FIELDS = ("id", "title", "uploader", "duration", "webpage_url", "extractor")
+
+# الحقول النصية المتكررة بين التنسيقات (تُشارك نسخة واحدة منها)
+_INTERNED_FIELDS = ("ext", "protocol", "vcodec", "acodec")
+
+# أقصى طول للوصف المحفوظ في الذاكرة (النص الكامل في الملف المحفوظ)
+DESCRIPTION_PREVIEW = 500
+
+RAW_INFO_DIR = "info"
+
+# أقصى حجم لسطر JSON واحد من yt-dlp (السطر الأطول يُتجاهل بدلاً من تحميله كله)
+MAX_JSON_LINE_BYTES = 32 * 1024 * 1024
+
+_SKIP_CHUNK = 1024 * 1024
+
+_MISSING = object()
+
+
+class FormatEntry:
+    __slots__ = FORMAT_FIELDS + ("has_url",)
+
+    def __init__(self, fmt):
+        """
+        تنسيق واحد بالحقول المستخدمة فقط
+
+        رابط التنسيق نفسه لا يُحفظ (رابط موقّع ينتهي ويعيد yt-dlp تحديده عند
+        التحميل)، بل يُحفظ فقط هل كان موجوداً
+
+        Args:
+            fmt: قاموس التنسيق من yt-dlp
+        """
+        for field in FORMAT_FIELDS:
+            value = fmt.get(field, _MISSING)
+            if field in _INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, field, value)
+        self.has_url = bool(fmt.get("url"))
+
+    def get(self, key, default=None):
+        """نفس سلوك dict.get لحقول التنسيق"""
+        if key == "url":
+            return True if self.has_url else default
+        if key not in FORMAT_FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __repr__(self):
+        return f"FormatEntry({self.get('format_id')!r}, {self.get('protocol')!r})"
+
+
+class CompactInfo:
+    __slots__ = INFO_FIELDS + ("description", "formats", "raw_path")
+
+    def __init__(self, info, raw_path=None):
+        """
+        معلومات فيديو مضغوطة
+
+        Args:
+            info: قاموس المعلومات الكامل من yt-dlp
+            raw_path: مسار ملف JSON الكامل المحفوظ على القرص
+        """
+        for field in INFO_FIELDS:
+            setattr(self, field, info.get(field, _MISSING))
+        description = info.get("description", _MISSING)
+        if isinstance(description, str):
+            description = description[:DESCRIPTION_PREVIEW]
+        self.description = description
+        self.formats = tuple(FormatEntry(fmt) for fmt in info.get("formats") or ())
+        self.raw_path = raw_path
+
+    def get(self, key, default=None):
+        """نفس سلوك dict.get للحقول المحفوظة"""
+        if key == "formats":
+            return list(self.formats)
+        if key not in INFO_FIELDS and key != "description":
+            return default
+        value = getattr(self, key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def raw(self):
+        """
+        قراءة المعلومات الكاملة من القرص عند الحاجة
+
+        Returns:
+            dict: المعلومات الكاملة أو None إذا لم تُحفظ أو حُذفت
+        """
+        if not self.raw_path:
+            return None
+        try:
+            with open(self.raw_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def __repr__(self):
+        return f"CompactInfo({self.get('title')!r}, {len(self.formats)} formats)"
+
+
+class RawInfoStore:
+    def __init__(self, directory=None, max_files=200):
+        """
+        مخزن ملفات JSON الكاملة على القرص
+
+        Args:
+            directory: المجلد (افتراضياً info داخل مجلد الحالة)
+            max_files: الحد الأقصى لعدد الملفات (تُحذف الأقدم)
+        """
+        self.directory = directory
+        self.max_files = max_files
+
+    def _directory(self):
+        return os.fspath(self.directory or state_dir() / RAW_INFO_DIR)
+
+    def save(self, info):
+        """
+        حفظ المعلومات الكاملة
+
+        Returns:
+            str: مسار الملف أو None في حالة الفشل
+        """
+        key = info.get("webpage_url") or info.get("id") or repr(sorted(info))
+        name = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:16] + ".json"
+        directory = self._directory()
+        path = os.path.join(directory, name)
+        temp_path = path + ".tmp"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(info, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, path)
+            self.prune()
+            return path
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not spill video info to disk: {e}", phase="extract")
+            return None
+
+    def prune(self):
+        """حذف أقدم الملفات إذا تجاوز عددها الحد"""
+        directory = self._directory()
+        try:
+            paths = [os.path.join(directory, name) for name in os.listdir(directory)
+                     if name.endswith(".json")]
+            if len(paths) <= self.max_files:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_files]:
+                os.remove(path)
+        except OSError as e:
+            logger.debug(f"Raw info prune failed: {e}", phase="extract")
+
+
+# المخزن المشترك بين كل كائنات التحميل
+shared_raw_store = RawInfoStore()
+
+
+def compact_info(info, raw_store=None):
+    """
+    تحويل معلومات yt-dlp الكاملة إلى تمثيل مضغوط
+
+    Args:
+        info: قاموس المعلومات الكامل (أو CompactInfo فيُعاد كما هو)
+        raw_store: مخزن لحفظ النص الكامل على القرص (None لعدم الحفظ)
+
+    Returns:
+        CompactInfo: المعلومات المضغوطة
+    """
+    if info is None or isinstance(info, CompactInfo):
+        return info
+    raw_path = raw_store.save(info) if raw_store is not None else None
+    return CompactInfo(info, raw_path)
+
+
+def iter_json_lines(stream, max_line_bytes=MAX_JSON_LINE_BYTES):
+    """
+    قراءة مخرجات JSONL (سطر JSON لكل فيديو) تدريجياً كلما وصل سطر
+
+    Args:
+        stream: مجرى ثنائي (مثل stdout لعملية yt-dlp)
+        max_line_bytes: أقصى حجم لسطر واحد؛ الأطول يُتخطى دون تحميله في الذاكرة
+
+    Yields:
+        dict: كل مدخل بعد تحليله
+    """
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        if len(line) > max_line_bytes and not line.endswith(b"\n"):
+            # تخطي بقية السطر على دفعات
+            skipped = len(line)
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(_SKIP_CHUNK)
+                skipped += len(line)
+            logger.warning(f"Skipped oversized JSON line ({skipped} bytes)", phase="extract")
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line.decode("utf-8"))
+        except ValueError:
+            logger.warning("Failed to parse JSON line", phase="extract")
+            continue
+        if isinstance(entry, dict):
+            yield entry
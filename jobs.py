@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة حفظ حالة مهام التحميل
+Download Job State Module
+
+سجل مهام مكتوب مسبقاً (write-ahead) يحفظ كل مهمة وحالتها ونقاط تقدمها
+على القرص، حتى تُستأنف التحميلات غير المكتملة من ملفاتها الجزئية
+بعد توقف البرنامج أو انهياره
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from pathlib import Path
+
+import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: استبدال ملف تفتحه عملية أخرى يفشل أصلاً فلا حاجة للقفل
+    fcntl = None
+
+DEFAULT_STATE_DIR = Path(__file__).parent / "state"
+JOURNAL_FILE = "jobs.journal"
+
+# حالات المهام
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# الحالات التي تعني أن المهمة لم تنته ويجب استئنافها
+UNFINISHED_STATES = (QUEUED, RUNNING, PAUSED)
+
+# متغير بيئة لتغيير مجلد الحالة (مثل الاختبارات أو الخوادم)
+STATE_DIR_ENV = "VIDEO_DOWNLOADER_STATE_DIR"
+
+
+def state_dir():
+    """
+    مجلد ملفات حالة البرنامج
+
+    Returns:
+        Path: المجلد (من متغير البيئة أو المجلد الافتراضي)
+    """
+    return Path(os.environ.get(STATE_DIR_ENV) or DEFAULT_STATE_DIR)
+
+
+def new_job_id():
+    """معرف قصير فريد لمهمة تحميل"""
+    return uuid.uuid4().hex[:12]
+
+
+class JobJournal:
+    def __init__(self, path=None, sync_interval=1.0, checkpoint_interval=5.0):
+        """
+        سجل المهام (سطر JSON لكل حدث، يُضاف إلى نهاية الملف فقط)
+
+        Args:
+            path: مسار ملف السجل (افتراضياً داخل مجلد الحالة)
+            sync_interval: الفترة بين عمليات fsync المجمعة لنقاط التقدم بالثواني
+            checkpoint_interval: أقل فترة بين نقطتي تقدم لنفس المهمة بالثواني
+        """
+        self.path = Path(path) if path else state_dir() / JOURNAL_FILE
+        self.sync_interval = sync_interval
+        self.checkpoint_interval = checkpoint_interval
+        self._file = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_checkpoint = {}
+        self._closed = False
+        self.syncs = 0  # عدد عمليات fsync (للإحصائيات والاختبارات)
+        # قفل مشترك على ملف بجانب السجل طوال فتحه: الضغط يحتاج القفل حصرياً
+        # حتى لا يستبدل الملف بينما تكتب فيه عملية أخرى (واجهة أو خدمة أو CLI)
+        self._lock_file = self._open_lock()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sync_loop, name="journal-sync",
+                                        daemon=True)
+        self._thread.start()
+
+    def record(self, job_id, state, **fields):
+        """
+        تسجيل تغير حالة مهمة (يُكتب على القرص فوراً مع fsync)
+
+        Args:
+            job_id: معرف المهمة
+            state: الحالة الجديدة (queued, running, paused, completed, failed, cancelled)
+            fields: بيانات المهمة (url, format_id, save_path, option...)
+
+        Returns:
+            bool: True إذا نجحت الكتابة
+        """
+        if state not in UNFINISHED_STATES:
+            self._last_checkpoint.pop(job_id, None)
+        return self._append({"job_id": job_id, "state": state, **fields}, durable=True)
+
+    def checkpoint(self, job_id, downloaded_bytes, total_bytes=None, force=False):
+        """
+        تسجيل نقطة تقدم لمهمة (مجمعة: fsync دوري بدلاً من كل نقطة)
+
+        Args:
+            job_id: معرف المهمة
+            downloaded_bytes: البايتات المحملة حتى الآن
+            total_bytes: الحجم الكلي إن كان معروفاً
+            force: تجاوز الحد الأدنى للفترة بين النقاط
+
+        Returns:
+            bool: True إذا كُتبت النقطة، False إذا تم تخطيها
+        """
+        now = time.monotonic()
+        last = self._last_checkpoint.get(job_id)
+        if not force and last is not None and now - last < self.checkpoint_interval:
+            return False
+        self._last_checkpoint[job_id] = now
+        entry = {"job_id": job_id, "downloaded_bytes": int(downloaded_bytes)}
+        if total_bytes:
+            entry["total_bytes"] = int(total_bytes)
+        return self._append(entry, durable=False)
+
+    def _append(self, entry, durable):
+        if self._closed:
+            return False
+        entry["t"] = round(time.time(), 3)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+                if durable:
+                    os.fsync(self._file.fileno())
+                    self.syncs += 1
+                    self._dirty = False
+                else:
+                    self._dirty = True
+            return True
+        except Exception as e:
+            logger.error(f"Journal write failed: {e}", job_id=entry.get("job_id"),
+                         phase="journal")
+            return False
+
+    def _sync_loop(self):
+        """خيط fsync الدوري لنقاط التقدم"""
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        """كتابة نقاط التقدم المعلقة إلى القرص"""
+        with self._lock:
+            if self._dirty and self._file is not None:
+                try:
+                    os.fsync(self._file.fileno())
+                    self.syncs += 1
+                except OSError as e:
+                    logger.error(f"Journal fsync failed: {e}", phase="journal")
+                self._dirty = False
+
+    def replay(self):
+        """
+        إعادة بناء حالة كل المهام من السجل
+
+        Returns:
+            dict: معرف المهمة -> آخر حالة معروفة (مع بياناتها وآخر نقطة تقدم)
+        """
+        jobs = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # سطر مقطوع من انهيار أثناء الكتابة
+                        continue
+                    job_id = entry.get("job_id")
+                    if not job_id:
+                        continue
+                    jobs.setdefault(job_id, {}).update(entry)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Unreadable job journal: {e}", phase="journal")
+        return jobs
+
+    def unfinished(self):
+        """
+        المهام التي لم تكتمل (في الطابور، جارية عند الانهيار، أو متوقفة)
+
+        Returns:
+            list: المهام مرتبة حسب وقت آخر حدث
+        """
+        jobs = [job for job in self.replay().values()
+                if job.get("state") in UNFINISHED_STATES]
+        return sorted(jobs, key=lambda job: job.get("t", 0))
+
+    def _open_lock(self):
+        if fcntl is None:
+            return None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self.path.with_name(self.path.name + ".lock"), "a")
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH)
+            return lock_file
+        except OSError as e:
+            logger.warning(f"Journal lock unavailable: {e}", phase="journal")
+            return None
+
+    def _exclusive(self):
+        """
+        تحويل القفل إلى حصري إذا لم تفتح عملية أخرى السجل
+
+        Returns:
+            bool: True إذا كان الضغط آمناً
+        """
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            return False
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def compact(self):
+        """
+        إعادة كتابة السجل بحيث يحتوي فقط على لقطة من المهام غير المكتملة
+
+        لا يُضغط السجل إذا كانت عملية أخرى تفتحه (تضيع كتاباتها في الملف المستبدل)
+
+        Returns:
+            int: عدد المهام غير المكتملة، أو None إذا لم يُضغط السجل
+        """
+        with self._lock:
+            if not self._exclusive():
+                logger.info("Journal in use by another process, not compacting",
+                            phase="journal")
+                return None
+            try:
+                return self._compact_unlocked()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH)
+
+    def _compact_unlocked(self):
+        jobs = [job for job in self._replay_unlocked()
+                if job.get("state") in UNFINISHED_STATES]
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for job in jobs:
+                    f.write(json.dumps(job, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"Journal compaction failed: {e}", phase="journal")
+        return len(jobs)
+
+    def _replay_unlocked(self):
+        if self._file is not None:
+            self._file.flush()
+        return list(self.replay().values())
+
+    def close(self):
+        """كتابة المعلق وإغلاق الملف"""
+        if self._closed:
+            return
+        self._stop.set()
+        self._thread.join(2)
+        self.sync()
+        self._closed = True
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+
+# حقول صف المهمة في لوحة التقدم
+PROGRESS_FIELDS = ("title", "url", "state", "progress", "downloaded", "total", "speed", "eta")
+
+# وزن القياس الجديد في متوسط السرعة المتحرك
+SPEED_ALPHA = 0.3
+
+
+class ProgressBoard:
+    def __init__(self, clock=time.monotonic):
+        """
+        لوحة تقدم مركزية لكل المهام
+
+        خيوط التحميل تكتب فيها فقط، والواجهات (جدول المهام أو مخرجات سطر
+        الأوامر) تقرأ منها على فترات ثابتة الصفوف التي تغيرت منذ آخر قراءة،
+        بدلاً من استدعاء الواجهة مع كل تحديث لكل مهمة
+
+        Args:
+            clock: دالة الوقت (للاختبارات)
+        """
+        self.clock = clock
+        self.version = 0
+        self._rows = {}
+        self._versions = {}
+        self._removed = {}
+        self._samples = {}  # job_id -> (الوقت، البايتات) لحساب السرعة
+        self._lock = threading.Lock()
+
+    def update(self, job_id, **fields):
+        """
+        تحديث صف مهمة (يُنشأ إذا لم يكن موجوداً)
+
+        عند تمرير downloaded تُحسب السرعة (متوسط متحرك) والوقت المتبقي
+
+        Args:
+            job_id: معرف المهمة
+            fields: أي من title و url و state و progress و downloaded و total
+        """
+        now = self.clock()
+        with self._lock:
+            row = self._rows.get(job_id)
+            if row is None:
+                row = self._rows[job_id] = dict.fromkeys(PROGRESS_FIELDS)
+                row["progress"] = 0.0
+                self._removed.pop(job_id, None)
+            downloaded = fields.get("downloaded")
+            if downloaded is not None:
+                sample = self._samples.get(job_id)
+                if sample is not None and now > sample[0] and downloaded >= sample[1]:
+                    speed = (downloaded - sample[1]) / (now - sample[0])
+                    previous = row.get("speed")
+                    row["speed"] = speed if previous is None else \
+                        SPEED_ALPHA * speed + (1 - SPEED_ALPHA) * previous
+                self._samples[job_id] = (now, downloaded)
+            row.update((key, value) for key, value in fields.items() if key in PROGRESS_FIELDS)
+            total, done, speed = row.get("total"), row.get("downloaded"), row.get("speed")
+            if total and done is not None and speed:
+                row["eta"] = max(0.0, (total - done) / speed)
+                if "progress" not in fields:
+                    row["progress"] = min(100.0, done * 100.0 / total)
+            if fields.get("state") in (COMPLETED, FAILED, CANCELLED, PAUSED):
+                row["speed"] = row["eta"] = None
+                self._samples.pop(job_id, None)
+            self.version += 1
+            self._versions[job_id] = self.version
+
+    def remove(self, job_id):
+        """حذف صف مهمة"""
+        with self._lock:
+            if self._rows.pop(job_id, None) is not None:
+                self.version += 1
+                self._versions.pop(job_id, None)
+                self._samples.pop(job_id, None)
+                self._removed[job_id] = self.version
+
+    def changes(self, since=0):
+        """
+        الصفوف التي تغيرت بعد إصدار معين
+
+        Args:
+            since: الإصدار الذي قرأه المستهلك آخر مرة (0 لكل الصفوف)
+
+        Returns:
+            tuple: (الإصدار الحالي، {job_id: نسخة الصف}، [معرفات الصفوف المحذوفة])
+        """
+        with self._lock:
+            changed = {job_id: dict(self._rows[job_id])
+                       for job_id, version in self._versions.items() if version > since}
+            removed = [job_id for job_id, version in self._removed.items() if version > since]
+            return self.version, changed, removed
+
+    def get(self, job_id):
+        """نسخة صف المهمة أو None"""
+        with self._lock:
+            row = self._rows.get(job_id)
+            return dict(row) if row is not None else None
+
+    def __len__(self):
+        return len(self._rows)
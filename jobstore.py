@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة طابور المهام المشترك
+Shared Job Store Module
+
+طابور مهام في قاعدة SQLite على نظام ملفات مشترك تسحب منه عدة نسخ من
+البرنامج (على أجهزة مختلفة) المهام بعقود إيجار (leases) تُجدد بنبضات.
+العقد المنتهي يُعاد إسناده لجهاز آخر يكمل من الملف الجزئي، ولا تُقبل
+نتيجة إلا من صاحب العقد الحالي فلا تكتمل المهمة مرتين
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+import logger
+import jobs
+from jobs import state_dir, new_job_id
+
+STORE_FILE = "shared_jobs.db"
+
+# مدة عقد الإيجار الافتراضية بالثواني (تُجدد كل ثلث المدة)
+DEFAULT_LEASE_SECONDS = 60
+
+# عدد مرات الحجز قبل اعتبار المهمة فاشلة: المهمة التي تُسقط عاملها (انهيار أو
+# نفاد ذاكرة) لا يُعاد إسنادها بلا نهاية عبر الأجهزة
+DEFAULT_MAX_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    result TEXT
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, created)"
+
+
+def default_node_id():
+    """معرف الجهاز والعملية (يظهر في عمود owner)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class SharedJobStore:
+    def __init__(self, path=None, lease_seconds=DEFAULT_LEASE_SECONDS, node_id=None,
+                 busy_timeout=30.0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        طابور مهام مشترك في ملف SQLite
+
+        كل التعديلات داخل معاملات BEGIN IMMEDIATE فلا يحجز جهازان نفس المهمة.
+        على أنظمة الملفات الشبكية يجب أن يدعم الخادم أقفال الملفات (لا يُستخدم WAL)
+
+        Args:
+            path: مسار قاعدة البيانات (افتراضياً داخل مجلد الحالة)
+            lease_seconds: مدة عقد الإيجار
+            node_id: معرف هذا الجهاز
+            busy_timeout: مدة انتظار القفل بالثواني
+            max_attempts: عدد مرات الحجز قبل تسجيل المهمة فاشلة عند انتهاء عقدها
+        """
+        self.path = str(path or state_dir() / STORE_FILE)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.node_id = node_id or default_node_id()
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(_SCHEMA)
+            db.execute(_INDEX)
+
+    def _connection(self):
+        # اتصال لكل خيط (خيط النبضات وخيط التحميل)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    class _Transaction:
+        def __init__(self, db):
+            self.db = db
+
+        def __enter__(self):
+            self.db.execute("BEGIN IMMEDIATE")
+            return self.db
+
+        def __exit__(self, exc_type, exc, tb):
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+            return False
+
+    def _transaction(self):
+        return self._Transaction(self._connection())
+
+    def add(self, url, job_id=None, **fields):
+        """
+        إضافة مهمة إلى الطابور (إعادة إضافة نفس المعرف لا تكررها)
+
+        Args:
+            url: رابط الفيديو
+            job_id: معرف المهمة (افتراضياً معرف جديد)
+            fields: بيانات المهمة (quality, save_path, option...)
+
+        Returns:
+            str: معرف المهمة
+        """
+        job_id = job_id or new_job_id()
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO jobs (job_id, url, payload, state, created, updated)"
+                       " VALUES (?, ?, ?, ?, ?, ?)",
+                       (job_id, url, json.dumps(fields, ensure_ascii=False), jobs.QUEUED,
+                        now, now))
+        return job_id
+
+    def claim(self):
+        """
+        حجز أقدم مهمة متاحة: في الطابور أو انتهى عقد صاحبها
+
+        المهمة التي انتهى عقدها بعد max_attempts مرة حجز تُسجل فاشلة وتُتخطى
+
+        Returns:
+            dict: المهمة مع lease_token و attempts، أو None إذا لا توجد مهام
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._transaction() as db:
+            while True:
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?)"
+                    " ORDER BY created LIMIT 1", (jobs.QUEUED, jobs.RUNNING, now)).fetchone()
+                if row is None:
+                    return None
+                if row["state"] != jobs.RUNNING:
+                    break
+                if row["attempts"] < self.max_attempts:
+                    logger.warning(f"Reassigning expired lease from {row['owner']}",
+                                   job_id=row["job_id"], phase="store")
+                    break
+                error = f"lease expired after {row['attempts']} attempts"
+                logger.error(f"Giving up on job: {error}", job_id=row["job_id"], phase="store")
+                db.execute("UPDATE jobs SET state = ?, owner = NULL, lease_expires = NULL,"
+                           " result = ?, updated = ? WHERE job_id = ?",
+                           (jobs.FAILED, json.dumps({"error": error}), now, row["job_id"]))
+            db.execute("UPDATE jobs SET state = ?, owner = ?, lease_token = ?, lease_expires = ?,"
+                       " attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                       (jobs.RUNNING, self.node_id, token, now + self.lease_seconds, now,
+                        row["job_id"]))
+        job = self._row_to_job(row)
+        job.update(state=jobs.RUNNING, owner=self.node_id, lease_token=token,
+                   attempts=row["attempts"] + 1)
+        return job
+
+    def heartbeat(self, job):
+        """
+        تجديد عقد مهمة
+
+        Returns:
+            bool: False إذا فُقد العقد (يجب إيقاف التحميل فوراً)
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_expires = ?, updated = ?"
+                                " WHERE job_id = ? AND lease_token = ? AND state = ?",
+                                (now + self.lease_seconds, now, job["job_id"],
+                                 job["lease_token"], jobs.RUNNING))
+        return cursor.rowcount == 1
+
+    def _finish(self, job, state, result=None):
+        """تغيير حالة مهمة بشرط أن يكون العقد ما زال لنا (fencing)"""
+        # الإعادة إلى الطابور ليست محاولة فاشلة فلا تُحسب من max_attempts
+        refund = 1 if state == jobs.QUEUED else 0
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET state = ?, owner = NULL, lease_expires = NULL,"
+                                " result = ?, updated = ?, attempts = MAX(0, attempts - ?)"
+                                " WHERE job_id = ? AND lease_token = ? AND state = ?",
+                                (state, json.dumps(result, ensure_ascii=False)
+                                 if result is not None else None, time.time(), refund,
+                                 job["job_id"], job["lease_token"], jobs.RUNNING))
+        if cursor.rowcount != 1:
+            logger.warning(f"Lease lost before marking {state}", job_id=job["job_id"],
+                           phase="store")
+            return False
+        return True
+
+    def complete(self, job, result=None):
+        """
+        تسجيل اكتمال المهمة
+
+        Returns:
+            bool: True إذا قُبلت النتيجة (False إذا انتهى العقد وأُسند لغيرنا)
+        """
+        return self._finish(job, jobs.COMPLETED, result)
+
+    def fail(self, job, error=None):
+        """تسجيل فشل المهمة نهائياً"""
+        return self._finish(job, jobs.FAILED, {"error": error} if error else None)
+
+    def release(self, job):
+        """إعادة المهمة إلى الطابور (مثل إيقاف هذا الجهاز) ليكملها جهاز آخر"""
+        return self._finish(job, jobs.QUEUED)
+
+    def get(self, job_id):
+        """المهمة أو None"""
+        row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?",
+                                         (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def counts(self):
+        """
+        عدد المهام في كل حالة
+
+        Returns:
+            dict: الحالة -> العدد
+        """
+        rows = self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return {state: count for state, count in rows}
+
+    @staticmethod
+    def _row_to_job(row):
+        job = json.loads(row["payload"])
+        job.update({key: row[key] for key in ("job_id", "url", "state", "owner", "lease_token",
+                                              "lease_expires", "attempts")})
+        if row["result"]:
+            job["result"] = json.loads(row["result"])
+        return job
+
+    def close(self):
+        """إغلاق اتصال الخيط الحالي"""
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+class StoreWorker:
+    def __init__(self, store, downloader_factory=None, save_path=None, poll_interval=2.0):
+        """
+        عامل يسحب المهام من الطابور المشترك ويحملها واحدة تلو الأخرى
+
+        Args:
+            store: الطابور المشترك
+            downloader_factory: دالة تنشئ VideoDownloader
+            save_path: مجلد الحفظ الافتراضي (يُفضل مجلد مشترك ليكمل جهاز آخر الملف الجزئي)
+            poll_interval: فترة انتظار مهام جديدة بالثواني
+        """
+        if downloader_factory is None:
+            from downloader import VideoDownloader
+            downloader_factory = VideoDownloader
+        self.store = store
+        self.downloader_factory = downloader_factory
+        self.save_path = save_path
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._current = None
+
+    def stop(self):
+        """التوقف وإرجاع المهمة الحالية إلى الطابور مع ملفها الجزئي"""
+        self._stop.set()
+        downloader = self._current
+        if downloader is not None:
+            downloader.cancel_download(keep_partial=True)
+
+    def run(self, max_jobs=None, stop_when_idle=False):
+        """
+        حلقة العامل
+
+        Args:
+            max_jobs: التوقف بعد هذا العدد من المهام (None بلا حد)
+            stop_when_idle: التوقف عندما لا تبقى مهام متاحة (مثل دفعة ليلية)
+
+        Returns:
+            int: عدد المهام المكتملة
+        """
+        completed = handled = 0
+        while not self._stop.is_set() and (max_jobs is None or handled < max_jobs):
+            job = self.store.claim()
+            if job is None:
+                if stop_when_idle:
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+            handled += 1
+            if self.run_job(job):
+                completed += 1
+        return completed
+
+    def run_job(self, job):
+        """
+        تحميل مهمة محجوزة مع تجديد العقد طوال التحميل
+
+        Returns:
+            bool: True إذا اكتملت وقُبلت النتيجة
+        """
+        job_id = job["job_id"]
+        downloader = self.downloader_factory()
+        self._current = downloader
+        lost = threading.Event()
+        done = threading.Event()
+
+        def beat():
+            # اتصال SQLite خاص بهذا الخيط
+            interval = max(0.05, self.store.lease_seconds / 3.0)
+            try:
+                while not done.wait(interval):
+                    try:
+                        renewed = self.store.heartbeat(job)
+                    except sqlite3.Error as e:
+                        # قفل مؤقت على القاعدة: نحاول في النبضة التالية قبل انتهاء العقد
+                        logger.warning(f"Heartbeat failed: {e}", job_id=job_id, phase="store")
+                        continue
+                    if not renewed:
+                        lost.set()
+                        logger.warning("Lease lost, stopping download", job_id=job_id,
+                                       phase="store")
+                        # الجهاز الجديد يكمل من نفس الملف الجزئي فلا نحذفه
+                        downloader.cancel_download(keep_partial=True)
+                        return
+            finally:
+                self.store.close()
+
+        heartbeat = threading.Thread(target=beat, name=f"lease-{job_id}", daemon=True)
+        heartbeat.start()
+        logger.info(f"Claimed job (attempt {job['attempts']})", job_id=job_id, phase="store")
+        success = interrupted = False
+        try:
+            info = None
+            option = job.get("option")
+            if not option:
+                info = downloader.get_video_info(job["url"])
+                if info:
+                    options = downloader.get_quality_options(info.get("formats", []))
+                    option = downloader.select_quality(options, job.get("quality", "best"))
+            if option and not lost.is_set() and not self._stop.is_set():
+                success = downloader.download_video(job["url"], None,
+                                                    job.get("save_path") or self.save_path,
+                                                    selected_quality=option, info=info)
+        except KeyboardInterrupt:
+            interrupted = True
+            self.stop()
+        except Exception as e:
+            logger.error(f"Shared job crashed: {e}", job_id=job_id, phase="store")
+        finally:
+            self._current = None
+            done.set()
+            heartbeat.join(5)
+
+        if lost.is_set():
+            return False
+        if self._stop.is_set() and not success:
+            self.store.release(job)
+            if interrupted:
+                raise KeyboardInterrupt
+            return False
+        retry = getattr(downloader, "retry_metrics", None)
+        result = {"node": self.store.node_id, "retry": retry.as_dict() if retry else None}
+        if success:
+            return self.store.complete(job, result)
+        self.store.fail(job, "download failed")
+        return False
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة التسجيل في الخلفية
+Background Logging Module
+
+مسجل يعتمد على طابور وخيط كتابة في الخلفية بحيث لا يحجب التسجيل
+خيوط التحميل أبداً، مع كتابة مجمعة وتدوير الملف حسب الحجم والعمر
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+from pathlib import Path
+from contextlib import contextmanager
+
+# مستويات التسجيل المدعومة
+LEVELS = {
+    "DEBUG": 10,
+    "INFO": 20,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+DEFAULT_LOG_DIR = Path(__file__).parent / "logs"
+DEFAULT_LOG_FILE = "downloader.log"
+
+# متغير بيئة لتغيير مجلد السجل الافتراضي (مثل الاختبارات أو الخوادم)
+LOG_DIR_ENV = "VIDEO_DOWNLOADER_LOG_DIR"
+
+
+class BackgroundLogger:
+    def __init__(self, log_dir=None, filename=DEFAULT_LOG_FILE,
+                 max_bytes=5 * 1024 * 1024, max_age=24 * 3600, backup_count=5,
+                 capacity=10000, batch_size=200, flush_interval=0.5,
+                 debug_watermark=0.8, echo_level="ERROR"):
+        """
+        تهيئة المسجل
+
+        Args:
+            log_dir: مجلد ملفات السجل
+            filename: اسم ملف السجل
+            max_bytes: الحجم الأقصى للملف قبل التدوير
+            max_age: العمر الأقصى للملف بالثواني قبل التدوير
+            backup_count: عدد الملفات القديمة المحفوظة
+            capacity: سعة الطابور (عدد الأسطر)
+            batch_size: الحد الأقصى للأسطر في كل عملية كتابة
+            flush_interval: الفترة القصوى بين عمليات الكتابة بالثواني
+            debug_watermark: نسبة امتلاء الطابور التي تُسقط عندها أسطر DEBUG
+            echo_level: المستوى الذي تُطبع عنده الرسائل على stderr أيضاً
+        """
+        if not log_dir:
+            log_dir = os.environ.get(LOG_DIR_ENV) or DEFAULT_LOG_DIR
+        self.log_dir = Path(log_dir)
+        self.log_file = self.log_dir / filename
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.debug_limit = max(1, int(capacity * debug_watermark))
+        self.echo_level = LEVELS.get(echo_level, LEVELS["ERROR"]) if echo_level else None
+
+        self._queue = queue.Queue(maxsize=capacity)
+        self._file = None
+        self._first_write_at = None  # وقت أول سطر في الملف الحالي
+        self._closed = False
+        self._lock = threading.Lock()
+
+        # إحصائيات
+        self.written = 0
+        self.dropped = 0
+        self.dropped_debug = 0
+
+        self._thread = threading.Thread(target=self._writer_loop,
+                                        name="log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, level, message, job_id=None, phase=None, duration=None, **fields):
+        """
+        إضافة سطر إلى طابور السجل دون انتظار
+
+        Args:
+            level: مستوى الرسالة (DEBUG, INFO, WARNING, ERROR)
+            message: نص الرسالة
+            job_id: معرف مهمة التحميل (اختياري)
+            phase: مرحلة المهمة مثل extract أو download (اختياري)
+            duration: مدة المرحلة بالثواني (اختياري)
+            fields: حقول إضافية تُكتب بصيغة key=value
+
+        Returns:
+            bool: True إذا أُضيف السطر، False إذا أُسقط
+        """
+        if self._closed:
+            return False
+
+        level = str(level).upper()
+        record = (time.time(), level, str(message), job_id, phase, duration, fields)
+
+        # تحت الضغط نُسقط أسطر DEBUG أولاً
+        if level == "DEBUG" and self._queue.qsize() >= self.debug_limit:
+            self.dropped_debug += 1
+            return False
+
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def debug(self, message, **kwargs):
+        return self.log("DEBUG", message, **kwargs)
+
+    def info(self, message, **kwargs):
+        return self.log("INFO", message, **kwargs)
+
+    def warning(self, message, **kwargs):
+        return self.log("WARNING", message, **kwargs)
+
+    def error(self, message, **kwargs):
+        return self.log("ERROR", message, **kwargs)
+
+    @contextmanager
+    def timed(self, phase, message=None, job_id=None, level="INFO", **fields):
+        """
+        قياس مدة مرحلة وتسجيلها عند انتهائها
+
+        Args:
+            phase: اسم المرحلة
+            message: نص الرسالة (افتراضياً اسم المرحلة)
+            job_id: معرف المهمة
+            level: مستوى الرسالة
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.log(level, message or phase, job_id=job_id, phase=phase,
+                     duration=time.monotonic() - start, **fields)
+
+    def format_record(self, record):
+        """تحويل السجل إلى سطر نصي"""
+        created, level, message, job_id, phase, duration, fields = record
+        timestamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+        line = f"[{timestamp}] {level}: {message}"
+
+        extras = []
+        if job_id is not None:
+            extras.append(f"job={job_id}")
+        if phase:
+            extras.append(f"phase={phase}")
+        if duration is not None:
+            extras.append(f"duration={duration:.3f}s")
+        for key, value in fields.items():
+            extras.append(f"{key}={value}")
+        if extras:
+            line += " | " + " ".join(extras)
+
+        return line.replace("\n", " ") + "\n"
+
+    def _writer_loop(self):
+        """خيط الكتابة: يجمع الأسطر ويكتبها دفعة واحدة"""
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._closed:
+                    break
+                continue
+
+            if record is None:
+                self._queue.task_done()
+                break
+
+            batch = [record]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write_batch(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                break
+
+        self._close_file()
+
+    def _write_batch(self, batch):
+        """كتابة مجموعة من السجلات في عملية واحدة"""
+        lines = [self.format_record(record) for record in batch]
+        data = "".join(lines)
+
+        with self._lock:
+            try:
+                self._rotate_if_needed(len(data.encode("utf-8")))
+                if self._file is None:
+                    self._open_file()
+                self._file.write(data)
+                self._file.flush()
+                self.written += len(batch)
+            except Exception:
+                # في حالة فشل الكتابة لا نرفع استثناء من خيط التسجيل
+                self.dropped += len(batch)
+
+        if self.echo_level is not None and sys.stderr is not None:
+            for record, line in zip(batch, lines):
+                if LEVELS.get(record[1], 0) >= self.echo_level:
+                    try:
+                        sys.stderr.write(line)
+                    except Exception:
+                        pass
+
+    def _open_file(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self._first_write_at = self._read_first_write_time()
+        self._file = open(self.log_file, "a", encoding="utf-8")
+        if self._first_write_at is None:
+            self._first_write_at = time.time()
+            
+    def _read_first_write_time(self):
+        """
+        قراءة وقت أول سطر في ملف السجل الموجود
+
+        Returns:
+            float: الوقت، أو None إذا كان الملف غير موجود أو فارغاً
+        """
+        try:
+            with open(self.log_file, encoding="utf-8", errors="replace") as f:
+                first_line = f.readline(200)
+        except OSError:
+            return None
+        if not first_line:
+            return None
+        try:
+            return datetime.strptime(first_line[1:20], "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            # سطر بصيغة غير معروفة: نعتمد وقت آخر تعديل
+            try:
+                return self.log_file.stat().st_mtime
+            except OSError:
+                return None
+
+    def _close_file(self):
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+    def _rotate_if_needed(self, incoming_size):
+        """تدوير الملف إذا تجاوز الحجم أو العمر المسموح"""
+        try:
+            size = self.log_file.stat().st_size
+        except OSError:
+            return
+
+        too_big = self.max_bytes and size + incoming_size > self.max_bytes
+        if self._first_write_at is None:
+            self._first_write_at = self._read_first_write_time()
+        too_old = (self.max_age and self._first_write_at is not None
+                   and time.time() - self._first_write_at > self.max_age)
+        if not (too_big or too_old) or size == 0:
+            return
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        # إزاحة الملفات القديمة: downloader.log.1 -> downloader.log.2 ...
+        for index in range(self.backup_count - 1, 0, -1):
+            src = self.log_file.with_name(f"{self.log_file.name}.{index}")
+            dst = self.log_file.with_name(f"{self.log_file.name}.{index + 1}")
+            if src.exists():
+                os.replace(src, dst)
+        if self.backup_count > 0:
+            os.replace(self.log_file, self.log_file.with_name(f"{self.log_file.name}.1"))
+        else:
+            os.remove(self.log_file)
+        self._first_write_at = None
+
+    def flush(self, timeout=5.0):
+        """
+        انتظار كتابة كل الأسطر الموجودة في الطابور
+
+        Returns:
+            bool: True إذا فرغ الطابور قبل انتهاء المهلة
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            if not self._thread.is_alive():
+                return False
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout=5.0):
+        """إيقاف خيط الكتابة بعد تفريغ الطابور"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self):
+        """إحصائيات المسجل"""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "dropped_debug": self.dropped_debug,
+        }
+
+
+_default_logger = None
+_default_lock = threading.Lock()
+
+
+def get_logger():
+    """
+    الحصول على المسجل المشترك لكل وحدات البرنامج
+
+    Returns:
+        BackgroundLogger: المسجل المشترك
+    """
+    global _default_logger
+    if _default_logger is None:
+        with _default_lock:
+            if _default_logger is None:
+                _default_logger = BackgroundLogger()
+                atexit.register(_default_logger.close)
+    return _default_logger
+
+
+def log(level, message, **kwargs):
+    """تسجيل رسالة عبر المسجل المشترك"""
+    return get_logger().log(level, message, **kwargs)
+
+
+def debug(message, **kwargs):
+    return get_logger().debug(message, **kwargs)
+
+
+def info(message, **kwargs):
+    return get_logger().info(message, **kwargs)
+
+
+def warning(message, **kwargs):
+    return get_logger().warning(message, **kwargs)
+
+
+def error(message, **kwargs):
+    return get_logger().error(message, **kwargs)
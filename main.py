@@ -12,12 +12,20 @@ from tkinter import ttk, filedialog, messagebox
 import threading
 import os
 import sys
+import time
 from pathlib import Path
 import json
 
 # استيراد الوحدات المخصصة
-from downloader import VideoDownloader
-from utils import format_size, format_time, validate_url
+from downloader import VideoDownloader, SHUTDOWN_TIMEOUT
+import jobs
+from jobs import JobJournal, new_job_id
+from utils import format_size, format_time, validate_url, is_video_url
+from widgets import MessageLog, JobTable
+import logger
+
+# مهلة الانتظار بعد آخر تعديل للرابط قبل الجلب المسبق (بالمللي ثانية)
+PREFETCH_DELAY_MS = 600
 
 class DownloadApp:
     def __init__(self, root):
@@ -25,12 +33,19 @@ class DownloadApp:
         self.setup_window()
         self.setup_variables()
         self.setup_ui()
-        self.downloader = VideoDownloader(self.update_progress, self.update_status)
+        self.downloader = VideoDownloader(self.update_progress, self.update_status,
+                                          async_postprocess=True,
+                                          postprocess_callback=self._on_postprocess_done,
+                                          checkpoint_callback=self._on_checkpoint)
+        
+        # سجل المهام: استئناف ما لم يكتمل في جلسة سابقة (إيقاف أو انهيار)
+        self.journal = JobJournal()
+        self.root.after(500, self._offer_unfinished_jobs)
         
     def setup_window(self):
         """إعداد النافذة الرئيسية"""
         self.root.title("برنامج تحميل الفيديوهات والملفات - Video Downloader")
-        self.root.geometry("700x500")
+        self.root.geometry("700x650")
         self.root.minsize(600, 400)
         
         # تعيين أيقونة النافذة (إذا كانت متوفرة)
@@ -66,6 +81,17 @@ class DownloadApp:
         self.is_paused = False
         self.current_download = None
         self.quality_options = []  # لحفظ خيارات الجودة
+        self.video_info = None  # المعلومات التي بُنيت منها خيارات الجودة
+        self.video_info_url = None  # الرابط الذي جُلبت له هذه المعلومات
+        self._info_task = None  # مهمة جلب المعلومات الجارية (قابلة للإلغاء)
+        self.current_job = None  # بيانات التحميل الجاري (تُسجل في سجل المهام)
+        # لوحة التقدم المركزية التي يقرأ منها جدول المهام
+        self.progress_board = jobs.ProgressBoard()
+        
+        # الجلب المسبق للمعلومات عند لصق الرابط
+        self._prefetch_after_id = None
+        self._prefetch_cancel = None
+        self.url_var.trace_add("write", self._on_url_changed)
         
     def setup_ui(self):
         """إنشاء واجهة المستخدم"""
@@ -162,45 +188,69 @@ class DownloadApp:
         message_frame.columnconfigure(0, weight=1)
         main_frame.rowconfigure(11, weight=1)
         
-        self.message_text = tk.Text(message_frame, height=6, wrap=tk.WORD, 
-                                   font=("Arial", 9), state="disabled")
-        self.message_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        message_frame.rowconfigure(0, weight=1)
         
-        # شريط التمرير للرسائل
-        message_scrollbar = ttk.Scrollbar(message_frame, orient="vertical", 
-                                         command=self.message_text.yview)
-        message_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.message_text.configure(yscrollcommand=message_scrollbar.set)
+        # سجل بسعة ثابتة يُرسم على دفعات مع تصفية حسب النوع أو النص
+        self.message_log = MessageLog(message_frame)
+        self.message_log.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-    def add_message(self, message, msg_type="info"):
-        """إضافة رسالة إلى منطقة الرسائل"""
-        self.message_text.configure(state="normal")
-        
-        # تحديد لون الرسالة حسب النوع
-        if msg_type == "error":
-            tag = "error"
-            self.message_text.tag_configure("error", foreground="#e74c3c")
-        elif msg_type == "success":
-            tag = "success"
-            self.message_text.tag_configure("success", foreground="#27ae60")
-        elif msg_type == "warning":
-            tag = "warning"
-            self.message_text.tag_configure("warning", foreground="#f39c12")
-        else:
-            tag = "info"
-            self.message_text.tag_configure("info", foreground="#2c3e50")
+        # جدول المهام: يُحدّث الصفوف المتغيرة فقط من لوحة التقدم على فترات ثابتة
+        jobs_frame = ttk.LabelFrame(main_frame, text="المهام", padding="10")
+        jobs_frame.grid(row=12, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S),
+                        pady=(10, 0))
+        jobs_frame.columnconfigure(0, weight=1)
+        jobs_frame.rowconfigure(0, weight=1)
+        main_frame.rowconfigure(12, weight=1)
         
-        # إضافة الرسالة مع الوقت
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        full_message = f"[{timestamp}] {message}\n"
+        self.job_table = JobTable(jobs_frame, self.progress_board, height=5)
+        self.job_table.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.job_table.start()
         
-        self.message_text.insert(tk.END, full_message, tag)
-        self.message_text.see(tk.END)
-        self.message_text.configure(state="disabled")
+    def add_message(self, message, msg_type="info"):
+        """إضافة رسالة إلى منطقة الرسائل (تُرسم مع الدفعة التالية)"""
+        self.message_log.add(message, msg_type)
+        
+    def _on_url_changed(self, *args):
+        """جدولة جلب مسبق للمعلومات بعد توقف الكتابة في حقل الرابط"""
+        if self._prefetch_after_id is not None:
+            self.root.after_cancel(self._prefetch_after_id)
+            self._prefetch_after_id = None
+            
+        # إلغاء الجلب المسبق الجاري لرابط قديم
+        if self._prefetch_cancel is not None:
+            self._prefetch_cancel.set()
+            self._prefetch_cancel = None
+            
+        self._prefetch_after_id = self.root.after(PREFETCH_DELAY_MS, self._start_prefetch)
         
+    def _start_prefetch(self):
+        """بدء الجلب المسبق إذا كان الرابط رابط فيديو صحيح"""
+        self._prefetch_after_id = None
+        url = self.url_var.get().strip()
+        if not validate_url(url) or not is_video_url(url):
+            return
+            
+        cancel_event = threading.Event()
+        self._prefetch_cancel = cancel_event
+        thread = threading.Thread(target=self._prefetch_thread, args=(url, cancel_event))
+        thread.daemon = True
+        thread.start()
+        
+    def _prefetch_thread(self, url, cancel_event):
+        """خيط الجلب المسبق: تُحفظ النتيجة في ذاكرة المعلومات المؤقتة"""
+        try:
+            info = self.downloader.prefetch_video_info(url, cancel_event=cancel_event)
+            if info and not cancel_event.is_set():
+                logger.debug(f"Prefetched video info: {url}", phase="prefetch")
+        except Exception as e:
+            logger.error(f"Prefetch error: {e}", phase="prefetch")
+            
     def fetch_info(self):
-        """جلب معلومات الفيديو والجودات المتاحة"""
+        """جلب معلومات الفيديو والجودات المتاحة (أو إلغاء الجلب الجاري)"""
+        if self._info_task is not None and not self._info_task.done():
+            self.cancel_fetch()
+            return
+            
         url = self.url_var.get().strip()
         if not url:
             self.add_message("يرجى إدخال رابط صحيح", "error")
@@ -211,34 +261,58 @@ class DownloadApp:
             return
             
         self.add_message("جاري جلب معلومات الفيديو...")
-        self.fetch_btn.configure(state="disabled")
+        # زر الجلب يصبح زر إلغاء أثناء الجلب
+        self.fetch_btn.configure(text="إلغاء الجلب")
+        if not self.is_downloading:
+            self.cancel_btn.configure(state="normal")
         
         # إعادة تعيين قائمة الجودة
         self.quality_combo["values"] = ["جاري جلب خيارات الجودة..."]
         self.quality_combo.current(0)
         
-        # تشغيل جلب المعلومات في خيط منفصل
-        thread = threading.Thread(target=self._fetch_info_thread, args=(url,))
+        # تشغيل جلب المعلومات كمهمة قابلة للإلغاء
+        task = self.downloader.start_info_task(url)
+        self._info_task = task
+        thread = threading.Thread(target=self._fetch_info_thread, args=(url, task))
         thread.daemon = True
         thread.start()
         
-    def _fetch_info_thread(self, url):
-        """خيط جلب معلومات الفيديو"""
-        try:
-            info = self.downloader.get_video_info(url)
-            if info:
-                # تحديث واجهة المستخدم في الخيط الرئيسي
-                self.root.after(0, self._update_video_info, info)
-            else:
-                self.root.after(0, self.add_message, "فشل في جلب معلومات الفيديو", "error")
-                self.root.after(0, self._set_default_quality_options)
-        except Exception as e:
-            self.root.after(0, self.add_message, f"خطأ: {str(e)}", "error")
-            self.root.after(0, self._set_default_quality_options)
-        finally:
-            self.root.after(0, lambda: self.fetch_btn.configure(state="normal"))
+    def cancel_fetch(self):
+        """إلغاء جلب المعلومات الجاري وإنهاء عملية yt-dlp فوراً"""
+        task, self._info_task = self._info_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            self.add_message("تم إلغاء جلب المعلومات", "warning")
+            self._set_default_quality_options()
+        self._fetch_completed()
+        
+    def _fetch_completed(self):
+        """إعادة زر الجلب إلى حالته بعد انتهاء الجلب أو إلغائه"""
+        self.fetch_btn.configure(text="جلب المعلومات",
+                                 state="disabled" if self.is_downloading else "normal")
+        if not self.is_downloading:
+            self.cancel_btn.configure(state="disabled")
+        
+    def _fetch_info_thread(self, url, task):
+        """خيط انتظار مهمة جلب معلومات الفيديو"""
+        info = task.wait()
+        self.root.after(0, self._fetch_info_done, url, task, info)
+        
+    def _fetch_info_done(self, url, task, info):
+        """معالجة نتيجة الجلب في الخيط الرئيسي"""
+        # نتيجة مهمة أُلغيت أو استُبدلت بجلب أحدث
+        if task is not self._info_task:
+            return
+        self._info_task = None
+        self._fetch_completed()
+        if info:
+            self.downloader.current_info = info
+            self._update_video_info(info, url)
+        else:
+            self.add_message("فشل في جلب معلومات الفيديو", "error")
+            self._set_default_quality_options()
             
-    def _update_video_info(self, info):
+    def _update_video_info(self, info, url=None):
         """تحديث معلومات الفيديو في الواجهة"""
         title = info.get("title", "غير معروف")
         duration = info.get("duration", 0)
@@ -251,6 +325,8 @@ class DownloadApp:
         self.add_message(f"المدة: {duration_str}")
         
         # تحديث قائمة الجودات
+        self.video_info = info
+        self.video_info_url = url
         formats = info.get("formats", [])
         self.quality_options = self.downloader.get_quality_options(formats)
         
@@ -273,6 +349,7 @@ class DownloadApp:
         ]
         self.quality_combo["values"] = default_options
         self.quality_combo.current(0)
+        self.video_info = None
         self.quality_options = [
             {"format_id": "best", "label": "أفضل جودة متاحة", "type": "best"},
             {"format_id": "worst", "label": "جودة متوسطة", "type": "medium"},
@@ -293,6 +370,10 @@ class DownloadApp:
             self.add_message("يرجى إدخال رابط صحيح", "error")
             return
             
+        if self._info_task is not None:
+            self.add_message("يرجى انتظار انتهاء جلب المعلومات أو إلغاؤه", "error")
+            return
+            
         if not self.quality_var.get():
             self.add_message("يرجى اختيار جودة الفيديو أولاً", "error")
             return
@@ -302,6 +383,33 @@ class DownloadApp:
             self.add_message("مسار الحفظ غير موجود", "error")
             return
             
+        # لقطة من الخيار المختار والمعلومات التي بُني منها
+        selected_quality = self.quality_combo.current()
+        if not self.quality_options:
+            self._set_default_quality_options()
+        selected_option = None
+        if 0 <= selected_quality < len(self.quality_options):
+            selected_option = self.quality_options[selected_quality]
+        info = self.video_info if self.video_info_url == url else None
+        if info is None and selected_option and selected_option.get("type") not in \
+                ["best", "medium", "worst", "audio"]:
+            # الخيارات المعروضة تخص رابطاً آخر
+            self.add_message("تغير الرابط، يرجى جلب المعلومات مرة أخرى", "error")
+            return
+            
+        self._start_download_job({
+            "job_id": new_job_id(),
+            "url": url,
+            "save_path": save_path,
+            "option": selected_option,
+            "title": (info or {}).get("title"),
+        }, info)
+        
+    def _start_download_job(self, job, info=None):
+        """بدء تحميل مهمة في خيط منفصل"""
+        self.current_job = job
+        self._record_job(jobs.RUNNING)
+        
         # تحديث حالة الأزرار
         self.download_btn.configure(state="disabled")
         self.pause_btn.configure(state="normal")
@@ -311,69 +419,107 @@ class DownloadApp:
         self.is_downloading = True
         self.is_paused = False
         
-        # بدء التحميل في خيط منفصل
-        selected_quality = self.quality_combo.current()
-        thread = threading.Thread(target=self._download_thread, 
-                                 args=(url, selected_quality, save_path))
+        thread = threading.Thread(target=self._download_thread, args=(job, info))
         thread.daemon = True
         thread.start()
         
         self.add_message("بدء التحميل...", "success")
         
-    def _download_thread(self, url, quality_index, save_path):
+    def _offer_unfinished_jobs(self):
+        """
+        عرض استئناف المهام غير المكتملة من سجل المهام
+        
+        تُعرض مهمة واحدة في كل مرة، والباقي يبقى في السجل ويُعرض بعد انتهائها
+        """
+        if self.is_downloading:
+            return
+        unfinished = self.journal.unfinished()
+        for job in unfinished:
+            self.progress_board.update(job["job_id"], title=job.get("title"), url=job.get("url"),
+                                       state=job.get("state"),
+                                       downloaded=job.get("downloaded_bytes"),
+                                       total=job.get("total_bytes"))
+        for job in unfinished:
+            if not job.get("url") or not job.get("option"):
+                self._cancel_journal_job(job["job_id"])
+                continue
+            name = job.get("title") or job["url"]
+            state = "متوقف مؤقتاً" if job.get("state") == jobs.PAUSED else "غير مكتمل"
+            if messagebox.askyesno("تحميل غير مكتمل",
+                                   f"يوجد تحميل {state}:\n{name}\n\nهل تريد استئنافه؟"):
+                self.url_var.set(job["url"])
+                self.add_message(f"استئناف التحميل: {name}")
+                self._start_download_job({key: job.get(key) for key in
+                                          ("job_id", "url", "save_path", "option", "title")})
+                return
+            self._cancel_journal_job(job["job_id"])
+        # السجل يحتوي الآن على المهام غير المكتملة فقط
+        self.journal.compact()
+        
+    def _cancel_journal_job(self, job_id):
+        """إلغاء مهمة من السجل لن تُستأنف"""
+        self.journal.record(job_id, jobs.CANCELLED)
+        self.progress_board.update(job_id, state=jobs.CANCELLED)
+        
+    def _record_job(self, state, **fields):
+        """تسجيل حالة المهمة الحالية في سجل المهام ولوحة التقدم"""
+        job = self.current_job
+        if job is not None:
+            self.journal.record(job["job_id"], state, url=job["url"],
+                                save_path=job["save_path"], option=job["option"],
+                                title=job.get("title"), **fields)
+            self.progress_board.update(job["job_id"], state=state, url=job["url"],
+                                       title=job.get("title"))
+            
+    def _on_checkpoint(self, downloaded_bytes, total_bytes):
+        """حفظ نقطة تقدم المهمة الحالية (يُستدعى من خيط التحميل)"""
+        job = self.current_job
+        if job is not None:
+            self.journal.checkpoint(job["job_id"], downloaded_bytes, total_bytes)
+            self.progress_board.update(job["job_id"], downloaded=downloaded_bytes,
+                                       total=total_bytes or None)
+        
+    def _download_thread(self, job, info=None):
         """خيط التحميل"""
+        url, selected_option, save_path = job["url"], job["option"], job["save_path"]
+        success = False
         try:
-            # التأكد من وجود خيارات الجودة
-            if not self.quality_options:
-                # إذا لم تكن متاحة، استخدم الخيارات الافتراضية
-                self._set_default_quality_options()
-                
-            # استخدام format_id مباشرة للخيارات الافتراضية
-            if quality_index < len(self.quality_options):
-                selected_option = self.quality_options[quality_index]
-                if selected_option.get("type") in ["best", "medium", "worst", "audio"]:
-                    # استخدام yt-dlp مع format_id مباشرة
-                    success = self._download_with_format_id(url, selected_option["format_id"], save_path)
-                else:
-                    success = self.downloader.download_video(url, quality_index, save_path)
-            else:
+            # الخيارات الافتراضية (محددات عامة) وخيارات الفيديو تمر بنفس مسار التحميل
+            if selected_option is None:
                 success = False
+            else:
+                success = self.downloader.download(url, save_path,
+                                                   selected_quality=selected_option, info=info)
                 
             if success:
                 self.root.after(0, self.add_message, "تم التحميل بنجاح!", "success")
-            else:
+                merge_stats = self.downloader.pipeline_stats().get("merge", {})
+                pending = merge_stats.get("queued", 0) + merge_stats.get("running", 0)
+                if pending:
+                    self.root.after(0, self.add_message,
+                                    f"عمليات دمج قيد الانتظار: {pending}")
+            elif not job.get("cancelled"):
                 self.root.after(0, self.add_message, "فشل التحميل", "error")
                 
         except Exception as e:
             self.root.after(0, self.add_message, f"خطأ في التحميل: {str(e)}", "error")
         finally:
-            self.root.after(0, self._download_completed)
-            
-    def _download_with_format_id(self, url, format_id, save_path):
-        """تحميل باستخدام format_id مباشرة"""
-        try:
-            import subprocess
-            
-            # تحضير مسار الحفظ
-            output_template = os.path.join(save_path, "%(title)s.%(ext)s")
-            
-            cmd = [
-                "yt-dlp",
-                "-f", format_id,
-                "-o", output_template,
-                "--no-playlist",
-                url
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            return result.returncode == 0
-            
-        except Exception as e:
-            print(f"Download with format_id error: {e}")
-            return False
+            if job.get("cancelled"):
+                state = jobs.CANCELLED
+            else:
+                state = jobs.COMPLETED if success else jobs.FAILED
+            self.root.after(0, self._download_completed, job, state)
             
-    def _download_completed(self):
+    def _download_completed(self, job=None, state=jobs.CANCELLED):
         """إعادة تعيين الواجهة بعد انتهاء التحميل"""
+        if job is not None and job is not self.current_job:
+            # نتيجة تحميل سابق انتهى بعد إلغائه
+            return
+        if job is not None and job.get("cancelled"):
+            self.add_message("تم إلغاء التحميل", "warning")
+        # إحصائيات إعادة المحاولة ضمن بيانات المهمة
+        self._record_job(state, retry=self.downloader.retry_metrics.as_dict())
+        self.current_job = None
         self.is_downloading = False
         self.is_paused = False
         
@@ -385,32 +531,85 @@ class DownloadApp:
         self.progress_var.set(0)
         self.status_var.set("جاهز للتحميل")
         
+        # عرض المهمة التالية غير المكتملة من السجل إن وجدت
+        self.root.after(500, self._offer_unfinished_jobs)
+        
     def toggle_pause(self):
         """إيقاف مؤقت أو استئناف التحميل"""
         if self.is_downloading:
             if self.is_paused:
                 self.downloader.resume_download()
                 self.is_paused = False
+                self._record_job(jobs.RUNNING)
                 self.pause_btn.configure(text="إيقاف مؤقت")
                 self.add_message("تم استئناف التحميل")
             else:
                 self.downloader.pause_download()
                 self.is_paused = True
+                # حفظ المهمة حتى يمكن استئنافها بعد إعادة تشغيل البرنامج
+                self._record_job(jobs.PAUSED)
                 self.pause_btn.configure(text="استئناف")
                 self.add_message("تم إيقاف التحميل مؤقتاً")
                 
     def cancel_download(self):
-        """إلغاء التحميل"""
+        """إلغاء التحميل (أو جلب المعلومات الجاري)"""
+        if self._info_task is not None:
+            self.cancel_fetch()
         if self.is_downloading:
             result = messagebox.askyesno("تأكيد الإلغاء", "هل تريد إلغاء التحميل؟")
             if result:
-                self.downloader.cancel_download()
-                self.add_message("تم إلغاء التحميل", "warning")
-                self._download_completed()
+                job = self.current_job
+                if job is not None:
+                    job["cancelled"] = True
+                self.pause_btn.configure(state="disabled")
+                self.cancel_btn.configure(state="disabled")
+                self.status_var.set("جاري الإلغاء...")
+                # الإنهاء في الخلفية؛ الواجهة تُحدَّث عند خروج العمليات فعلاً
+                self.downloader.cancel_download(
+                    callback=lambda: self.root.after(0, self._download_completed, job,
+                                                     jobs.CANCELLED))
+                
+    def shutdown(self):
+        """
+        إغلاق البرنامج: إيقاف التحميل مؤقتاً (لاستئنافه لاحقاً) دون تجميد الواجهة،
+        ثم إغلاق النافذة بعد خروج العمليات أو انتهاء المهلة الكلية
+        """
+        self.root.withdraw()
+        self.job_table.stop()
+        if self._prefetch_after_id is not None:
+            self.root.after_cancel(self._prefetch_after_id)
+        if self._info_task is not None:
+            self._info_task.cancel()
+        if self._prefetch_cancel is not None:
+            self._prefetch_cancel.set()
+        if self.is_downloading:
+            # الإيقاف المؤقت يحتفظ بالملف الجزئي بدلاً من حذفه كما في الإلغاء
+            self.downloader.pause_download()
+            self._record_job(jobs.PAUSED)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        
+        def finish():
+            if self.downloader.processes_stopped.is_set() or time.monotonic() >= deadline:
+                self.journal.close()
+                self.root.destroy()
+            else:
+                self.root.after(100, finish)
                 
+        finish()
+                
+    def _on_postprocess_done(self, success, result):
+        """استدعاء عند انتهاء المعالجة اللاحقة (دمج، استخراج صوت، إعادة تغليف) في الخلفية"""
+        if success:
+            self.root.after(0, self.add_message, f"تمت معالجة الملف: {os.path.basename(result)}", "success")
+        else:
+            self.root.after(0, self.add_message, f"فشلت المعالجة اللاحقة: {result}", "error")
+            
     def update_progress(self, percentage):
-        """تحديث شريط التقدم"""
+        """تحديث شريط التقدم وصف المهمة الحالية في لوحة التقدم"""
         self.progress_var.set(percentage)
+        job = self.current_job
+        if job is not None:
+            self.progress_board.update(job["job_id"], progress=percentage)
         
     def update_status(self, status):
         """تحديث نص الحالة"""
@@ -425,16 +624,19 @@ def main():
     def on_closing():
         if app.is_downloading:
             result = messagebox.askyesno("تأكيد الإغلاق", 
-                                       "يوجد تحميل جاري. هل تريد إغلاق البرنامج؟")
+                                       "يوجد تحميل جاري. سيتم إيقافه مؤقتاً ويمكن استئنافه "
+                                       "عند التشغيل التالي. هل تريد إغلاق البرنامج؟")
             if result:
-                app.downloader.cancel_download()
-                root.destroy()
+                app.shutdown()
         else:
-            root.destroy()
+            app.shutdown()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
     root.mainloop()
 
 if __name__ == "__main__":
+    # مطلوب لمجمع عمليات المعالجة اللاحقة في الملف التنفيذي
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
 
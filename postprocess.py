@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة المعالجة اللاحقة
+Post-processing Pipeline Module
+
+تشغيل عمليات ffmpeg (دمج الفيديو والصوت، استخراج الصوت، إعادة التغليف)
+في مجمع عمليات منفصل حتى تتداخل مع تحميل المهمة التالية. كل مرحلة تضمّن
+البيانات الوصفية في نفس عملية ffmpeg بدلاً من مرور إضافي على الملف
+"""
+
+import os
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import logger
+
+# مراحل المعالجة اللاحقة المدعومة
+STAGES = ("merge", "extract_audio", "remux")
+
+# الحاوية الصوتية لكل ترميز صوت (نسخ المسار دون إعادة ترميز)
+AUDIO_CONTAINERS = {"opus": "opus", "vorbis": "ogg", "mp4a": "m4a", "aac": "m4a",
+                    "mp3": "mp3", "flac": "flac"}
+
+# امتدادات الحاويات الصوتية (الملف فيها لا يحتاج استخراج الصوت)
+AUDIO_EXTENSIONS = ("m4a", "mp3", "opus", "ogg", "aac", "flac", "wav")
+
+
+def ffmpeg_available():
+    """
+    التحقق من وجود ffmpeg
+
+    Returns:
+        bool: True إذا كان ffmpeg متوفراً
+    """
+    return shutil.which("ffmpeg") is not None
+
+
+def _temp_output(output_path):
+    """مسار مؤقت بنفس الامتداد حتى يتعرف ffmpeg على الصيغة"""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}.temp{ext}"
+
+
+def _run_ffmpeg(args, output_path):
+    """
+    تشغيل ffmpeg والكتابة إلى ملف مؤقت ثم نقله إلى المسار النهائي
+
+    Args:
+        args: معاملات ffmpeg قبل مسار الإخراج
+        output_path: مسار الملف الناتج
+
+    Returns:
+        str: مسار الملف الناتج
+
+    Raises:
+        RuntimeError: إذا فشل ffmpeg
+    """
+    temp_path = _temp_output(output_path)
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"] + args + [temp_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()[-500:]}")
+
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def _metadata_args(metadata):
+    """معاملات ffmpeg لتضمين البيانات الوصفية (القيم الفارغة تُتجاهل)"""
+    args = []
+    for key, value in (metadata or {}).items():
+        if value is not None:
+            args.extend(["-metadata", f"{key}={value}"])
+    return args
+
+
+def audio_container(ext, acodec=None):
+    """
+    امتداد الحاوية الصوتية التي يُستخرج إليها صوت ملف محمل
+
+    Args:
+        ext: امتداد الملف المحمل
+        acodec: ترميز الصوت (مثل "opus" أو "mp4a.40.2")
+
+    Returns:
+        str: الامتداد، أو None إذا كان الملف في حاوية صوتية أصلاً أو الترميز غير معروف
+    """
+    if (ext or "").lower() in AUDIO_EXTENSIONS:
+        return None
+    return AUDIO_CONTAINERS.get((acodec or "").split(".")[0].lower())
+
+
+def merge_streams(video_path, audio_path, output_path, metadata=None, cleanup=True):
+    """
+    دمج مسار فيديو ومسار صوت في ملف واحد دون إعادة ترميز
+
+    Args:
+        video_path: ملف الفيديو
+        audio_path: ملف الصوت
+        output_path: الملف الناتج
+        metadata: بيانات وصفية (العنوان، الفنان...) تُضمَّن في نفس عملية الدمج
+        cleanup: حذف الملفات المصدرية بعد الانتهاء (نجاحاً أو فشلاً)
+
+    Returns:
+        str: مسار الملف الناتج
+    """
+    args = ["-i", video_path, "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0", "-c", "copy"] + _metadata_args(metadata)
+    try:
+        return _run_ffmpeg(args, output_path)
+    finally:
+        if cleanup:
+            for path in (video_path, audio_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def extract_audio(input_path, output_path, metadata=None, cleanup=True):
+    """
+    استخراج مسار الصوت إلى حاوية صوتية دون إعادة ترميز
+
+    Args:
+        input_path: الملف المحمل (مثل صوت opus داخل webm)
+        output_path: ملف الصوت الناتج (امتداده من audio_container)
+        metadata: بيانات وصفية تُضمَّن في نفس العملية
+        cleanup: حذف الملف المصدر بعد النجاح (يبقى عند الفشل فلا يضيع التحميل)
+
+    Returns:
+        str: مسار الملف الناتج
+    """
+    args = ["-i", input_path, "-map", "0:a:0", "-c", "copy"] + _metadata_args(metadata)
+    _run_ffmpeg(args, output_path)
+    if cleanup and os.path.abspath(input_path) != os.path.abspath(output_path):
+        try:
+            os.remove(input_path)
+        except OSError:
+            pass
+    return output_path
+
+
+def remux(input_path, output_path=None, metadata=None):
+    """
+    إعادة تغليف الملف دون إعادة ترميز مع تضمين البيانات الوصفية
+
+    Args:
+        input_path: الملف المصدر
+        output_path: الملف الناتج (افتراضياً استبدال الملف المصدر)
+        metadata: بيانات وصفية تُضمَّن في نفس العملية
+
+    Returns:
+        str: مسار الملف الناتج
+    """
+    args = ["-i", input_path, "-map", "0", "-c", "copy"] + _metadata_args(metadata)
+    return _run_ffmpeg(args, output_path or input_path)
+
+
+_STAGE_FUNCTIONS = {
+    "merge": merge_streams,
+    "extract_audio": extract_audio,
+    "remux": remux,
+}
+
+
+class PostProcessor:
+    def __init__(self, max_workers=None):
+        """
+        تهيئة مجمع المعالجة اللاحقة
+
+        Args:
+            max_workers: عدد العمليات (افتراضياً عدد أنوية المعالج)
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+        self._active = {stage: set() for stage in STAGES}
+        self._completed = {stage: 0 for stage in STAGES}
+        self._failed = {stage: 0 for stage in STAGES}
+
+    def _get_executor(self):
+        """إنشاء مجمع العمليات عند أول استخدام"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, stage, *args, job_id=None, callback=None, **kwargs):
+        """
+        إضافة مهمة معالجة إلى الطابور
+
+        Args:
+            stage: اسم المرحلة (merge أو extract_audio أو remux)
+            args: معاملات دالة المرحلة
+            job_id: معرف المهمة للتسجيل
+            callback: دالة تُستدعى عند الانتهاء (تستقبل success, result_or_error)
+
+        Returns:
+            Future: كائن المهمة
+        """
+        if stage not in _STAGE_FUNCTIONS:
+            raise ValueError(f"Unknown post-processing stage: {stage}")
+
+        with self._lock:
+            future = self._get_executor().submit(_STAGE_FUNCTIONS[stage], *args, **kwargs)
+            self._active[stage].add(future)
+            depth = len(self._active[stage])
+
+        logger.info(f"Queued {stage}", job_id=job_id, phase="postprocess", depth=depth)
+
+        def _done(fut):
+            with self._lock:
+                self._active[stage].discard(fut)
+                error = fut.exception() if not fut.cancelled() else None
+                if fut.cancelled() or error:
+                    self._failed[stage] += 1
+                else:
+                    self._completed[stage] += 1
+
+            if error:
+                logger.error(f"{stage} failed: {error}", job_id=job_id, phase="postprocess")
+            if callback:
+                try:
+                    if fut.cancelled():
+                        callback(False, None)
+                    elif error:
+                        callback(False, error)
+                    else:
+                        callback(True, fut.result())
+                except Exception as e:
+                    logger.error(f"Post-processing callback error: {e}", job_id=job_id,
+                                 phase="postprocess")
+
+        future.add_done_callback(_done)
+        return future
+
+    def stats(self):
+        """
+        أعماق الطوابير لكل مرحلة
+
+        Returns:
+            dict: لكل مرحلة عدد المهام المنتظرة والجارية والمكتملة والفاشلة
+        """
+        with self._lock:
+            result = {}
+            for stage in STAGES:
+                running = sum(1 for f in self._active[stage] if f.running())
+                result[stage] = {
+                    "queued": len(self._active[stage]) - running,
+                    "running": running,
+                    "completed": self._completed[stage],
+                    "failed": self._failed[stage],
+                }
+            return result
+
+    def shutdown(self, wait=True):
+        """إيقاف مجمع العمليات"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_default_postprocessor = None
+_default_lock = threading.Lock()
+
+
+def get_postprocessor():
+    """
+    الحصول على مجمع المعالجة المشترك
+
+    Returns:
+        PostProcessor: المجمع المشترك
+    """
+    global _default_postprocessor
+    if _default_postprocessor is None:
+        with _default_lock:
+            if _default_postprocessor is None:
+                _default_postprocessor = PostProcessor()
+    return _default_postprocessor
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة إعادة المحاولة
+Retry Engine Module
+
+تصنيف أخطاء التحميل (شبكة مؤقتة، تحديد معدل، رابط موقّع منتهي، خطأ دائم)
+وإعادة المحاولة بتأخير أسي عشوائي مع حفظ إحصائيات كل مهمة
+"""
+
+import re
+import time
+import random
+import threading
+
+import requests
+
+import logger
+
+# أنواع الأخطاء
+TRANSIENT = "transient"        # انقطاع شبكة أو خطأ خادم مؤقت
+RATE_LIMITED = "rate_limited"  # الخادم يطلب التمهل (429)
+EXPIRED = "expired"            # رابط موقّع منتهي: يجب إعادة استخراج المعلومات
+PERMANENT = "permanent"        # لا فائدة من إعادة المحاولة
+
+RETRYABLE = (TRANSIENT, RATE_LIMITED, EXPIRED)
+
+# أنماط رسائل yt-dlp لكل نوع (تُفحص بالترتيب)
+_OUTPUT_PATTERNS = (
+    (RATE_LIMITED, re.compile(r"HTTP Error 429|Too Many Requests|rate.?limit", re.I)),
+    (EXPIRED, re.compile(r"HTTP Error (403|410)|Forbidden|expired|signature", re.I)),
+    (PERMANENT, re.compile(r"Unsupported URL|Video unavailable|Private video|"
+                           r"not available|HTTP Error 404|has been removed|"
+                           r"Requested format is not available|Sign in to confirm", re.I)),
+    (TRANSIENT, re.compile(r"HTTP Error 5\d\d|timed? ?out|Connection (reset|refused|aborted)|"
+                           r"Temporary failure|Network is unreachable|IncompleteRead|"
+                           r"Remote end closed|EOF occurred", re.I)),
+)
+
+
+class DownloadFailure(Exception):
+    def __init__(self, message, kind=TRANSIENT, retry_after=None):
+        """
+        فشل تحميل مصنف
+
+        Args:
+            message: وصف الخطأ
+            kind: نوع الخطأ (transient, rate_limited, expired, permanent)
+            retry_after: المدة التي طلبها الخادم قبل إعادة المحاولة (ثوانٍ)
+        """
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+def classify_status(status_code):
+    """
+    تصنيف رمز حالة HTTP
+
+    Returns:
+        str: نوع الخطأ
+    """
+    if status_code == 429:
+        return RATE_LIMITED
+    if status_code in (403, 410):
+        return EXPIRED
+    if status_code in (408, 425) or status_code >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+
+def classify_output(output, return_code=None):
+    """
+    تصنيف فشل عملية yt-dlp من رسائل الخطأ
+
+    Args:
+        output: آخر رسائل الخطأ
+        return_code: رمز الخروج
+
+    Returns:
+        str: نوع الخطأ (غير المعروف يُعد مؤقتاً وتحده عدد المحاولات)
+    """
+    for kind, pattern in _OUTPUT_PATTERNS:
+        if output and pattern.search(output):
+            return kind
+    return TRANSIENT
+
+
+def _retry_after(response):
+    """قراءة ترويسة Retry-After بالثواني"""
+    if response is None:
+        return None
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_exception(error):
+    """
+    تحويل استثناء إلى DownloadFailure مصنف
+
+    Returns:
+        DownloadFailure: الخطأ المصنف
+    """
+    if isinstance(error, DownloadFailure):
+        return error
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        status = response.status_code if response is not None else 0
+        return DownloadFailure(str(error), classify_status(status), _retry_after(response))
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError, ConnectionError,
+                          TimeoutError)):
+        return DownloadFailure(str(error), TRANSIENT)
+    return DownloadFailure(str(error), PERMANENT)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0,
+                 rate_limit_delay=30.0, max_expired_refreshes=2):
+        """
+        سياسة إعادة المحاولة
+
+        Args:
+            max_attempts: العدد الأقصى للمحاولات (بما فيها الأولى)
+            base_delay: التأخير الأساسي بالثواني
+            max_delay: الحد الأقصى للتأخير
+            rate_limit_delay: أقل تأخير بعد خطأ 429 إذا لم يحدد الخادم مدة
+            max_expired_refreshes: عدد مرات إعادة استخراج الرابط المنتهي
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_delay = rate_limit_delay
+        self.max_expired_refreshes = max_expired_refreshes
+
+    def should_retry(self, failure, attempt, expired_refreshes=0):
+        """هل يجب إعادة المحاولة بعد الفشل رقم attempt"""
+        if failure.kind not in RETRYABLE or attempt >= self.max_attempts:
+            return False
+        if failure.kind == EXPIRED and expired_refreshes >= self.max_expired_refreshes:
+            return False
+        return True
+
+    def delay(self, failure, attempt):
+        """
+        التأخير قبل المحاولة التالية (full jitter)
+
+        Args:
+            failure: الخطأ المصنف
+            attempt: رقم المحاولة الفاشلة (يبدأ من 1)
+
+        Returns:
+            float: التأخير بالثواني
+        """
+        if failure.kind == EXPIRED:
+            # إعادة الاستخراج لا تحتاج انتظاراً طويلاً
+            return random.uniform(0, self.base_delay)
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if failure.kind == RATE_LIMITED:
+            minimum = failure.retry_after if failure.retry_after is not None \
+                else self.rate_limit_delay
+            delay = max(delay, min(minimum, self.max_delay * 5))
+        return delay
+
+
+class RetryMetrics:
+    def __init__(self):
+        """إحصائيات إعادة المحاولة لمهمة واحدة"""
+        self.attempts = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.by_kind = {}
+        self.last_error = None
+        self.last_kind = None  # نوع آخر خطأ (لتمييز الفشل المؤقت من الدائم)
+        self._lock = threading.Lock()
+
+    def record_failure(self, failure, delay=None):
+        with self._lock:
+            self.by_kind[failure.kind] = self.by_kind.get(failure.kind, 0) + 1
+            self.last_error = str(failure)
+            self.last_kind = failure.kind
+            if delay is not None:
+                self.retries += 1
+                self.backoff_seconds += delay
+
+    def record_attempt(self):
+        with self._lock:
+            self.attempts += 1
+
+    def as_dict(self):
+        """الإحصائيات كقاموس (لسجل المهام)"""
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "errors": dict(self.by_kind),
+            }
+
+
+def wait_interruptibly(delay, should_stop=None, step=0.2):
+    """
+    الانتظار مع إمكانية المقاطعة
+
+    Returns:
+        bool: False إذا طُلب التوقف أثناء الانتظار
+    """
+    deadline = time.monotonic() + delay
+    while True:
+        if should_stop is not None and should_stop():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(step, remaining))
+
+
+def run_with_retry(operation, policy=None, metrics=None, should_stop=None,
+                   on_expired=None, job_id=None):
+    """
+    تشغيل عملية مع إعادة المحاولة حسب نوع الخطأ
+
+    Args:
+        operation: دالة تستقبل رقم المحاولة وترفع استثناء عند الفشل
+        policy: سياسة إعادة المحاولة
+        metrics: كائن RetryMetrics لتسجيل الإحصائيات
+        should_stop: دالة تُرجع True لإيقاف الانتظار (مثل الإلغاء)
+        on_expired: دالة تُستدعى قبل إعادة المحاولة بعد انتهاء صلاحية الرابط
+        job_id: معرف المهمة للتسجيل
+
+    Returns:
+        نتيجة operation
+
+    Raises:
+        DownloadFailure: إذا استُنفدت المحاولات أو كان الخطأ دائماً
+    """
+    policy = policy or RetryPolicy()
+    metrics = metrics or RetryMetrics()
+    attempt = 0
+    expired_refreshes = 0
+    while True:
+        attempt += 1
+        metrics.record_attempt()
+        try:
+            return operation(attempt)
+        except Exception as e:
+            failure = classify_exception(e)
+
+        if not policy.should_retry(failure, attempt, expired_refreshes):
+            metrics.record_failure(failure)
+            logger.error(f"Giving up after {attempt} attempt(s): {failure}", job_id=job_id,
+                         phase="retry", kind=failure.kind)
+            raise failure
+
+        delay = policy.delay(failure, attempt)
+        metrics.record_failure(failure, delay)
+        logger.warning(f"Attempt {attempt} failed: {failure}", job_id=job_id, phase="retry",
+                       kind=failure.kind, backoff=f"{delay:.1f}s")
+        if not wait_interruptibly(delay, should_stop):
+            raise failure
+        if failure.kind == EXPIRED:
+            expired_refreshes += 1
+            if on_expired:
+                on_expired()
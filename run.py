@@ -87,20 +87,58 @@ def run_console():
     print("تشغيل إصدار وحدة التحكم...")
     
     try:
+        import jobs
         from downloader import VideoDownloader
         from utils import validate_url, get_default_download_path
         
-        downloader = VideoDownloader()
+        # سجل المهام حتى يمكن استئناف التحميل بعد توقف البرنامج
+        journal = jobs.JobJournal()
+        current = {}
+        
+        def on_checkpoint(downloaded_bytes, total_bytes):
+            if current.get("job_id"):
+                journal.checkpoint(current["job_id"], downloaded_bytes, total_bytes)
+                
+        def run_job(job_id, url, option, save_path, title=None, info=None):
+            """تحميل مهمة مع تسجيل حالتها في سجل المهام"""
+            current["job_id"] = job_id
+            fields = {"url": url, "save_path": save_path, "option": option, "title": title}
+            journal.record(job_id, jobs.RUNNING, **fields)
+            try:
+                success = downloader.download_video(url, None, save_path, selected_quality=option,
+                                                     info=info)
+            finally:
+                current.pop("job_id", None)
+            journal.record(job_id, jobs.COMPLETED if success else jobs.FAILED,
+                           retry=downloader.retry_metrics.as_dict(), **fields)
+            return success
+        
+        downloader = VideoDownloader(checkpoint_callback=on_checkpoint)
         
         print("=" * 50)
         print("برنامج تحميل الفيديوهات والملفات - إصدار وحدة التحكم")
         print("=" * 50)
         
+        # استئناف المهام غير المكتملة من جلسة سابقة
+        for job in journal.unfinished():
+            name = job.get("title") or job.get("url")
+            answer = input(f"\nيوجد تحميل غير مكتمل: {name}\nهل تريد استئنافه؟ (y/n): ")
+            if answer.strip().lower() in ("y", "yes", "ن", "نعم") and job.get("option"):
+                if run_job(job["job_id"], job["url"], job["option"], job["save_path"],
+                           job.get("title")):
+                    print("✓ تم التحميل بنجاح!")
+                else:
+                    print("✗ فشل التحميل!")
+            else:
+                journal.record(job["job_id"], jobs.CANCELLED)
+        journal.compact()
+        
         while True:
             print("\nالخيارات المتاحة:")
             print("1. تحميل فيديو")
             print("2. عرض معلومات فيديو")
-            print("3. الخروج")
+            print("3. تحميل قائمة تشغيل")
+            print("4. الخروج")
             
             choice = input("\nاختر رقم الخيار: ").strip()
             
@@ -146,7 +184,8 @@ def run_console():
                     save_path = get_default_download_path()
                     
                 print(f"بدء التحميل إلى: {save_path}")
-                success = downloader.download_video(url, quality_choice, save_path)
+                success = run_job(jobs.new_job_id(), url, quality_options[quality_choice],
+                                  save_path, info.get("title"))
                 
                 if success:
                     print("✓ تم التحميل بنجاح!")
@@ -171,6 +210,31 @@ def run_console():
                     print("فشل في جلب معلومات الفيديو!")
                     
             elif choice == "3":
+                url = input("أدخل رابط قائمة التشغيل: ").strip()
+                if not validate_url(url):
+                    print("رابط غير صحيح!")
+                    continue
+                    
+                save_path = input("مسار الحفظ (اتركه فارغاً للمسار الافتراضي): ").strip()
+                if not save_path:
+                    save_path = get_default_download_path()
+                    
+                # يبدأ تحميل كل فيديو فور وصول معلوماته دون انتظار بقية القائمة
+                print("جاري جلب فيديوهات القائمة...")
+                done = failed = 0
+                for info in downloader.iter_video_entries(url):
+                    entry_url = info.get("webpage_url") or url
+                    options = downloader.get_quality_options(info.get("formats", []))
+                    option = options[0] if options else {"format_id": "best", "type": "best"}
+                    print(f"\n[{done + failed + 1}] {info.get('title', 'غير معروف')}")
+                    if run_job(jobs.new_job_id(), entry_url, option, save_path, info.get("title"),
+                               info):
+                        done += 1
+                    else:
+                        failed += 1
+                print(f"\nاكتمل {done} وفشل {failed}")
+                    
+            elif choice == "4":
                 print("شكراً لاستخدام البرنامج!")
                 break
             else:
@@ -184,6 +248,152 @@ def run_console():
         
     return True
 
+def parse_options(args, options):
+    """
+    قراءة معاملات بصيغة --name value
+    
+    Args:
+        args: المعاملات
+        options: القيم الافتراضية لكل معامل معروف
+        
+    Returns:
+        tuple: (القيم، المعاملات الموضعية) أو (None, None) عند معامل غير معروف
+    """
+    options = dict(options)
+    positional = []
+    args = list(args)
+    while args:
+        name = args.pop(0)
+        if not name.startswith("--"):
+            positional.append(name)
+        elif name in options and args:
+            options[name] = args.pop(0)
+        else:
+            print(f"معامل غير معروف أو بدون قيمة: {name}")
+            return None, None
+    return options, positional
+
+def run_server(args):
+    """
+    تشغيل الخدمة بدون واجهة (واجهة تحكم HTTP على localhost)
+    
+    Args:
+        args: المعاملات بعد --daemon مثل: --port 8765 --host 127.0.0.1 --save-path DIR --parallel 2
+              --host-limits FILE --warm-workers N --windows FILE
+    """
+    from server import run_daemon, DEFAULT_HOST, DEFAULT_PORT
+    
+    options, _ = parse_options(args, {"--host": DEFAULT_HOST, "--port": DEFAULT_PORT,
+                                      "--save-path": None, "--parallel": 2,
+                                      "--host-limits": None, "--warm-workers": 0,
+                                      "--windows": None})
+    if options is None:
+        return False
+    try:
+        port = int(options["--port"])
+        parallel = int(options["--parallel"])
+        warm_workers = int(options["--warm-workers"])
+    except ValueError:
+        print("يجب أن يكون المنفذ وعدد التحميلات وعدد العمليات الجاهزة أرقاماً")
+        return False
+    return run_daemon(options["--host"], port, options["--save-path"], parallel,
+                      options["--host-limits"], warm_workers, options["--windows"])
+
+def run_shared(mode, args):
+    """
+    العمل مع طابور المهام المشترك بين عدة أجهزة
+    
+    Args:
+        mode: "--enqueue" لإضافة روابط أو "--worker" لسحب المهام وتحميلها
+        args: --store PATH [--quality Q] [--save-path DIR] [--lease SECONDS] ثم الروابط
+    """
+    from jobstore import SharedJobStore, StoreWorker, DEFAULT_LEASE_SECONDS
+    from utils import validate_url, unique_urls
+    
+    options, urls = parse_options(args, {"--store": None, "--quality": "best",
+                                         "--save-path": None,
+                                         "--lease": DEFAULT_LEASE_SECONDS})
+    if options is None:
+        return False
+    try:
+        store = SharedJobStore(options["--store"], lease_seconds=float(options["--lease"]))
+    except (ValueError, OSError) as e:
+        print(f"تعذر فتح طابور المهام: {e}")
+        return False
+        
+    if mode == "--enqueue":
+        valid = [url for url in urls if validate_url(url)]
+        unique = unique_urls(valid)
+        for url in unique:
+            store.add(url, quality=options["--quality"], save_path=options["--save-path"])
+        print(f"تمت إضافة {len(unique)} رابط إلى الطابور المشترك "
+              f"({len(urls) - len(valid)} غير صالح، {len(valid) - len(unique)} مكرر)")
+        return bool(unique)
+        
+    worker = StoreWorker(store, save_path=options["--save-path"])
+    print(f"العامل {store.node_id} يسحب المهام من {store.path} (Ctrl+C للإيقاف)")
+    try:
+        completed = worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+        completed = None
+    if completed is not None:
+        print(f"اكتملت {completed} مهمة")
+    return True
+
+def run_info_batch(args):
+    """
+    جلب معلومات عدد كبير من الروابط بعملية yt-dlp واحدة وكتابتها بصيغة JSONL
+    
+    Args:
+        args: [--file PATH] [--output PATH] [--timeout SECONDS] ثم الروابط
+    """
+    import json
+    from downloader import VideoDownloader
+    from utils import validate_url, unique_urls
+    
+    options, urls = parse_options(args, {"--file": None, "--output": None, "--timeout": None})
+    if options is None:
+        return False
+    if options["--file"]:
+        try:
+            with open(options["--file"], encoding="utf-8") as f:
+                urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        except OSError as e:
+            print(f"تعذر قراءة ملف الروابط: {e}")
+            return False
+    urls = unique_urls(url for url in urls if validate_url(url))
+    if not urls:
+        print("لا توجد روابط صالحة!")
+        return False
+        
+    try:
+        timeout = float(options["--timeout"]) if options["--timeout"] else None
+    except ValueError:
+        print("يجب أن تكون المهلة رقماً")
+        return False
+    output = open(options["--output"], "w", encoding="utf-8") if options["--output"] else sys.stdout
+    downloader = VideoDownloader()
+    done = failed = 0
+    try:
+        for url, info in downloader.iter_videos_info(urls, per_url_timeout=timeout):
+            record = {"url": url, "ok": info is not None}
+            if info is not None:
+                done += 1
+                record.update(title=info.get("title"), duration=info.get("duration"),
+                              formats=len(info.formats))
+            else:
+                failed += 1
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+    except KeyboardInterrupt:
+        print("\nتم الإيقاف بواسطة المستخدم.")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"اكتمل {done} وفشل {failed} من {len(urls)}", file=sys.stderr)
+    return not failed
+
 def main():
     """الدالة الرئيسية"""
     print("برنامج تحميل الفيديوهات والملفات")
@@ -195,7 +405,16 @@ def main():
         return 1
         
     # محاولة تشغيل الواجهة الرسومية أولاً
-    if len(sys.argv) > 1 and sys.argv[1] == "--console":
+    if len(sys.argv) > 1 and sys.argv[1] in ("--worker", "--enqueue"):
+        # العمل مع طابور مشترك بين عدة أجهزة
+        success = run_shared(sys.argv[1], sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--info":
+        # جلب معلومات دفعة روابط بعملية yt-dlp واحدة
+        success = run_info_batch(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--daemon":
+        # خدمة بدون واجهة تستقبل المهام عبر HTTP
+        success = run_server(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--console":
         # تشغيل وحدة التحكم مباشرة إذا تم تمرير المعامل
         success = run_console()
     else:
@@ -214,5 +433,8 @@ def main():
         return 1
 
 if __name__ == "__main__":
+    # مطلوب لمجمع عمليات المعالجة اللاحقة في الملف التنفيذي
+    import multiprocessing
+    multiprocessing.freeze_support()
     sys.exit(main())
 
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة جدولة التحميلات
+Download Scheduler Module
+
+جدولة مهام الطابور مع حد للتحميلات المتزامنة وحد لمعدل بدء المهام لكل
+موقع، والتناوب بين المواقع حتى لا يحجب موقع مزدحم بقية الطابور ولا
+يُحظر البرنامج بسبب كثرة الطلبات على موقع واحد، وأولويات للمهام مع تقادم
+يمنع تجويع المهام المنخفضة، ونوافذ وقت وحدود سرعة لكل طابور (مثل التحميل
+الكثيف ليلاً فقط)
+"""
+
+import json
+import time
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import logger
+from jobs import state_dir
+from utils import DomainIndex, parse_size
+
+# الحدود الافتراضية لكل موقع: عدد التحميلات المتزامنة وعدد المهام التي تبدأ في الثانية
+HOST_LIMITS = {
+    "youtube.com": {"concurrency": 2, "rate": 0.5},
+    "tiktok.com": {"concurrency": 1, "rate": 0.2},
+    "instagram.com": {"concurrency": 1, "rate": 0.2},
+    "facebook.com": {"concurrency": 2, "rate": 0.5},
+    "twitter.com": {"concurrency": 1, "rate": 0.3},
+    "vimeo.com": {"concurrency": 3, "rate": 1.0},
+    "dailymotion.com": {"concurrency": 3, "rate": 1.0},
+    "twitch.tv": {"concurrency": 2, "rate": 0.5},
+    "reddit.com": {"concurrency": 2, "rate": 0.5},
+    "streamable.com": {"concurrency": 3, "rate": 1.0},
+}
+DEFAULT_HOST_LIMIT = {"concurrency": 2, "rate": 1.0}
+
+# نطاقات مختصرة تتبع نفس الموقع فتشاركه حدوده
+HOST_ALIASES = {
+    "youtu.be": "youtube.com",
+    "fb.watch": "facebook.com",
+    "x.com": "twitter.com",
+}
+
+# ملف تعديل الحدود: {"youtube.com": {"concurrency": 4}, "*": {"rate": 2}}
+HOST_LIMITS_FILE = "host_limits.json"
+
+# مدة الانتظار (الثواني) التي ترفع أولوية المهمة درجة واحدة حتى لا تُجوّع
+AGING_INTERVAL = 300
+
+
+def load_host_limits(path=None):
+    """
+    قراءة الحدود الافتراضية مع تعديلات ملف الإعدادات
+
+    Args:
+        path: مسار ملف JSON (افتراضياً host_limits.json في مجلد الحالة إن وجد)
+
+    Returns:
+        tuple: (حدود المواقع، الحد الافتراضي لبقية المواقع)
+    """
+    limits = {host: dict(limit) for host, limit in HOST_LIMITS.items()}
+    default = dict(DEFAULT_HOST_LIMIT)
+    config_path = path or state_dir() / HOST_LIMITS_FILE
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        if path:
+            logger.warning(f"Host limits file not found: {path}", phase="schedule")
+        return limits, default
+    except (OSError, ValueError) as e:
+        logger.warning(f"Invalid host limits file {config_path}: {e}", phase="schedule")
+        return limits, default
+
+    if isinstance(overrides.get("*"), dict):
+        default.update(overrides["*"])
+    for host, override in overrides.items():
+        if host == "*" or not isinstance(override, dict):
+            continue
+        host = HOST_ALIASES.get(host.lower(), host.lower())
+        limits.setdefault(host, dict(default)).update(override)
+    return limits, default
+
+
+class PoliteScheduler:
+    def __init__(self, limits=None, default_limit=None, clock=time.monotonic,
+                 aging_interval=AGING_INTERVAL):
+        """
+        طابور مهام بحدود لكل موقع وأولويات وتناوب بين المواقع
+
+        Args:
+            limits: حدود كل موقع {host: {"concurrency": n, "rate": r}}
+            default_limit: حد المواقع غير المذكورة
+            clock: دالة الوقت (للاختبارات)
+            aging_interval: مدة الانتظار التي ترفع الأولوية درجة (0 بلا تقادم)
+        """
+        self.limits = HOST_LIMITS if limits is None else limits
+        self.default_limit = default_limit or DEFAULT_HOST_LIMIT
+        self.clock = clock
+        self.aging_interval = aging_interval
+        self._index = DomainIndex(tuple(self.limits) + tuple(HOST_ALIASES))
+        # host -> كومة (مفتاح، تسلسل، item، url، الأولوية، وقت الدخول) بترتيب التناوب
+        self._queues = OrderedDict()
+        self._sequence = itertools.count()
+        self._active = {}
+        self._next_start = {}
+        self._closed = False
+        self._condition = threading.Condition()
+        # قرارات الجدولة: عدد المهام المسحوبة، وما سُحب منها بفضل التقادم،
+        # وزمن الانتظار لكل أولوية [العدد، المجموع، الأقصى]
+        self._picked = 0
+        self._aged = 0
+        self._waits = {}
+
+    def host_for(self, url):
+        """
+        الموقع الذي تُحسب عليه حدود الرابط
+
+        Returns:
+            str: النطاق المعروف (مثل youtube.com لروابط youtu.be) أو اسم المضيف
+        """
+        host = (urlparse(url).hostname or "").lower()
+        site = self._index.lookup(host)
+        return HOST_ALIASES.get(site, site) if site else host
+
+    def limit_for(self, host):
+        """حدود الموقع (concurrency, rate)"""
+        limit = dict(self.default_limit)
+        limit.update(self.limits.get(host, {}))
+        return max(1, int(limit.get("concurrency") or 1)), float(limit.get("rate") or 0)
+
+    def level(self, priority, since, now=None):
+        """
+        الأولوية الفعلية لمهمة بعد التقادم
+
+        Args:
+            priority: أولوية المهمة (الأكبر أولاً)
+            since: وقت دخولها الطابور (بساعة المجدول)
+            now: الوقت (افتراضياً الآن)
+
+        Returns:
+            int: الأولوية مضافاً إليها درجة لكل aging_interval من الانتظار
+        """
+        if not self.aging_interval:
+            return priority
+        now = self.clock() if now is None else now
+        return priority + int(max(0.0, now - since) // self.aging_interval)
+
+    def _key(self, priority, since):
+        # ترتيب ثابت داخل الموقع: التقادم يرفع كل المهام بنفس المعدل، فيكفي
+        # طرح الأولوية مضروبة في مدة التقادم من وقت الدخول
+        if not self.aging_interval:
+            return (-priority, since)
+        return (since - priority * self.aging_interval,)
+
+    def host_slots(self, host):
+        """
+        عدد المهام التي يسمح حد تزامن الموقع ببدئها الآن
+
+        حد معدل البدء لا يُحسب هنا لأنه يؤخر المهمة ثوانٍ فقط ولا يمنعها
+
+        Returns:
+            int: الأماكن الفارغة في حد الموقع (قد تكون سالبة إذا خُفض الحد)
+        """
+        with self._condition:
+            return self.limit_for(host)[0] - self._active.get(host, 0)
+
+    def put(self, item, url, priority=0, since=None):
+        """
+        إضافة مهمة إلى طابور موقعها
+
+        Args:
+            item: المهمة
+            url: رابطها (يحدد الموقع)
+            priority: الأولوية (الأكبر أولاً)
+            since: وقت دخولها الأول للطابور (عند إعادتها، حتى يستمر تقادمها)
+
+        Returns:
+            float: وقت الدخول المستخدم
+        """
+        host = self.host_for(url)
+        with self._condition:
+            since = self.clock() if since is None else since
+            entry = (self._key(priority, since), next(self._sequence), item, url, priority, since)
+            heapq.heappush(self._queues.setdefault(host, []), entry)
+            self._condition.notify_all()
+        return since
+
+    def discard(self, item):
+        """
+        حذف مهمة من الطابور قبل بدئها (مثل الإلغاء)
+
+        Returns:
+            bool: True إذا كانت في الطابور
+        """
+        with self._condition:
+            for host, pending in self._queues.items():
+                for index, entry in enumerate(pending):
+                    if entry[2] == item:
+                        pending.pop(index)
+                        heapq.heapify(pending)
+                        if not pending:
+                            del self._queues[host]
+                        return True
+        return False
+
+    def _pick(self, now):
+        """
+        اختيار المهمة الأعلى أولوية فعلية من المواقع المتاحة، والتناوب بين
+        المواقع عند تساوي الأولوية
+
+        Returns:
+            tuple: ((item, url), None) أو (None, أقرب وقت يصبح فيه موقع متاحاً)
+        """
+        earliest = None
+        best = None
+        for host in self._queues:
+            concurrency, rate = self.limit_for(host)
+            if self._active.get(host, 0) >= concurrency:
+                continue
+            ready_at = self._next_start.get(host, 0)
+            if ready_at > now:
+                earliest = ready_at if earliest is None else min(earliest, ready_at)
+                continue
+            head = self._queues[host][0]
+            level = self.level(head[4], head[5], now)
+            if best is None or level > best[0]:
+                best = (level, host, rate)
+        if best is None:
+            return None, earliest
+
+        level, host, rate = best
+        pending = self._queues.pop(host)
+        entry = heapq.heappop(pending)
+        if pending:
+            # الموقع ينتقل إلى آخر الدور بعد كل مهمة
+            self._queues[host] = pending
+        self._active[host] = self._active.get(host, 0) + 1
+        if rate > 0:
+            self._next_start[host] = now + 1.0 / rate
+        self._record_pick(entry[4], level, now - entry[5])
+        return entry[2:4], None
+
+    def _record_pick(self, priority, level, waited):
+        self._picked += 1
+        if level > priority:
+            self._aged += 1
+        waits = self._waits.setdefault(priority, [0, 0.0, 0.0])
+        waits[0] += 1
+        waits[1] += waited
+        waits[2] = max(waits[2], waited)
+
+    def get(self, timeout=None):
+        """
+        انتظار المهمة التالية المسموح ببدئها
+
+        Args:
+            timeout: أقصى مدة انتظار بالثواني (None بلا حد)
+
+        Returns:
+            المهمة، أو None عند انتهاء المهلة أو إغلاق الطابور
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            while not self._closed:
+                now = self.clock()
+                entry, ready_at = self._pick(now)
+                if entry is not None:
+                    return entry[0]
+                waits = [t - now for t in (ready_at, deadline) if t is not None]
+                if deadline is not None and now >= deadline:
+                    return None
+                self._condition.wait(max(0.01, min(waits)) if waits else None)
+        return None
+
+    def release(self, url):
+        """تحرير مكان المهمة المنتهية في حد موقعها"""
+        host = self.host_for(url)
+        with self._condition:
+            if self._active.get(host):
+                self._active[host] -= 1
+            self._condition.notify_all()
+
+    def close(self):
+        """إيقاف الطابور وإيقاظ كل المنتظرين"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stats(self):
+        """
+        حالة كل موقع
+
+        Returns:
+            dict: لكل موقع عدد المهام المنتظرة والجارية
+        """
+        with self._condition:
+            hosts = set(self._queues) | {h for h, n in self._active.items() if n}
+            return {host: {"queued": len(self._queues.get(host, ())),
+                           "active": self._active.get(host, 0)} for host in hosts}
+
+    def metrics(self):
+        """
+        قرارات الجدولة حسب الأولوية
+
+        Returns:
+            dict: عدد المهام المسحوبة وما سُحب منها بفضل التقادم، والمنتظرة
+            لكل أولوية، ومتوسط وأقصى زمن انتظار لكل أولوية (مفاتيح الأولوية نصوص)
+        """
+        with self._condition:
+            waiting = {}
+            for pending in self._queues.values():
+                for entry in pending:
+                    waiting[str(entry[4])] = waiting.get(str(entry[4]), 0) + 1
+            return {
+                "picked": self._picked,
+                "aged": self._aged,
+                "waiting": waiting,
+                "wait": {str(priority): {"picked": count, "avg": round(total / count, 3),
+                                         "max": round(longest, 3)}
+                         for priority, (count, total, longest) in sorted(self._waits.items())},
+            }
+
+
+# الطابور الافتراضي للمهام التي لا تحدد طابوراً
+DEFAULT_QUEUE = "default"
+
+# ملف نوافذ الطوابير: لكل طابور قائمة نوافذ تُفحص بالترتيب وأول نافذة مطابقة تُطبق
+# {"bulk": [{"start": "01:00", "end": "06:00"}, {"rate": "2M"}]}
+# نافذة بلا start/end تطابق أي وقت، و rate: null بلا حد، و rate: 0 الطابور مغلق.
+# إذا لم تطابق أي نافذة فالطابور مغلق، والطابور غير المذكور مفتوح دائماً بلا حد
+QUEUE_WINDOWS_FILE = "queue_windows.json"
+
+# فترة إعادة فحص النوافذ (الثواني)
+WINDOW_CHECK_INTERVAL = 30
+
+
+def parse_clock(text):
+    """
+    تحويل وقت "HH:MM" إلى دقائق منذ منتصف الليل
+
+    Raises:
+        ValueError: إذا كان الوقت غير صالح
+    """
+    hours, _, minutes = str(text).strip().partition(":")
+    hours, minutes = int(hours), int(minutes or 0)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"invalid time: {text}")
+    return hours * 60 + minutes
+
+
+def parse_rate(value):
+    """
+    تحويل حد سرعة إلى بايت/ثانية
+
+    Args:
+        value: None (بلا حد)، رقم بالبايت، أو نص مثل "2M" أو "500KiB" أو "1.5MB"
+
+    Returns:
+        int: الحد، أو None بلا حد (0 يعني إيقاف الطابور)
+
+    Raises:
+        ValueError: إذا تعذر التحليل
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        rate = value
+    else:
+        text = value.strip()
+        if text[-1:].upper() in ("K", "M", "G", "T"):
+            # صيغة yt-dlp المختصرة (2M = 2MiB)
+            text = text[:-1] + text[-1].upper() + "iB"
+        rate = parse_size(text)
+        if rate is None:
+            rate = float(text)
+    if rate < 0:
+        raise ValueError(f"invalid rate: {value}")
+    return int(rate)
+
+
+class QueueWindows:
+    def __init__(self, profiles=None, clock=datetime.now):
+        """
+        نوافذ الوقت وحدود السرعة لكل طابور
+
+        Args:
+            profiles: {queue: [{"start": "01:00", "end": "06:00", "rate": "2M"}, ...]}
+            clock: دالة الوقت المحلي (للاختبارات)
+
+        Raises:
+            ValueError: إذا كانت نافذة غير صالحة
+        """
+        self.clock = clock
+        self._windows = {}
+        for queue, windows in (profiles or {}).items():
+            parsed = []
+            for window in windows:
+                has_start, has_end = "start" in window, "end" in window
+                if has_start != has_end:
+                    raise ValueError(f"window needs both start and end: {window}")
+                span = (parse_clock(window["start"]), parse_clock(window["end"])) \
+                    if has_start else None
+                parsed.append((span, parse_rate(window.get("rate"))))
+            self._windows[queue] = parsed
+
+    def queues(self):
+        """الطوابير التي لها نوافذ"""
+        return list(self._windows)
+
+    def state(self, queue, now=None):
+        """
+        حالة الطابور في وقت معين
+
+        Args:
+            queue: اسم الطابور
+            now: الوقت (افتراضياً الآن)
+
+        Returns:
+            tuple: (مفتوح؟، حد السرعة بالبايت/ثانية أو None)
+        """
+        windows = self._windows.get(queue)
+        if windows is None:
+            return True, None
+        now = now or self.clock()
+        minute = now.hour * 60 + now.minute
+        for span, rate in windows:
+            if span is not None:
+                start, end = span
+                # نافذة تعبر منتصف الليل مثل 22:00-06:00
+                inside = start <= minute < end if start <= end else \
+                    minute >= start or minute < end
+                if not inside:
+                    continue
+            if rate == 0:
+                return False, None
+            return True, rate
+        return False, None
+
+
+def load_queue_windows(path=None):
+    """
+    قراءة نوافذ الطوابير من ملف الإعدادات
+
+    Args:
+        path: مسار ملف JSON (افتراضياً queue_windows.json في مجلد الحالة إن وجد)
+
+    Returns:
+        QueueWindows: النوافذ (بلا نوافذ إذا لم يوجد الملف أو كان غير صالح)
+    """
+    config_path = path or state_dir() / QUEUE_WINDOWS_FILE
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            return QueueWindows(json.load(f))
+    except FileNotFoundError:
+        if path:
+            logger.warning(f"Queue windows file not found: {path}", phase="schedule")
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Invalid queue windows file {config_path}: {e}", phase="schedule")
+    return QueueWindows()
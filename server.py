@@ -0,0 +1,801 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة خادم التحكم المحلي
+Local Control API Module
+
+تشغيل البرنامج كخدمة بدون واجهة تستقبل طلبات JSON عبر HTTP على
+localhost: إضافة روابط إلى الطابور، عرض المهام وتقدمها، الإيقاف
+والاستئناف والإلغاء، وبث أحداث التقدم (Server-Sent Events)، مع نوافذ
+وقت وحدود سرعة لكل طابور، وأولويات تُوقف فيها المهمة العاجلة المهام
+الأقل أولوية ثم تكمل تلك من ملفها الجزئي
+"""
+
+import json
+import time
+import functools
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logger
+import jobs
+from jobs import JobJournal, new_job_id, state_dir
+from utils import validate_url, get_default_download_path, normalize_url
+from downloader import VideoDownloader, stop_downloaders
+from scheduler import (PoliteScheduler, load_host_limits, QueueWindows, load_queue_windows,
+                       DEFAULT_QUEUE, WINDOW_CHECK_INTERVAL)
+from workerpool import WorkerPool
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# سجل مهام الخدمة منفصل عن سجل الواجهة الرسومية، لأن الواجهة تلغي عند بدئها
+# المهام التي لا تعرفها وتضغط سجلها
+DAEMON_JOURNAL_FILE = "daemon.journal"
+
+# أقل فترة بين حدثي تقدم لنفس المهمة (الثواني)
+PROGRESS_EVENT_INTERVAL = 0.5
+
+# عدد الأحداث المنتظرة لكل مشترك قبل إسقاط الأقدم (العميل البطيء لا يؤخر التحميل)
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# فترة رسائل keep-alive في بث الأحداث
+SSE_KEEPALIVE = 15
+
+# الحقول الداخلية التي لا تُعرض في واجهة JSON
+_PRIVATE_FIELDS = ("option", "queued_at")
+
+# سبب تعليق المهمة التي أوقفتها مهمة أعلى أولوية
+PREEMPTED = "preempted"
+
+
+class JobManager:
+    def __init__(self, save_path=None, max_parallel=2, journal=None, downloader_factory=None,
+                 scheduler=None, windows=None):
+        """
+        مدير مهام التحميل للخدمة: طابور وعمال يحمّل كل منهم مهمة واحدة
+
+        Args:
+            save_path: مجلد الحفظ الافتراضي
+            max_parallel: عدد التحميلات المتزامنة
+            journal: سجل المهام (افتراضياً daemon.journal في مجلد الحالة)
+            downloader_factory: دالة تنشئ VideoDownloader (تستقبل معاملات الاستدعاءات)
+            scheduler: طابور بحدود لكل موقع (افتراضياً الحدود الافتراضية مع ملف الإعدادات)
+            windows: نوافذ الوقت وحدود السرعة لكل طابور (QueueWindows)
+        """
+        self.save_path = save_path or get_default_download_path()
+        self.max_parallel = max(1, max_parallel)
+        self.journal = journal or JobJournal(state_dir() / DAEMON_JOURNAL_FILE)
+        self.downloader_factory = downloader_factory or VideoDownloader
+        self._jobs = {}
+        self._active_urls = {}  # الرابط الموحد -> معرف المهمة غير المنتهية
+        self._downloaders = {}
+        self._lock = threading.Lock()
+        # حدود كل موقع تُطبق عند سحب المهمة، و max_parallel هو الحد الكلي
+        self._scheduler = scheduler or PoliteScheduler(*load_host_limits())
+        self._subscribers = set()
+        self._last_progress_event = {}
+        self._workers = []
+        self._stopping = False
+        # نوافذ الطوابير: المهام المعلقة (خارج الطابور) حتى تُفتح نافذة طابورها
+        self.windows = windows or QueueWindows()
+        self._held = {}  # job_id -> سبب التعليق
+        self._queue_states = {}  # الطابور -> (مفتوح؟، حد السرعة) آخر ما طُبق
+        self._stop_event = threading.Event()
+        # الأولويات: عدد المهام التي أُوقفت لصالح مهام أعلى وعدد ما أُعيد منها
+        self._preempted = 0
+        self._resumed = 0
+
+    def start(self):
+        """تشغيل العمال وإعادة المهام غير المكتملة من الجلسة السابقة إلى الطابور"""
+        for job in self.journal.unfinished():
+            if job.get("url"):
+                self.submit(job["url"], job.get("quality", "best"), job.get("save_path"),
+                            job_id=job["job_id"], option=job.get("option"),
+                            queue_name=job.get("queue"), priority=job.get("priority") or 0)
+        for index in range(self.max_parallel):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{index}",
+                                      daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        if self.windows.queues():
+            thread = threading.Thread(target=self._window_loop, name="queue-windows",
+                                      daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def submit(self, url, quality="best", save_path=None, job_id=None, option=None,
+               queue_name=None, priority=0):
+        """
+        إضافة رابط إلى الطابور
+
+        Args:
+            url: رابط الفيديو
+            quality: سياسة الجودة ("best" أو "worst" أو "audio" أو مثل "720p")
+            save_path: مجلد الحفظ (افتراضياً مجلد الخدمة)
+            job_id: معرف المهمة (عند استئناف مهمة سابقة)
+            option: خيار الجودة المختار سابقاً (عند الاستئناف)
+            queue_name: اسم الطابور الذي تُطبق عليه نوافذ الوقت (افتراضياً default)
+            priority: الأولوية (الأكبر أولاً، والمهمة الأعلى توقف الجارية الأقل)
+
+        Returns:
+            dict: المهمة الجديدة، أو المهمة غير المنتهية لنفس الفيديو إن وجدت
+        """
+        key = normalize_url(url) or url
+        job = {
+            "job_id": job_id or new_job_id(),
+            "url": url,
+            "quality": quality or "best",
+            "save_path": save_path or self.save_path,
+            "queue": queue_name or DEFAULT_QUEUE,
+            "priority": int(priority or 0),
+            "state": jobs.QUEUED,
+            "progress": 0.0,
+            "status": "",
+            "title": None,
+            "created": round(time.time(), 3),
+        }
+        if option:
+            job["option"] = option
+        with self._lock:
+            existing = self._jobs.get(self._active_urls.get(key))
+            if job_id is None and existing and existing["state"] in jobs.UNFINISHED_STATES:
+                # نفس الفيديو بصيغة رابط أخرى (youtu.be أو مع معاملات تتبع)
+                return self.public_view(existing)
+            self._jobs[job["job_id"]] = job
+            self._active_urls[key] = job["job_id"]
+            is_open = self.windows.state(job["queue"])[0]
+            if not is_open:
+                # خارج نافذة طابورها: تنتظر خارج الطابور حتى تُفتح
+                job["waiting"] = "window"
+                self._held[job["job_id"]] = "window"
+        self.journal.record(job["job_id"], jobs.QUEUED, url=url, quality=job["quality"],
+                            save_path=job["save_path"], option=option, queue=job["queue"],
+                            priority=job["priority"])
+        if is_open:
+            job["queued_at"] = self._scheduler.put(job["job_id"], url, job["priority"])
+        self._publish("job", job)
+        self._rebalance()
+        return self.public_view(job)
+
+    def list_jobs(self):
+        """كل المهام مرتبة حسب وقت الإضافة"""
+        with self._lock:
+            return [self.public_view(job) for job in
+                    sorted(self._jobs.values(), key=lambda job: job["created"])]
+
+    def get_job(self, job_id):
+        """المهمة أو None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self.public_view(job) if job else None
+
+    def host_stats(self):
+        """المهام المنتظرة والجارية لكل موقع"""
+        return self._scheduler.stats()
+
+    def queue_stats(self):
+        """
+        حالة كل طابور
+
+        Returns:
+            dict: لكل طابور هل هو مفتوح وحد سرعته وعدد مهامه حسب الحالة
+        """
+        with self._lock:
+            jobs_by_queue = {}
+            for job in self._jobs.values():
+                jobs_by_queue.setdefault(job["queue"], []).append(job)
+            held = dict(self._held)
+        stats = {}
+        for queue_name in set(jobs_by_queue) | set(self.windows.queues()):
+            is_open, rate = self.windows.state(queue_name)
+            queue_jobs = jobs_by_queue.get(queue_name, [])
+            stats[queue_name] = {
+                "open": is_open,
+                "rate_limit": rate,
+                "queued": sum(1 for job in queue_jobs if job["state"] == jobs.QUEUED
+                              and job["job_id"] not in held),
+                "running": sum(1 for job in queue_jobs if job["state"] == jobs.RUNNING),
+                "held": sum(1 for job in queue_jobs if job["job_id"] in held),
+            }
+        return stats
+
+    def scheduler_stats(self):
+        """
+        قرارات الجدولة والأولويات
+
+        Returns:
+            dict: مقاييس المجدول (المسحوبة والمتقادمة وزمن الانتظار لكل أولوية)
+            مع عدد المهام الموقوفة لصالح مهام أعلى والمعادة منها والجارية لكل أولوية
+        """
+        stats = self._scheduler.metrics()
+        with self._lock:
+            running = {}
+            for job in self._jobs.values():
+                if job["state"] == jobs.RUNNING:
+                    running[str(job["priority"])] = running.get(str(job["priority"]), 0) + 1
+            stats.update(running=running, preempted=self._preempted, resumed=self._resumed,
+                         held_preempted=sum(1 for reason in self._held.values()
+                                            if reason == PREEMPTED))
+        return stats
+
+    @staticmethod
+    def public_view(job):
+        """نسخة المهمة القابلة للعرض في JSON"""
+        return {key: value for key, value in job.items() if key not in _PRIVATE_FIELDS}
+
+    def pause(self, job_id):
+        """
+        إيقاف مهمة جارية مؤقتاً
+
+        Returns:
+            bool: True إذا أُوقفت
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            downloader = self._downloaders.get(job_id)
+        if not job or job["state"] != jobs.RUNNING or downloader is None:
+            return False
+        if not downloader.pause_download():
+            return False
+        self._set_state(job, jobs.PAUSED)
+        return True
+
+    def resume(self, job_id):
+        """
+        استئناف مهمة متوقفة
+
+        Returns:
+            bool: True إذا استؤنفت
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            downloader = self._downloaders.get(job_id)
+        if not job or job["state"] != jobs.PAUSED or downloader is None:
+            return False
+        if not downloader.resume_download():
+            return False
+        self._set_state(job, jobs.RUNNING)
+        return True
+
+    def cancel(self, job_id):
+        """
+        إلغاء مهمة في الطابور أو جارية
+
+        Returns:
+            bool: True إذا أُلغيت
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            downloader = self._downloaders.get(job_id)
+            if not job or job["state"] not in jobs.UNFINISHED_STATES:
+                return False
+            job["cancel_requested"] = True
+            self._held.pop(job_id, None)
+        self._scheduler.discard(job_id)
+        if downloader is not None:
+            downloader.cancel_download()
+        self._set_state(job, jobs.CANCELLED)
+        return True
+
+    def subscribe(self):
+        """
+        الاشتراك في الأحداث
+
+        Returns:
+            queue.Queue: طابور الأحداث (event, data)
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """إلغاء الاشتراك"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _publish(self, event, job):
+        with self._lock:
+            data = self.public_view(job)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # عميل بطيء: نسقط أقدم حدث بدلاً من انتظار العميل
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event, data))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _set_state(self, job, state, **fields):
+        with self._lock:
+            job["state"] = state
+            job.update(fields)
+            if state not in jobs.UNFINISHED_STATES:
+                key = normalize_url(job["url"]) or job["url"]
+                if self._active_urls.get(key) == job["job_id"]:
+                    del self._active_urls[key]
+            record = {key: job.get(key) for key in ("url", "quality", "save_path", "option",
+                                                    "title", "queue", "priority")}
+        record.update(fields)
+        self.journal.record(job["job_id"], state, **record)
+        self._publish("job", job)
+
+    def _on_progress(self, job, percentage):
+        job["progress"] = round(float(percentage), 1)
+        now = time.monotonic()
+        last = self._last_progress_event.get(job["job_id"], 0)
+        if now - last >= PROGRESS_EVENT_INTERVAL or percentage >= 100:
+            self._last_progress_event[job["job_id"]] = now
+            self._publish("progress", job)
+
+    def _on_status(self, job, status):
+        job["status"] = status
+
+    def _worker_loop(self):
+        while True:
+            job_id = self._scheduler.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is None or job["state"] != jobs.QUEUED:
+                if job is not None:
+                    self._scheduler.release(job["url"])
+                continue
+            if not self.windows.state(job["queue"])[0]:
+                # أُغلقت نافذة الطابور بعد دخول المهمة إليه
+                self._suspend(job, "window")
+                self._scheduler.release(job["url"])
+                continue
+            try:
+                self._run_job(job)
+            except Exception as e:
+                logger.error(f"Job crashed: {e}", job_id=job_id, phase="server")
+                self._set_state(job, jobs.FAILED, error=str(e))
+            finally:
+                self._scheduler.release(job["url"])
+                with self._lock:
+                    self._downloaders.pop(job_id, None)
+                self._last_progress_event.pop(job_id, None)
+                # المكان المحرر يذهب للأعلى أولوية: مهمة منتظرة أو مهمة أُوقفت سابقاً
+                self._rebalance()
+
+    def _run_job(self, job):
+        """تحميل مهمة واحدة (في خيط العامل)"""
+        job_id = job["job_id"]
+        downloader = self.downloader_factory(
+            progress_callback=lambda p: self._on_progress(job, p),
+            status_callback=lambda s: self._on_status(job, s),
+            checkpoint_callback=lambda done, total: self.journal.checkpoint(job_id, done, total))
+        downloader.rate_limit = self.windows.state(job["queue"])[1]
+        with self._lock:
+            if job.get("cancel_requested") or job_id in self._held:
+                return
+            self._downloaders[job_id] = downloader
+            job["state"] = jobs.RUNNING
+        self._publish("job", job)
+
+        info = None
+        option = job.get("option")
+        if not option:
+            info = downloader.get_video_info(job["url"])
+            if job.get("cancel_requested") or job.get("suspended"):
+                return
+            if not info:
+                self._set_state(job, jobs.FAILED, error="info extraction failed")
+                return
+            options = downloader.get_quality_options(info.get("formats", []))
+            option = downloader.select_quality(options, job["quality"])
+            with self._lock:
+                job["title"] = info.get("title")
+                job["option"] = option
+        with self._lock:
+            # الفحص والانتقال معاً حتى لا يُكتب RUNNING فوق تعليق أو إلغاء متزامن
+            if job.get("cancel_requested") or job.get("suspended"):
+                return
+            job["state"] = jobs.RUNNING
+        self._set_state(job, jobs.RUNNING)
+
+        success = downloader.download_video(job["url"], None, job["save_path"],
+                                            selected_quality=option, info=info)
+        if job.get("cancel_requested") or job.get("suspended"):
+            return
+        if success:
+            job["progress"] = 100.0
+            self._set_state(job, jobs.COMPLETED, retry=downloader.retry_metrics.as_dict())
+        else:
+            self._set_state(job, jobs.FAILED, retry=downloader.retry_metrics.as_dict(),
+                            error=job.get("status") or "download failed")
+
+    def _suspend(self, job, reason):
+        """
+        تعليق مهمة خارج الطابور حتى يزول السبب
+
+        المهمة المنتظرة تُسحب من الطابور، والجارية تُنهى عمليتها مع إبقاء ملفها
+        الجزئي (تكمل منه عند إعادتها) ويتحرر مكانها لمهام الطوابير الأخرى.
+        المهمة التي أوقفها المستخدم لا تُعلق
+
+        Returns:
+            bool: True إذا عُلقت
+        """
+        with self._lock:
+            job_id = job["job_id"]
+            if job_id in self._held or job.get("cancel_requested") \
+                    or job["state"] not in (jobs.QUEUED, jobs.RUNNING):
+                return False
+            running = job["state"] == jobs.RUNNING
+            downloader = self._downloaders.get(job_id)
+            self._held[job_id] = reason
+            job["waiting"] = reason
+            if running:
+                job["suspended"] = True
+        if running:
+            if downloader is not None:
+                downloader.cancel_download(keep_partial=True)
+            self._set_state(job, jobs.PAUSED, waiting=reason)
+            logger.info(f"Job suspended ({reason})", job_id=job_id, phase="schedule")
+        else:
+            self._scheduler.discard(job_id)
+            self._publish("job", job)
+        return True
+
+    def _release(self, job_id):
+        """
+        إعادة مهمة معلقة إلى الطابور
+
+        Returns:
+            bool: False إذا لم يخرج عامل تحميلها السابق بعد (تُعاد في الفحص التالي)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job_id not in self._held or job_id in self._downloaders:
+                return False
+            del self._held[job_id]
+            job.pop("suspended", None)
+        self._set_state(job, jobs.QUEUED, waiting=None)
+        job["queued_at"] = self._scheduler.put(job_id, job["url"], job["priority"],
+                                               since=job.get("queued_at"))
+        return True
+
+    def _job_level(self, job, now):
+        """أولوية المهمة بعد التقادم منذ دخولها الأول للطابور"""
+        return self._scheduler.level(job["priority"], job.get("queued_at", now), now)
+
+    def _rebalance(self):
+        """
+        توزيع أماكن التحميل حسب الأولوية
+
+        إذا لم تكفِ الأماكن الفارغة للمهام المنتظرة، تُوقف الجارية الأقل أولوية
+        (مع إبقاء ملفها الجزئي) لصالح المنتظرة الأعلى منها، وتُعاد الموقوفة إلى
+        الطابور حين يتوفر مكان لا تنتظره مهمة أعلى. تُقارن أولوية المنتظرة
+        الأصلية بأولوية الجارية بعد التقادم، فالمهمة القديمة لا تُوقف بلا نهاية
+        ولا توقف المهمة المتقادمة غيرها. المهمة التي يمنعها حد تزامن موقعها
+        لا توقف إلا مهمة على نفس الموقع، ولا تُحسب منتظرةً لمكان لن تبدأ فيه
+
+        Returns:
+            tuple: (معرفات المهام الموقوفة، معرفات المهام المعادة)
+        """
+        if self._stopping:
+            return [], []
+        now = self._scheduler.clock()
+        host_for = self._scheduler.host_for
+        with self._lock:
+            busy, host_slots = [], {}
+            for job_id in self._downloaders:
+                job = self._jobs[job_id]
+                host = host_for(job["url"])
+                if host not in host_slots:
+                    host_slots[host] = self._scheduler.host_slots(host)
+                if job_id in self._held or job.get("cancel_requested"):
+                    # مكان المهمة الملغاة أو الموقوفة يتحرر حين يخرج عاملها
+                    host_slots[host] += 1
+                else:
+                    busy.append(job)
+            free = self.max_parallel - len(busy)
+            # المهام التي أوقفها المستخدم تحتفظ بمكانها
+            running = sorted((job for job in busy if job["state"] == jobs.RUNNING),
+                             key=lambda job: self._job_level(job, now))
+            # المنتظرة بأولويتها الأصلية والموقوفة سابقاً بأولويتها بعد التقادم،
+            # والموقوفة أولاً عند التساوي
+            candidates = [(job["priority"], 1, job) for job in self._jobs.values()
+                          if job["state"] == jobs.QUEUED and job["job_id"] not in self._held]
+            candidates += [(self._job_level(self._jobs[job_id], now), 0, self._jobs[job_id])
+                           for job_id, reason in self._held.items()
+                           if reason == PREEMPTED and job_id not in self._downloaders]
+            candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+
+            victims, released = [], []
+            for rank, waiting, job in candidates:
+                host = host_for(job["url"])
+                if host not in host_slots:
+                    host_slots[host] = self._scheduler.host_slots(host)
+                if free > 0 and host_slots[host] > 0:
+                    free -= 1
+                    host_slots[host] -= 1
+                    if not waiting:
+                        released.append(job["job_id"])
+                    continue
+                if not waiting:
+                    # الموقوفة لا توقف غيرها، تنتظر مكاناً فارغاً
+                    continue
+                # إذا امتلأ حد موقعها فلا يفيدها إلا إيقاف مهمة على نفس الموقع
+                same_host = host_slots[host] <= 0
+                victim = next((other for other in running
+                               if not same_host or host_for(other["url"]) == host), None)
+                if victim is None or self._job_level(victim, now) >= rank:
+                    continue
+                running.remove(victim)
+                victims.append(victim)
+                host_slots[host_for(victim["url"])] += 1
+                host_slots[host] -= 1
+
+        suspended = []
+        for job in victims:
+            if self._suspend(job, PREEMPTED):
+                suspended.append(job["job_id"])
+        resumed = [job_id for job_id in released if self._release(job_id)]
+        with self._lock:
+            self._preempted += len(suspended)
+            self._resumed += len(resumed)
+        for job_id in resumed:
+            logger.info("Preempted job requeued", job_id=job_id, phase="schedule")
+        return suspended, resumed
+
+    def apply_windows(self, now=None):
+        """
+        تطبيق نوافذ الطوابير: تعليق مهام الطوابير المغلقة وإعادتها عند فتح
+        نافذتها، وتعديل حد سرعة التحميلات الجارية حسب النافذة الحالية
+
+        Args:
+            now: الوقت (افتراضياً الآن)
+
+        Returns:
+            dict: الطابور -> (مفتوح؟، حد السرعة)
+        """
+        states = {queue_name: self.windows.state(queue_name, now)
+                  for queue_name in self.windows.queues()}
+        with self._lock:
+            snapshot = [(job, self._downloaders.get(job["job_id"]))
+                        for job in self._jobs.values() if job["queue"] in states]
+            held = dict(self._held)
+        for job, downloader in snapshot:
+            is_open, rate = states[job["queue"]]
+            if not is_open:
+                self._suspend(job, "window")
+            elif held.get(job["job_id"]) == "window":
+                self._release(job["job_id"])
+            elif job["state"] == jobs.RUNNING and downloader is not None:
+                # حد السرعة الجديد يُطبق بإعادة العملية من ملفها الجزئي
+                downloader.set_rate_limit(rate)
+        for queue_name, state in states.items():
+            if self._queue_states.get(queue_name) != state:
+                self._queue_states[queue_name] = state
+                logger.info(f"Queue {queue_name} {'open' if state[0] else 'closed'}",
+                            phase="schedule", rate_limit=state[1])
+        # مهمة عاجلة عادت من طابور فُتحت نافذته قد توقف مهمة أقل
+        self._rebalance()
+        return states
+
+    def _window_loop(self):
+        """إعادة فحص نوافذ الطوابير دورياً (حواف النوافذ بدقة WINDOW_CHECK_INTERVAL)"""
+        self.apply_windows()
+        while not self._stop_event.wait(WINDOW_CHECK_INTERVAL):
+            self.apply_windows()
+
+    def shutdown(self):
+        """إيقاف التحميلات الجارية مؤقتاً (لتُستأنف عند التشغيل التالي) وإغلاق السجل"""
+        if self._stopping:
+            return
+        self._stopping = True
+        self._stop_event.set()
+        with self._lock:
+            running = [(self._jobs[job_id], downloader)
+                       for job_id, downloader in self._downloaders.items()]
+        # إيقاف كل التحميلات بالتوازي خلال مدة كلية محددة
+        stop_downloaders([downloader for _, downloader in running])
+        for job, _ in running:
+            self._set_state(job, jobs.PAUSED)
+        self._scheduler.close()
+        self.journal.close()
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """
+    معالج طلبات واجهة التحكم
+
+    GET  /jobs                  قائمة المهام
+    GET  /jobs/<id>             مهمة واحدة
+    POST /jobs                  {"urls": [...], "quality": "720p", "save_path": "...",
+                                 "queue": "bulk", "priority": 10}
+    POST /jobs/<id>/pause       إيقاف مؤقت (وكذلك resume و cancel)
+    GET  /hosts                 المهام المنتظرة والجارية لكل موقع
+    GET  /queues                حالة نافذة كل طابور وعدد مهامه
+    GET  /scheduler             قرارات الجدولة: الأولويات والتقادم والإيقاف لصالح الأعلى
+    GET  /events                بث الأحداث (text/event-stream)
+    """
+
+    server_version = "VideoDownloader/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def manager(self):
+        return self.server.manager
+
+    def log_message(self, format, *args):
+        logger.debug(f"HTTP {self.address_string()} {format % args}", phase="server")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        payload = json.loads(self.rfile.read(length).decode("utf-8"))
+        if not isinstance(payload, dict):
+            raise ValueError("JSON body must be an object")
+        return payload
+
+    def _path_parts(self):
+        return [part for part in self.path.split("?", 1)[0].split("/") if part]
+
+    def do_GET(self):
+        parts = self._path_parts()
+        if parts == ["jobs"]:
+            self._send_json(200, {"jobs": self.manager.list_jobs()})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self.manager.get_job(parts[1])
+            if job:
+                self._send_json(200, job)
+            else:
+                self._send_json(404, {"error": "job not found"})
+        elif parts == ["hosts"]:
+            self._send_json(200, {"hosts": self.manager.host_stats()})
+        elif parts == ["queues"]:
+            self._send_json(200, {"queues": self.manager.queue_stats()})
+        elif parts == ["scheduler"]:
+            self._send_json(200, {"scheduler": self.manager.scheduler_stats()})
+        elif parts == ["events"]:
+            self._stream_events()
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = self._path_parts()
+        try:
+            payload = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid JSON: {e}"})
+            return
+
+        if parts == ["jobs"]:
+            urls = payload.get("urls") or ([payload["url"]] if payload.get("url") else [])
+            invalid = [url for url in urls if not validate_url(url)]
+            if not urls or invalid:
+                self._send_json(400, {"error": "invalid or missing urls", "invalid": invalid})
+                return
+            priority = payload.get("priority", 0)
+            if not isinstance(priority, int) or isinstance(priority, bool):
+                self._send_json(400, {"error": "priority must be an integer"})
+                return
+            created = [self.manager.submit(url, payload.get("quality", "best"),
+                                           payload.get("save_path"),
+                                           queue_name=payload.get("queue"),
+                                           priority=priority)
+                       for url in urls]
+            self._send_json(201, {"jobs": created})
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] in ("pause", "resume", "cancel"):
+            if self.manager.get_job(parts[1]) is None:
+                self._send_json(404, {"error": "job not found"})
+                return
+            ok = getattr(self.manager, parts[2])(parts[1])
+            status = 200 if ok else 409
+            self._send_json(status, {"ok": ok, "job": self.manager.get_job(parts[1])})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream_events(self):
+        """بث الأحداث حتى يغلق العميل الاتصال"""
+        subscriber = self.manager.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            # لقطة أولية حتى لا يفوت العميل حالة المهام الحالية
+            for job in self.manager.list_jobs():
+                self._write_event("job", job)
+            while not self.server.stopping.is_set():
+                try:
+                    event, data = subscriber.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                self._write_event(event, data)
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            self.manager.unsubscribe(subscriber)
+
+    def _write_event(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        self.wfile.write(message.encode("utf-8"))
+        self.wfile.flush()
+
+
+class ControlServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, manager):
+        """
+        خادم HTTP متعدد الخيوط (خيط لكل عميل، فلا يوقف عميلٌ بطيء التحميلات)
+
+        Args:
+            address: (host, port)
+            manager: مدير المهام
+        """
+        super().__init__(address, ControlHandler)
+        self.manager = manager
+        self.stopping = threading.Event()
+
+    def shutdown(self):
+        self.stopping.set()
+        super().shutdown()
+
+
+def run_daemon(host=DEFAULT_HOST, port=DEFAULT_PORT, save_path=None, max_parallel=2,
+               host_limits=None, warm_workers=0, queue_windows=None):
+    """
+    تشغيل الخدمة حتى الإيقاف (Ctrl+C)
+
+    Args:
+        host: عنوان الاستماع
+        port: المنفذ
+        save_path: مجلد الحفظ الافتراضي
+        max_parallel: الحد الكلي للتحميلات المتزامنة
+        host_limits: مسار ملف JSON لتعديل حدود المواقع
+        warm_workers: عدد عمليات yt-dlp الجاهزة (0 لتشغيل عملية جديدة لكل أمر)
+        queue_windows: مسار ملف JSON لنوافذ الوقت وحدود السرعة لكل طابور
+
+    Returns:
+        bool: True عند الإيقاف الطبيعي، False إذا تعذر تشغيل الخادم
+    """
+    scheduler = PoliteScheduler(*load_host_limits(host_limits))
+    pool = WorkerPool(warm_workers) if warm_workers > 0 else None
+    factory = functools.partial(VideoDownloader, worker_pool=pool) if pool else None
+    manager = JobManager(save_path=save_path, max_parallel=max_parallel, scheduler=scheduler,
+                         downloader_factory=factory, windows=load_queue_windows(queue_windows))
+    try:
+        server = ControlServer((host, port), manager)
+    except OSError as e:
+        logger.error(f"Could not start control API on {host}:{port}: {e}", phase="server")
+        print(f"تعذر تشغيل الخادم على {host}:{port}: {e}")
+        return False
+
+    manager.start()
+    logger.info(f"Control API listening on http://{host}:{server.server_port}", phase="server")
+    print(f"الخدمة تعمل على http://{host}:{server.server_port} (Ctrl+C للإيقاف)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stopping.set()
+        server.server_close()
+        manager.shutdown()
+        if pool is not None:
+            pool.shutdown()
+    return True
@@ -9,18 +9,44 @@ Test Application
 
 import sys
 import os
+import json
+import signal
+import time
 import unittest
+import subprocess
+import tempfile
+import threading
 from unittest.mock import Mock, patch
 from pathlib import Path
 
 # إضافة مسار المشروع إلى sys.path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# توجيه سجل البرنامج إلى مجلد مؤقت حتى لا تكتب الاختبارات في مجلد logs
+os.environ.setdefault("VIDEO_DOWNLOADER_LOG_DIR", tempfile.mkdtemp(prefix="downloader-logs-"))
+os.environ.setdefault("VIDEO_DOWNLOADER_STATE_DIR", tempfile.mkdtemp(prefix="downloader-state-"))
+
 from utils import (
     validate_url, is_video_url, format_size, format_time, 
-    sanitize_filename, is_valid_save_path, get_default_download_path
+    sanitize_filename, is_valid_save_path, get_default_download_path,
+    normalize_url, classify_urls, unique_urls, DomainIndex
 )
-from downloader import VideoDownloader
+from downloader import (VideoDownloader, MetadataCache, ConnectionBudget, SiteTimeouts,
+                        ProcessReaper, stop_downloaders)
+import jobs
+from jobs import JobJournal
+import checksum
+import retry
+from retry import RetryPolicy, RetryMetrics, DownloadFailure, run_with_retry
+from logger import BackgroundLogger
+from postprocess import PostProcessor, STAGES
+from formats import CompactInfo, RawInfoStore, compact_info, iter_json_lines
+from server import JobManager, ControlServer
+from jobstore import SharedJobStore, StoreWorker
+from scheduler import PoliteScheduler, load_host_limits, QueueWindows, load_queue_windows
+from workerpool import WorkerPool
+from widgets import MessageBuffer, job_row_values
+import cli
 
 class TestUtils(unittest.TestCase):
     """اختبار الدوال المساعدة"""
@@ -139,6 +165,2188 @@ class TestVideoDownloader(unittest.TestCase):
             self.assertIn('height', option)
             self.assertIn('ext', option)
 
+class TestBackgroundLogger(unittest.TestCase):
+    """اختبار المسجل الخلفي"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        
+    def _read_log(self, log):
+        with open(log.log_file, encoding="utf-8") as f:
+            return f.read()
+        
+    def test_structured_fields(self):
+        """اختبار كتابة الحقول المنظمة"""
+        log = BackgroundLogger(self.temp_dir.name, echo_level=None)
+        log.info("تم التحميل", job_id="abc", phase="download", duration=1.5)
+        self.assertTrue(log.flush())
+        log.close()
+        
+        content = self._read_log(log)
+        self.assertIn("INFO: تم التحميل", content)
+        self.assertIn("job=abc", content)
+        self.assertIn("phase=download", content)
+        self.assertIn("duration=1.500s", content)
+        
+    def test_size_rotation(self):
+        """اختبار تدوير الملف عند تجاوز الحجم"""
+        log = BackgroundLogger(self.temp_dir.name, max_bytes=200, backup_count=2,
+                               echo_level=None)
+        for i in range(20):
+            log.error("x" * 50)
+            log.flush()
+        log.close()
+        
+        rotated = Path(self.temp_dir.name) / "downloader.log.1"
+        self.assertTrue(rotated.exists())
+        self.assertFalse((Path(self.temp_dir.name) / "downloader.log.3").exists())
+        self.assertLessEqual(log.log_file.stat().st_size, 200)
+        
+    def test_age_rotation_uses_first_write(self):
+        """اختبار التدوير حسب عمر الملف وليس وقت فتحه"""
+        log_file = Path(self.temp_dir.name) / "downloader.log"
+        with open(log_file, "w", encoding="utf-8") as f:
+            f.write("[2000-01-01 00:00:00] INFO: قديم\n")
+            
+        # كل تشغيل قصير يفتح الملف من جديد
+        log = BackgroundLogger(self.temp_dir.name, max_age=3600, echo_level=None)
+        log.info("جديد")
+        log.flush()
+        log.close()
+        
+        self.assertTrue((Path(self.temp_dir.name) / "downloader.log.1").exists())
+        self.assertNotIn("قديم", self._read_log(log))
+        
+    def test_drops_debug_under_pressure(self):
+        """اختبار إسقاط أسطر DEBUG عند امتلاء الطابور"""
+        log = BackgroundLogger(self.temp_dir.name, capacity=10, echo_level=None)
+        # إيقاف خيط الكتابة مؤقتاً لمحاكاة الضغط
+        with log._lock:
+            for i in range(30):
+                log.debug(f"debug {i}")
+                log.error(f"error {i}")
+            stats = log.stats()
+        log.close()
+        
+        self.assertGreater(stats["dropped_debug"], 0)
+        self.assertLessEqual(stats["queued"], 10)
+
+class TestPostProcessing(unittest.TestCase):
+    """اختبار مرحلة المعالجة اللاحقة"""
+    
+    def test_stats_per_stage(self):
+        """اختبار ظهور أعماق الطوابير لكل مرحلة"""
+        processor = PostProcessor(max_workers=1)
+        stats = processor.stats()
+        self.assertEqual(set(stats), set(STAGES))
+        for stage_stats in stats.values():
+            self.assertEqual(stage_stats["queued"], 0)
+            self.assertEqual(stage_stats["running"], 0)
+            
+    def test_unknown_stage(self):
+        """اختبار رفض مرحلة غير معروفة"""
+        processor = PostProcessor(max_workers=1)
+        with self.assertRaises(ValueError):
+            processor.submit("transcode", "a.mp4")
+            
+    def test_separate_download_submits_merge(self):
+        """اختبار إرسال الدمج إلى المعالجة اللاحقة بدلاً من yt-dlp"""
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result("/tmp/video.mp4")
+        postprocessor = Mock()
+        postprocessor.submit.return_value = future
+        
+        downloader = VideoDownloader(postprocessor=postprocessor)
+        quality = {
+            "format_id": "137+140",
+            "type": "separate",
+            "components": [
+                {"format_id": "137", "ext": "mp4", "filesize": 100},
+                {"format_id": "140", "ext": "m4a", "filesize": 10},
+            ],
+        }
+        with patch.object(downloader, "_run_process", return_value=0) as run:
+            self.assertTrue(downloader._download_separate("https://youtu.be/x", quality, "/tmp", "video"))
+        
+        self.assertEqual(run.call_count, 2)
+        args = postprocessor.submit.call_args[0]
+        self.assertEqual(args[0], "merge")
+        self.assertEqual(args[1], os.path.join("/tmp", "video.f137.mp4"))
+        self.assertEqual(args[2], os.path.join("/tmp", "video.f140.m4a"))
+        self.assertEqual(args[3], os.path.join("/tmp", "video.mp4"))
+
+    def test_failed_merge_removes_components(self):
+        """اختبار حذف ملفات المكونات عند فشل الدمج"""
+        import postprocess
+        with tempfile.TemporaryDirectory() as temp_dir:
+            video = os.path.join(temp_dir, "v.f137.mp4")
+            audio = os.path.join(temp_dir, "v.f140.m4a")
+            for path in (video, audio):
+                open(path, "wb").close()
+            with patch.object(postprocess, "_run_ffmpeg", side_effect=RuntimeError("boom")):
+                with self.assertRaises(RuntimeError):
+                    postprocess.merge_streams(video, audio, os.path.join(temp_dir, "v.mp4"))
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_single_file_download_submits_postprocess(self):
+        """اختبار استخراج الصوت من حاوية فيديو وإعادة تغليف الملف المدمج"""
+        import downloader as downloader_module
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result("done")
+        postprocessor = Mock()
+        postprocessor.submit.return_value = future
+        downloader = VideoDownloader(postprocessor=postprocessor)
+        info = {"title": "clip", "uploader": "me"}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            open(os.path.join(temp_dir, "clip.webm"), "wb").close()
+            open(os.path.join(temp_dir, "clip.mp4"), "wb").close()
+            with patch.object(downloader, "_run_download", return_value=True), \
+                    patch.object(downloader_module, "ffmpeg_available", return_value=True):
+                audio = {"format_id": "251", "type": "audio", "ext": "webm", "acodec": "opus"}
+                self.assertTrue(downloader.download("https://youtu.be/x", temp_dir,
+                                                    selected_quality=audio, info=info))
+                args, kwargs = postprocessor.submit.call_args
+                self.assertEqual(args, ("extract_audio", os.path.join(temp_dir, "clip.webm"),
+                                        os.path.join(temp_dir, "clip.opus")))
+                self.assertEqual(kwargs["metadata"], {"title": "clip", "artist": "me"})
+
+                combined = {"format_id": "18", "type": "combined", "ext": "mp4"}
+                self.assertTrue(downloader.download("https://youtu.be/x", temp_dir,
+                                                    selected_quality=combined, info=info))
+                args, kwargs = postprocessor.submit.call_args
+                self.assertEqual(args, ("remux", os.path.join(temp_dir, "clip.mp4")))
+
+    def test_failed_extract_keeps_download(self):
+        """اختبار بقاء الملف المحمل عند فشل استخراج الصوت"""
+        import postprocess
+        self.assertEqual(postprocess.audio_container("webm", "opus"), "opus")
+        self.assertEqual(postprocess.audio_container("mp4", "mp4a.40.2"), "m4a")
+        self.assertIsNone(postprocess.audio_container("m4a", "mp4a.40.2"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, "a.webm")
+            open(source, "wb").close()
+            with patch.object(postprocess, "_run_ffmpeg", side_effect=RuntimeError("boom")):
+                with self.assertRaises(RuntimeError):
+                    postprocess.extract_audio(source, os.path.join(temp_dir, "a.opus"))
+            self.assertEqual(os.listdir(temp_dir), ["a.webm"])
+
+    def test_failed_download_removes_components(self):
+        """اختبار حذف الملفات الجزئية عند فشل تحميل أحد المكونات"""
+        postprocessor = Mock()
+        downloader = VideoDownloader(postprocessor=postprocessor)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            partial = os.path.join(temp_dir, "video.f137.mp4.part")
+            open(partial, "wb").close()
+            quality = {
+                "format_id": "137+140",
+                "type": "separate",
+                "components": [
+                    {"format_id": "137", "ext": "mp4", "filesize": 100},
+                    {"format_id": "140", "ext": "m4a", "filesize": 10},
+                ],
+            }
+            with patch.object(downloader, "_run_process", side_effect=[1, 0]):
+                self.assertFalse(downloader._download_separate(
+                    "https://youtu.be/x", quality, temp_dir, "video"))
+            self.assertEqual(os.listdir(temp_dir), [])
+        postprocessor.submit.assert_not_called()
+
+class TestFragmentDownloads(unittest.TestCase):
+    """اختبار تحميل أجزاء HLS/DASH بالتوازي"""
+    
+    def setUp(self):
+        self.downloader = VideoDownloader(concurrent_fragments=8)
+        self.downloader.current_info = {
+            "formats": [
+                {"format_id": "hls-720", "protocol": "m3u8_native"},
+                {"format_id": "137", "protocol": "https"},
+                {"format_id": "140", "protocol": "https"},
+            ]
+        }
+        
+    def test_enabled_for_fragmented_protocols(self):
+        """اختبار التفعيل التلقائي لتنسيقات m3u8/dash فقط"""
+        protocols = self.downloader.get_format_protocols("hls-720")
+        self.assertEqual(protocols, ["m3u8_native"])
+        with self.downloader.reserve_fragments(protocols) as args:
+            self.assertEqual(args, ["--concurrent-fragments", "8"])
+        with self.downloader.reserve_fragments(
+                self.downloader.get_format_protocols("137+140")) as args:
+            self.assertEqual(args, [])
+        
+    def test_pool_never_exceeds_total(self):
+        """اختبار أن مجموع الاتصالات المحجوزة لا يتجاوز حد المجمع"""
+        budget = ConnectionBudget(16)
+        downloader = VideoDownloader(concurrent_fragments=4, fragment_budget=budget)
+        granted = []
+        for _ in range(10):
+            granted.append(budget.reserve(downloader.concurrent_fragments))
+        self.assertEqual(sum(granted), 16)
+        self.assertEqual(granted[:4], [4, 4, 4, 4])
+        self.assertEqual(granted[4:], [0] * 6)
+        for n in granted:
+            budget.release(n)
+        self.assertEqual(budget.in_use, 0)
+        
+    def test_separate_components_reserve_two_shares(self):
+        """اختبار أن كل مكوّن منفصل يحجز حصته الخاصة"""
+        budget = ConnectionBudget(16)
+        downloader = VideoDownloader(concurrent_fragments=4, fragment_budget=budget,
+                                     postprocessor=Mock())
+        barrier = threading.Barrier(2)
+        seen = []
+        
+        def fake_process(cmd, progress_handler=None, abort_event=None):
+            barrier.wait(timeout=5)
+            seen.append(budget.in_use)
+            barrier.wait(timeout=5)
+            return 0
+            
+        quality = {
+            "format_id": "v+a",
+            "components": [
+                {"format_id": "v", "ext": "mp4", "protocol": "m3u8_native"},
+                {"format_id": "a", "ext": "m4a", "protocol": "http_dash_segments"},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch.object(downloader, "_run_reserved_process", side_effect=fake_process), \
+                 patch.object(downloader, "_submit_merge", return_value=True):
+                self.assertTrue(downloader._download_separate(
+                    "https://youtu.be/x", quality, temp_dir, "video"))
+        self.assertEqual(seen, [8, 8])
+        self.assertEqual(budget.in_use, 0)
+        
+    def test_selector_resolves_actual_format(self):
+        """اختبار أن المحدد best لا يلتقط بروتوكول تنسيق آخر"""
+        info = {
+            "formats": [
+                {"format_id": "hls-240", "protocol": "m3u8_native",
+                 "vcodec": "avc1", "acodec": "none"},
+                {"format_id": "18", "protocol": "https",
+                 "vcodec": "avc1", "acodec": "mp4a"},
+                {"format_id": "140", "protocol": "https",
+                 "vcodec": "none", "acodec": "mp4a"},
+            ]
+        }
+        self.assertEqual(self.downloader.get_format_protocols("best", info), ["https"])
+        self.assertEqual(self.downloader.get_format_protocols("bestvideo+bestaudio", info),
+                         ["m3u8_native", "https"])
+        self.assertEqual(self.downloader.get_format_protocols("best[height<=480]", info), [])
+
+class TestSeparateStreams(unittest.TestCase):
+    """اختبار تحميل الفيديو والصوت بالتوازي"""
+    
+    def test_progress_weighted_by_size(self):
+        """اختبار دمج التقدم حسب وزن كل مسار بالبايت"""
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result("/tmp/video.mp4")
+        postprocessor = Mock()
+        postprocessor.submit.return_value = future
+        progress_callback = Mock()
+        downloader = VideoDownloader(progress_callback, Mock(), postprocessor=postprocessor)
+        
+        quality = {
+            "format_id": "137+140",
+            "type": "separate",
+            "components": [
+                {"format_id": "137", "ext": "mp4", "filesize": 900},
+                {"format_id": "140", "ext": "m4a", "filesize": 100},
+            ],
+        }
+        
+        barrier = threading.Barrier(2, timeout=5)
+        
+        def fake_run(cmd, progress_handler=None, **kwargs):
+            # كلا المسارين يعملان في الوقت نفسه
+            barrier.wait()
+            if "137" in cmd:
+                progress_handler(100.0, [])
+            return 0
+            
+        with patch.object(downloader, "_run_process", side_effect=fake_run):
+            self.assertTrue(downloader._download_separate("https://youtu.be/x", quality, "/tmp", "video"))
+            
+        progress_callback.assert_called_with(90.0)
+        
+    def test_failed_component_stops_unstarted_one(self):
+        """اختبار أن فشل مكون قبل بدء الآخر يمنع تشغيل الآخر"""
+        downloader = VideoDownloader(postprocessor=Mock())
+        real_run = downloader._run_process
+        
+        def fake_run(cmd, progress_handler=None, protocols=None, abort_event=None):
+            if "v" in cmd:
+                return 1
+            # المكون الثاني يصل إلى التشغيل بعد فشل الأول
+            abort_event.wait(timeout=5)
+            return real_run(cmd, progress_handler, protocols=protocols, abort_event=abort_event)
+            
+        quality = {
+            "format_id": "v+a",
+            "components": [
+                {"format_id": "v", "ext": "mp4"},
+                {"format_id": "a", "ext": "m4a"},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch.object(downloader, "_run_process", side_effect=fake_run), \
+                 patch("downloader.subprocess.Popen") as popen:
+                self.assertFalse(downloader._download_separate(
+                    "https://youtu.be/x", quality, temp_dir, "video"))
+        popen.assert_not_called()
+        downloader.postprocessor.submit.assert_not_called()
+        
+    def test_equal_weights_without_sizes(self):
+        """اختبار الأوزان المتساوية عند عدم معرفة الأحجام"""
+        downloader = VideoDownloader()
+        weights = downloader._component_weights([{"filesize": 0}, {"filesize": 10}])
+        self.assertEqual(weights, [0.5, 0.5])
+
+class TestMetadataPrefetch(unittest.TestCase):
+    """اختبار الذاكرة المؤقتة والجلب المسبق للمعلومات"""
+    
+    def setUp(self):
+        self.cache = MetadataCache(max_entries=2, ttl=60)
+        self.downloader = VideoDownloader(info_cache=self.cache)
+        
+    def test_cache_lru(self):
+        """اختبار إزالة أقدم رابط عند امتلاء الذاكرة"""
+        self.cache.put("a", {"title": "a"})
+        self.cache.put("b", {"title": "b"})
+        self.cache.get("a")
+        self.cache.put("c", {"title": "c"})
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        
+    def test_prefetch_fills_cache(self):
+        """اختبار أن الجلب المسبق لا يغير المعلومات الحالية ويملأ الذاكرة"""
+        info = {"title": "video", "formats": []}
+        with patch.object(self.downloader, "_extract_info", return_value=info) as extract:
+            self.assertEqual(self.downloader.prefetch_video_info("https://youtu.be/x"), info)
+            self.assertIsNone(self.downloader.current_info)
+            self.assertEqual(self.downloader.get_video_info("https://youtu.be/x")["title"], "video")
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(self.downloader.current_info["title"], "video")
+        
+    def test_waits_for_inflight_prefetch(self):
+        """اختبار انتظار الجلب المسبق الجاري بدلاً من تشغيل yt-dlp مرة ثانية"""
+        started = threading.Event()
+        release = threading.Event()
+        info = {"title": "video"}
+        
+        def slow_extract(url, *args):
+            started.set()
+            release.wait(5)
+            return info
+            
+        with patch.object(self.downloader, "_extract_info", side_effect=slow_extract) as extract:
+            thread = threading.Thread(target=self.downloader.prefetch_video_info,
+                                      args=("https://youtu.be/x",))
+            thread.start()
+            started.wait(5)
+            threading.Timer(0.2, release.set).start()
+            self.assertEqual(self.downloader.get_video_info("https://youtu.be/x")["title"], "video")
+            thread.join(5)
+        self.assertEqual(extract.call_count, 1)
+        
+    def test_cancel_kills_extraction(self):
+        """اختبار إلغاء الجلب الجاري فوراً"""
+        real_popen = subprocess.Popen
+        cancel_event = threading.Event()
+        
+        def fake_popen(cmd, **kwargs):
+            return real_popen([sys.executable, "-c", "import time; time.sleep(30)"], **kwargs)
+            
+        with patch("downloader.subprocess.Popen", side_effect=fake_popen):
+            threading.Timer(0.2, cancel_event.set).start()
+            started = time.monotonic()
+            self.assertIsNone(self.downloader.prefetch_video_info("https://youtu.be/x", cancel_event))
+            self.assertLess(time.monotonic() - started, 5)
+            
+    def test_download_uses_selected_snapshot(self):
+        """اختبار أن التحميل يستخدم الخيار المعروض وليس معلومات الذاكرة الحالية"""
+        shown = {"title": "old", "formats": [
+            {"format_id": "22", "protocol": "https", "vcodec": "avc1", "acodec": "mp4a"}]}
+        self.cache.put("https://youtu.be/x", {"title": "new", "formats": [
+            {"format_id": "18", "protocol": "https", "vcodec": "avc1", "acodec": "mp4a"}]})
+        option = {"format_id": "22", "type": "combined", "label": "720p"}
+        with patch.object(self.downloader, "_run_download", return_value=True) as run:
+            self.assertTrue(self.downloader.download_video(
+                "https://youtu.be/x", None, "/tmp", selected_quality=option, info=shown))
+        cmd = run.call_args[0][0]
+        self.assertEqual(cmd[cmd.index("-f") + 1], "22")
+        self.assertTrue(cmd[cmd.index("-o") + 1].endswith("old.%(ext)s"))
+
+class TestCancellableExtraction(unittest.TestCase):
+    """اختبار جلب المعلومات كمهمة قابلة للإلغاء مع مهلة لكل موقع"""
+    
+    def setUp(self):
+        self.downloader = VideoDownloader(info_cache=MetadataCache(ttl=60),
+                                          site_timeouts=SiteTimeouts())
+        self.real_popen = subprocess.Popen
+        self.processes = []
+        
+        def sleeping_popen(cmd, **kwargs):
+            process = self.real_popen([sys.executable, "-c", "import time; time.sleep(30)"],
+                                      **kwargs)
+            self.processes.append(process)
+            return process
+            
+        self.sleeping_popen = sleeping_popen
+        
+    def test_site_timeout_adapts(self):
+        """اختبار أن المهلة تبدأ بقيمة الموقع ثم تتكيف مع المدد المرصودة"""
+        timeouts = SiteTimeouts(defaults={"youtube.com": 30})
+        self.assertEqual(timeouts.timeout_for("https://www.youtube.com/watch?v=x"), 30)
+        self.assertEqual(timeouts.site_for("https://m.youtube.com/x"), "youtube.com")
+        timeouts.record("https://youtube.com/x", 5)
+        self.assertEqual(timeouts.timeout_for("https://youtube.com/y"), 20)
+        timeouts.record("https://youtube.com/x", 0.1)
+        self.assertGreaterEqual(timeouts.timeout_for("https://youtube.com/y"), 10)
+        
+    def test_task_cancel_kills_process(self):
+        """اختبار أن إلغاء المهمة ينهي عملية yt-dlp فوراً"""
+        with patch("downloader.subprocess.Popen", side_effect=self.sleeping_popen):
+            task = self.downloader.start_info_task("https://youtu.be/x", timeout=30)
+            deadline = time.monotonic() + 5
+            while not self.processes and time.monotonic() < deadline:
+                time.sleep(0.02)
+            started = time.monotonic()
+            task.cancel()
+            self.assertIsNone(task.wait(5))
+            self.assertLess(time.monotonic() - started, 3)
+        self.assertTrue(task.done())
+        self.assertIsNotNone(self.processes[0].poll())
+        self.assertEqual(self.downloader.info_tasks, set())
+        
+    def test_cancel_download_cancels_fetch(self):
+        """اختبار أن cancel_download يلغي جلب المعلومات الجاري"""
+        with patch("downloader.subprocess.Popen", side_effect=self.sleeping_popen):
+            task = self.downloader.start_info_task("https://youtu.be/x", timeout=30)
+            time.sleep(0.2)
+            self.downloader.cancel_download()
+            self.assertIsNone(task.wait(5))
+        self.assertTrue(task.cancelled)
+        
+    def test_batch_per_url_deadline(self):
+        """اختبار أن الرابط البطيء ينتهي عند مهلته دون تأخير الروابط الأخرى"""
+        def fake_popen(cmd, **kwargs):
+            if cmd[-1].endswith("slow"):
+                return self.sleeping_popen(cmd, **kwargs)
+            return self.real_popen([sys.executable, "-c", "print('{\"title\": \"ok\"}')"],
+                                   **kwargs)
+            
+        with patch("downloader.subprocess.Popen", side_effect=fake_popen):
+            started = time.monotonic()
+            results = self.downloader.get_videos_info(
+                ["https://a.com/fast", "https://b.com/slow"], per_url_timeout=1)
+            self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results["https://a.com/fast"]["title"], "ok")
+        self.assertIsNone(results["https://b.com/slow"])
+        self.assertTrue(all(p.poll() is not None for p in self.processes))
+
+class TestPauseResume(unittest.TestCase):
+    """اختبار الإيقاف المؤقت الذي يحرر العملية والاستئناف من الملف الجزئي"""
+    
+    def test_pause_releases_process_and_resume_restarts(self):
+        """اختبار أن الإيقاف ينهي العملية وأن الاستئناف يعيد تشغيل نفس الأمر"""
+        real_popen = subprocess.Popen
+        processes = []
+        
+        def fake_popen(cmd, **kwargs):
+            script = "import time; time.sleep(30)" if not processes else "pass"
+            process = real_popen([sys.executable, "-c", script], **kwargs)
+            processes.append((cmd, process))
+            return process
+            
+        downloader = VideoDownloader()
+        cmd = ["yt-dlp", "-f", "18", "-o", "/tmp/x.%(ext)s", "https://youtu.be/x"]
+        results = []
+        with patch("downloader.subprocess.Popen", side_effect=fake_popen):
+            thread = threading.Thread(target=lambda: results.append(
+                downloader._run_download(cmd, "https://youtu.be/x", "18")))
+            thread.start()
+            deadline = time.monotonic() + 5
+            while not processes and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertTrue(downloader.pause_download())
+            processes[0][1].wait(5)
+            time.sleep(0.3)
+            # لا عملية جارية أثناء الإيقاف
+            self.assertEqual(len(processes), 1)
+            self.assertEqual(downloader.active_processes, [])
+            self.assertTrue(downloader.resume_download())
+            thread.join(5)
+        self.assertEqual(results, [True])
+        self.assertEqual(len(processes), 2)
+        self.assertEqual(processes[0][0], processes[1][0])
+        
+    def test_file_resume_uses_range(self):
+        """اختبار إكمال تحميل ملف من الجزء الموجود عبر HTTP Range"""
+        response = Mock(status_code=206, headers={"content-length": "3"})
+        response.iter_content.return_value = [b"def"]
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        downloader = VideoDownloader()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, "file.bin"), "wb") as f:
+                f.write(b"abc")
+            with patch("downloader.requests.get", return_value=response) as get:
+                self.assertTrue(downloader.download_file(
+                    "https://example.com/file.bin", temp_dir, resume=True))
+            self.assertEqual(get.call_args[1]["headers"], {"Range": "bytes=3-"})
+            with open(os.path.join(temp_dir, "file.bin"), "rb") as f:
+                self.assertEqual(f.read(), b"abcdef")
+                
+    def test_paused_jobs_survive_restart(self):
+        """اختبار أن التحميل المتوقف يُقرأ من السجل بعد إعادة التشغيل"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "jobs.journal")
+            journal = JobJournal(path)
+            option = {"format_id": "18", "type": "combined"}
+            journal.record("j1", jobs.PAUSED, url="https://youtu.be/x", save_path=temp_dir,
+                           option=option)
+            journal.close()
+            loaded = JobJournal(path).unfinished()
+            self.assertEqual(loaded[0]["option"], option)
+            self.assertEqual(loaded[0]["state"], jobs.PAUSED)
+
+class TestJobJournal(unittest.TestCase):
+    """اختبار سجل المهام المكتوب مسبقاً ونقاط التقدم"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "jobs.journal")
+        self.journal = JobJournal(self.path, sync_interval=60, checkpoint_interval=5)
+        
+    def tearDown(self):
+        self.journal.close()
+        self.temp_dir.cleanup()
+        
+    def test_replay_requeues_unfinished(self):
+        """اختبار أن إعادة القراءة تُرجع المهام غير المكتملة بآخر حالة ونقطة تقدم"""
+        self.journal.record("a", jobs.RUNNING, url="https://a.com/v", save_path="/tmp")
+        self.journal.record("b", jobs.RUNNING, url="https://b.com/v", save_path="/tmp")
+        self.journal.checkpoint("a", 500, 1000)
+        self.journal.record("b", jobs.COMPLETED)
+        # محاكاة انهيار أثناء كتابة سطر
+        self.journal.sync()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"job_id": "c", "sta')
+            
+        unfinished = JobJournal(self.path).unfinished()
+        self.assertEqual([job["job_id"] for job in unfinished], ["a"])
+        self.assertEqual(unfinished[0]["url"], "https://a.com/v")
+        self.assertEqual(unfinished[0]["downloaded_bytes"], 500)
+        self.assertEqual(unfinished[0]["state"], jobs.RUNNING)
+        
+    def test_checkpoints_are_throttled_and_batched(self):
+        """اختبار أن نقاط التقدم لا تستدعي fsync لكل نقطة"""
+        self.journal.record("a", jobs.RUNNING, url="https://a.com/v")
+        syncs = self.journal.syncs
+        self.assertTrue(self.journal.checkpoint("a", 100))
+        self.assertFalse(self.journal.checkpoint("a", 200))
+        self.assertTrue(self.journal.checkpoint("a", 300, force=True))
+        self.assertEqual(self.journal.syncs, syncs)
+        self.journal.sync()
+        self.assertEqual(self.journal.syncs, syncs + 1)
+        
+    def test_compact_keeps_unfinished_only(self):
+        """اختبار ضغط السجل إلى لقطة من المهام غير المكتملة"""
+        for index in range(5):
+            self.journal.record(f"done{index}", jobs.COMPLETED, url="https://a.com/v")
+        self.journal.record("p", jobs.PAUSED, url="https://a.com/p")
+        self.assertEqual(self.journal.compact(), 1)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.journal.record("p", jobs.RUNNING)
+        self.assertEqual(self.journal.unfinished()[0]["url"], "https://a.com/p")
+        
+    @unittest.skipIf(jobs.fcntl is None, "قفل الملفات غير متوفر")
+    def test_compact_skipped_while_open_elsewhere(self):
+        """اختبار أن السجل لا يُضغط بينما تفتحه نسخة أخرى (عملية أخرى)"""
+        self.journal.record("done", jobs.COMPLETED, url="https://a.com/v")
+        self.journal.record("p", jobs.PAUSED, url="https://a.com/p")
+        other = JobJournal(self.path)
+        self.assertIsNone(self.journal.compact())
+        other.record("q", jobs.QUEUED, url="https://a.com/q")
+        other.close()
+        self.assertEqual(self.journal.compact(), 2)
+        self.assertEqual([job["job_id"] for job in self.journal.unfinished()], ["p", "q"])
+        
+    def test_progress_lines_report_bytes(self):
+        """اختبار تحويل أسطر تقدم yt-dlp إلى نقاط تقدم بالبايت"""
+        checkpoints = []
+        downloader = VideoDownloader(checkpoint_callback=lambda d, t: checkpoints.append((d, t)))
+        process = Mock(args=["yt-dlp", "-f", "18", "https://youtu.be/x"])
+        process.stdout = iter(["[download]  50.0% of ~ 2.00MiB at 1.00MiB/s ETA 00:01\n"])
+        downloader._monitor_progress(process)
+        self.assertEqual(checkpoints, [(1048576, 2097152)])
+
+class TestRetryEngine(unittest.TestCase):
+    """اختبار تصنيف الأخطاء وإعادة المحاولة بتأخير أسي"""
+    
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=4, base_delay=0.01, max_delay=0.05,
+                                  rate_limit_delay=0.02)
+        
+    def test_classification(self):
+        """اختبار تصنيف رموز HTTP ورسائل yt-dlp والاستثناءات"""
+        self.assertEqual(retry.classify_status(503), retry.TRANSIENT)
+        self.assertEqual(retry.classify_status(429), retry.RATE_LIMITED)
+        self.assertEqual(retry.classify_status(403), retry.EXPIRED)
+        self.assertEqual(retry.classify_status(404), retry.PERMANENT)
+        self.assertEqual(retry.classify_output("ERROR: Unsupported URL: x"), retry.PERMANENT)
+        self.assertEqual(retry.classify_output("ERROR: HTTP Error 429: Too Many Requests"),
+                         retry.RATE_LIMITED)
+        self.assertEqual(retry.classify_output("ERROR: Connection reset by peer"),
+                         retry.TRANSIENT)
+        import requests
+        failure = retry.classify_exception(requests.exceptions.ConnectionError("reset"))
+        self.assertEqual(failure.kind, retry.TRANSIENT)
+        
+    def test_transient_retried_with_metrics(self):
+        """اختبار إعادة المحاولة بعد أخطاء مؤقتة وتسجيل الإحصائيات"""
+        calls = []
+        
+        def operation(attempt):
+            calls.append(attempt)
+            if attempt < 3:
+                raise DownloadFailure("503", retry.TRANSIENT)
+            return "ok"
+            
+        metrics = RetryMetrics()
+        self.assertEqual(run_with_retry(operation, self.policy, metrics), "ok")
+        self.assertEqual(calls, [1, 2, 3])
+        stats = metrics.as_dict()
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["errors"], {retry.TRANSIENT: 2})
+        self.assertGreaterEqual(stats["backoff_seconds"], 0)
+        
+    def test_permanent_not_retried(self):
+        """اختبار عدم إعادة المحاولة للأخطاء الدائمة"""
+        operation = Mock(side_effect=DownloadFailure("404", retry.PERMANENT))
+        with self.assertRaises(DownloadFailure):
+            run_with_retry(operation, self.policy)
+        self.assertEqual(operation.call_count, 1)
+        
+    def test_rate_limit_honors_retry_after(self):
+        """اختبار احترام مدة Retry-After"""
+        failure = DownloadFailure("429", retry.RATE_LIMITED, retry_after=0.2)
+        self.assertGreaterEqual(self.policy.delay(failure, 1), 0.2)
+        
+    def test_expired_triggers_refresh(self):
+        """اختبار إعادة الاستخراج بعد انتهاء صلاحية الرابط"""
+        on_expired = Mock()
+        operation = Mock(side_effect=[DownloadFailure("403", retry.EXPIRED), "ok"])
+        self.assertEqual(run_with_retry(operation, self.policy, on_expired=on_expired), "ok")
+        on_expired.assert_called_once_with()
+        
+    def test_file_download_resumes_after_reset(self):
+        """اختبار إكمال الملف من الجزء المحمل بعد انقطاع الاتصال"""
+        import requests
+        
+        def broken_chunks(chunk_size=8192):
+            yield b"abc"
+            raise requests.exceptions.ChunkedEncodingError("reset")
+            
+        first = Mock(status_code=200, headers={"content-length": "6"})
+        first.iter_content.side_effect = broken_chunks
+        second = Mock(status_code=206, headers={"content-length": "3"})
+        second.iter_content.return_value = [b"def"]
+        for response in (first, second):
+            response.__enter__ = Mock(return_value=response)
+            response.__exit__ = Mock(return_value=False)
+            
+        downloader = VideoDownloader(retry_policy=self.policy)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch("downloader.requests.get", side_effect=[first, second]) as get:
+                self.assertTrue(downloader.download_file("https://example.com/f.bin", temp_dir))
+            self.assertEqual(get.call_args_list[1][1]["headers"], {"Range": "bytes=3-"})
+            with open(os.path.join(temp_dir, "f.bin"), "rb") as f:
+                self.assertEqual(f.read(), b"abcdef")
+        self.assertEqual(downloader.retry_metrics.retries, 1)
+        
+    def test_ytdlp_failure_retried_by_kind(self):
+        """اختبار إعادة تشغيل yt-dlp بعد خطأ مؤقت فقط"""
+        real_popen = subprocess.Popen
+        
+        def popen_with(outputs):
+            def fake_popen(cmd, **kwargs):
+                message, code = outputs.pop(0)
+                script = f"print({message!r}); raise SystemExit({code})"
+                return real_popen([sys.executable, "-c", script], **kwargs)
+            return fake_popen
+            
+        downloader = VideoDownloader(retry_policy=self.policy)
+        cmd = ["yt-dlp", "-f", "18", "https://youtu.be/x"]
+        with patch("downloader.subprocess.Popen",
+                   side_effect=popen_with([("ERROR: HTTP Error 503", 1), ("done", 0)])) as popen:
+            self.assertTrue(downloader._run_download(cmd, "https://youtu.be/x", "18"))
+        self.assertEqual(popen.call_count, 2)
+        
+        with patch("downloader.subprocess.Popen",
+                   side_effect=popen_with([("ERROR: Unsupported URL", 1)])) as popen:
+            self.assertFalse(downloader._run_download(cmd, "https://youtu.be/x", "18"))
+        self.assertEqual(popen.call_count, 1)
+        self.assertEqual(downloader.retry_metrics.as_dict()["errors"], {retry.PERMANENT: 1})
+
+class TestStreamingChecksum(unittest.TestCase):
+    """اختبار حساب البصمة أثناء الكتابة والتحقق منها"""
+    
+    def make_response(self, status, body, headers=None):
+        response = Mock(status_code=status, headers=dict(headers or {}))
+        response.headers.setdefault("content-length", str(len(body)))
+        response.iter_content.return_value = [body[i:i + 2] for i in range(0, len(body), 2)]
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        return response
+        
+    def test_expected_from_headers(self):
+        """اختبار قراءة البصمة من ترويسات X-Checksum و Digest و Content-MD5"""
+        import base64, hashlib
+        body = b"hello"
+        sha = hashlib.sha256(body)
+        md5 = base64.b64encode(hashlib.md5(body).digest()).decode()
+        self.assertEqual(checksum.expected_from_headers(
+            {"Digest": "md5=" + md5 + ",sha-256=" + base64.b64encode(sha.digest()).decode()}),
+            ("sha256", sha.hexdigest()))
+        self.assertEqual(checksum.expected_from_headers({"Content-MD5": md5}),
+                         ("md5", hashlib.md5(body).hexdigest()))
+        self.assertIsNone(checksum.expected_from_headers({"Content-MD5": md5}, partial=True))
+        self.assertEqual(checksum.expected_from_headers(
+            {"X-Checksum": "sha1:" + hashlib.sha1(body).hexdigest()}),
+            ("sha1", hashlib.sha1(body).hexdigest()))
+            
+    def test_hash_while_writing_with_sidecar(self):
+        """اختبار التحقق دون إعادة قراءة الملف وحفظ البصمة في ملف جانبي"""
+        import hashlib
+        body = b"some file content"
+        digest = hashlib.sha256(body).hexdigest()
+        downloader = VideoDownloader()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch("downloader.requests.get", return_value=self.make_response(200, body)), \
+                 patch("checksum._hash_prefix") as prefix_read:
+                self.assertTrue(downloader.download_file(
+                    "https://example.com/f.bin", temp_dir, expected_checksum=digest))
+            prefix_read.assert_not_called()
+            self.assertEqual(checksum.read_sidecar(os.path.join(temp_dir, "f.bin")), digest)
+        self.assertTrue(downloader.last_checksum["verified"])
+        
+    def test_header_md5_verified_alongside_sha256(self):
+        """اختبار التحقق من Content-MD5 مع حفظ sha256"""
+        import base64, hashlib
+        body = b"payload"
+        headers = {"Content-MD5": base64.b64encode(hashlib.md5(body).digest()).decode()}
+        downloader = VideoDownloader()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch("downloader.requests.get", return_value=self.make_response(200, body,
+                                                                                  headers)):
+                self.assertTrue(downloader.download_file("https://example.com/f.bin", temp_dir))
+        self.assertEqual(downloader.last_checksum["hexdigest"], hashlib.sha256(body).hexdigest())
+        
+    def test_mismatch_removes_file_and_fails(self):
+        """اختبار حذف الملف عند عدم تطابق البصمة"""
+        downloader = VideoDownloader(retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            responses = [self.make_response(200, b"corrupt"), self.make_response(200, b"corrupt")]
+            with patch("downloader.requests.get", side_effect=responses) as get:
+                self.assertFalse(downloader.download_file(
+                    "https://example.com/f.bin", temp_dir, expected_checksum="sha256:" + "0" * 64))
+            self.assertEqual(get.call_count, 2)
+            self.assertEqual(os.listdir(temp_dir), [])
+            
+    def test_resumed_download_hashes_prefix_once(self):
+        """اختبار أن الإكمال من ملف جزئي يقرأ البادئة مرة واحدة ثم يكمل أثناء الكتابة"""
+        import hashlib
+        downloader = VideoDownloader()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, "f.bin"), "wb") as f:
+                f.write(b"abc")
+            with patch("downloader.requests.get", return_value=self.make_response(206, b"def")):
+                self.assertTrue(downloader.download_file(
+                    "https://example.com/f.bin", temp_dir, resume=True,
+                    expected_checksum=hashlib.sha256(b"abcdef").hexdigest()))
+        self.assertTrue(downloader.last_checksum["verified"])
+
+class TestCompactInfo(unittest.TestCase):
+    """اختبار تمثيل معلومات الفيديو المضغوط وحفظ النص الكامل على القرص"""
+    
+    def make_info(self, index=0, formats=30):
+        """معلومات شبيهة بمخرجات yt-dlp (صور مصغرة وترويسات وقوائم أجزاء)"""
+        headers = {"User-Agent": "Mozilla/5.0 " * 8, "Accept": "*/*",
+                   "Accept-Language": "en-us,en;q=0.5"}
+        info = {
+            "id": f"vid{index}", "title": f"Video {index}", "uploader": "channel",
+            "duration": 600, "webpage_url": f"https://youtu.be/vid{index}",
+            "extractor": "youtube", "description": "description " * 200,
+            "thumbnails": [{"url": f"https://i.ytimg.com/vi/{index}/{n}.jpg", "width": n,
+                            "height": n, "id": str(n)} for n in range(40)],
+            "subtitles": {lang: [{"url": f"https://youtube.com/sub/{lang}/{index}",
+                                  "ext": "vtt"}] for lang in ("en", "ar", "fr", "de")},
+            "http_headers": headers, "formats": [],
+        }
+        for n in range(formats):
+            video = n % 3 != 2
+            info["formats"].append({
+                "format_id": str(100 + n), "ext": "mp4" if video else "m4a",
+                "protocol": "m3u8_native" if n % 2 else "https",
+                "vcodec": "avc1.64001F" if video else "none",
+                "acodec": "none" if video else "mp4a.40.2",
+                "height": 144 * (n % 6 + 1) if video else None,
+                "width": 256 * (n % 6 + 1) if video else None,
+                "abr": None if video else 128.0, "filesize": 1000000 + n,
+                "url": f"https://rr1.googlevideo.com/videoplayback?id={index}&itag={n}&"
+                       + "sig=" + "x" * 200,
+                "http_headers": dict(headers),
+                "fragments": [{"url": f"seg{k}.ts", "duration": 5.0} for k in range(20)],
+            })
+        return info
+        
+    def test_dict_compatible_fields(self):
+        """اختبار أن الحقول المستخدمة تُقرأ كما في القاموس الأصلي"""
+        raw = self.make_info()
+        info = compact_info(raw)
+        self.assertIsInstance(info, CompactInfo)
+        self.assertEqual(info["title"], "Video 0")
+        self.assertEqual(info.get("uploader", "x"), "channel")
+        self.assertEqual(info.get("thumbnails", "missing"), "missing")
+        self.assertLessEqual(len(info.get("description")), 500)
+        fmt = info.get("formats")[2]
+        self.assertIsNone(fmt.get("height", 0))  # مثل القاموس: القيمة None وليست مفقودة
+        self.assertEqual(fmt.get("tbr", 7), 7)
+        self.assertTrue(fmt.get("url"))
+        self.assertFalse(hasattr(fmt, "__dict__"))
+        
+    def test_same_quality_options_and_protocols(self):
+        """اختبار أن خيارات الجودة والبروتوكولات لا تتغير بعد الضغط"""
+        downloader = VideoDownloader()
+        raw = self.make_info()
+        info = compact_info(raw)
+        self.assertEqual(downloader.get_quality_options(info.get("formats")),
+                         downloader.get_quality_options(raw["formats"]))
+        self.assertEqual(downloader.get_format_protocols("101+102", info),
+                         downloader.get_format_protocols("101+102", raw))
+        self.assertEqual(downloader.get_format_protocols("bestaudio", info),
+                         downloader.get_format_protocols("bestaudio", raw))
+        
+    def test_raw_json_spilled_to_disk(self):
+        """اختبار حفظ المعلومات الكاملة على القرص وحذف الأقدم"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = RawInfoStore(temp_dir, max_files=2)
+            infos = [compact_info(self.make_info(i, formats=2), store) for i in range(3)]
+            self.assertEqual(infos[2].raw()["thumbnails"][0]["width"], 0)
+            self.assertEqual(len(os.listdir(temp_dir)), 2)
+            
+    def test_memory_for_1000_queued_jobs(self):
+        """قياس الذاكرة لـ 1000 مهمة في الطابور: القاموس الكامل مقابل التمثيل المضغوط"""
+        import gc
+        import json
+        import tracemalloc
+        
+        payloads = [json.dumps(self.make_info(i, formats=12)) for i in range(1000)]
+        
+        def measure(convert):
+            gc.collect()
+            tracemalloc.start()
+            kept = [convert(json.loads(payload)) for payload in payloads]
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del kept
+            return size
+            
+        full = measure(lambda info: info)
+        compact = measure(compact_info)
+        self.assertLess(compact * 10, full)
+
+class TestStreamingExtraction(unittest.TestCase):
+    """اختبار قراءة مخرجات yt-dlp متعددة المدخلات سطراً بسطر"""
+    
+    def setUp(self):
+        self.downloader = VideoDownloader(info_cache=MetadataCache())
+        self.real_popen = subprocess.Popen
+        self.processes = []
+        
+    def script_popen(self, script):
+        def fake_popen(cmd, **kwargs):
+            process = self.real_popen([sys.executable, "-c", script], **kwargs)
+            self.processes.append(process)
+            return process
+        return fake_popen
+        
+    def test_iter_json_lines(self):
+        """اختبار تحليل كل سطر وتخطي الأسطر التالفة والطويلة جداً"""
+        import io
+        stream = io.BytesIO(b'{"id": 1}\n\nnot json\n{"id": "' + b"x" * 100 + b'"}\n'
+                            b'{"id": 2}\n{"id": 3}')
+        entries = list(iter_json_lines(stream, max_line_bytes=50))
+        self.assertEqual([entry["id"] for entry in entries], [1, 2, 3])
+        
+    def test_first_entry_before_process_ends(self):
+        """اختبار وصول أول مدخل قبل انتهاء yt-dlp وإنهاء العملية عند التوقف المبكر"""
+        script = ("import sys, time; print('{\"title\": \"one\"}'); sys.stdout.flush(); "
+                  "time.sleep(30)")
+        with patch("downloader.subprocess.Popen", side_effect=self.script_popen(script)):
+            started = time.monotonic()
+            entries = self.downloader.iter_video_entries("https://youtu.be/list", timeout=30)
+            self.assertEqual(next(entries)["title"], "one")
+            self.assertLess(time.monotonic() - started, 5)
+            entries.close()
+        self.assertIsNotNone(self.processes[0].wait(5))
+        
+    def test_timeout_excludes_consumer_time(self):
+        """اختبار أن مهلة انتظار المدخل التالي لا تشمل وقت معالجة المستهلك"""
+        script = "print('{\"title\": \"a\"}'); print('{\"title\": \"b\"}')"
+        titles = []
+        with patch("downloader.subprocess.Popen", side_effect=self.script_popen(script)):
+            for info in self.downloader.iter_video_entries("https://youtu.be/list", timeout=0.3):
+                titles.append(info["title"])
+                time.sleep(0.6)
+        self.assertEqual(titles, ["a", "b"])
+        
+    def test_single_extract_takes_first_entry(self):
+        """اختبار أن جلب فيديو واحد يأخذ أول مدخل فقط"""
+        script = "print('{\"title\": \"a\"}'); print('{\"title\": \"b\"}')"
+        with patch("downloader.subprocess.Popen", side_effect=self.script_popen(script)):
+            info = self.downloader.get_video_info("https://youtu.be/x", use_cache=False)
+        self.assertEqual(info["title"], "a")
+
+class TestBatchExtraction(unittest.TestCase):
+    """اختبار جلب معلومات عدة روابط بعملية yt-dlp واحدة"""
+    
+    # yt-dlp وهمي يقرأ ملف الدفعة من المدخلات: bad يفشل و gone غير متاح
+    # و busy خطأ خادم مؤقت و hang يتوقف
+    SCRIPT = ("import sys, json, time\n"
+              "for line in sys.stdin:\n"
+              "    url = line.strip()\n"
+              "    if url.endswith('bad'):\n"
+              "        sys.stderr.write('ERROR: ' + url + '\\n'); continue\n"
+              "    if url.endswith('gone'):\n"
+              "        sys.stderr.write('ERROR: [generic] ' + url.rsplit('/', 1)[-1]\n"
+              "                         + ': Video unavailable\\n'); continue\n"
+              "    if url.endswith('busy'):\n"
+              "        sys.stderr.write('ERROR: ' + url + ': HTTP Error 503\\n'); continue\n"
+              "    if url.endswith('hang'):\n"
+              "        time.sleep(30)\n"
+              "    print(json.dumps({'title': url.rsplit('/', 1)[-1], 'original_url': url}))\n"
+              "    sys.stdout.flush()\n")
+    
+    def setUp(self):
+        self.downloader = VideoDownloader(info_cache=MetadataCache())
+        self.real_popen = subprocess.Popen
+        self.commands = []
+        self.processes = []
+        
+    def fake_popen(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        process = self.real_popen([sys.executable, "-c", self.SCRIPT], **kwargs)
+        self.processes.append(process)
+        return process
+        
+    def test_one_process_for_many_urls(self):
+        """اختبار أن الدفعة كلها تمر بعملية واحدة وأن النتائج بترتيب الروابط"""
+        urls = [f"https://vimeo.com/{n}" for n in range(50)]
+        with patch("downloader.subprocess.Popen", side_effect=self.fake_popen):
+            results = list(self.downloader.iter_videos_info(urls))
+        self.assertEqual(len(self.processes), 1)
+        self.assertIn("--batch-file", self.commands[0])
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertEqual([info["title"] for _, info in results], [str(n) for n in range(50)])
+        # الروابط المحفوظة لا تُجلب مرة أخرى
+        with patch("downloader.subprocess.Popen", side_effect=self.fake_popen):
+            again = dict(self.downloader.iter_videos_info(urls[:3]))
+        self.assertEqual(len(self.processes), 1)
+        self.assertEqual(again[urls[2]]["title"], "2")
+        
+    def test_failures_isolated(self):
+        """اختبار أن الرابط الفاشل أو المعلق لا يوقف بقية الدفعة"""
+        urls = ["https://a.com/1", "https://a.com/bad", "https://a.com/2",
+                "https://a.com/hang", "https://a.com/3"]
+        with patch("downloader.subprocess.Popen", side_effect=self.fake_popen):
+            started = time.monotonic()
+            results = list(self.downloader.iter_videos_info(urls, per_url_timeout=1))
+            self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual([url for url, _ in results], urls)
+        titles = [info["title"] if info else None for _, info in results]
+        self.assertEqual(titles, ["1", None, "2", None, "3"])
+        # العملية المعلقة أُنهيت وبدأت عملية جديدة لبقية الدفعة
+        self.assertEqual(len(self.processes), 2)
+        self.assertTrue(all(p.wait(5) is not None for p in self.processes))
+        
+    def test_failures_classified(self):
+        """اختبار تصنيف فشل كل رابط وتحويله إلى رمز خروج مؤقت أو دائم في CLI"""
+        urls = ["https://a.com/1", "https://a.com/x-gone", "https://a.com/busy",
+                "https://a.com/hang"]
+        failures = {}
+        with patch("downloader.subprocess.Popen", side_effect=self.fake_popen):
+            list(self.downloader.iter_videos_info(urls, per_url_timeout=1, failures=failures))
+        self.assertEqual(failures, {"https://a.com/x-gone": retry.PERMANENT,
+                                    "https://a.com/busy": retry.TRANSIENT,
+                                    "https://a.com/hang": retry.TRANSIENT})
+        
+        output = __import__("io").StringIO()
+        runner = cli.CliRunner(cli.EventWriter(output),
+                               downloader_factory=lambda **callbacks: self.downloader)
+        with patch("downloader.subprocess.Popen", side_effect=self.fake_popen):
+            self.assertEqual(runner.info(["https://a.com/hang"], timeout=1),
+                             cli.EXIT_TRANSIENT)
+            self.assertEqual(runner.info(["https://b.com/v-gone"], timeout=1),
+                             cli.EXIT_PERMANENT)
+        events = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([(e["transient"], e["kind"]) for e in events],
+                         [(True, retry.TRANSIENT), (False, retry.PERMANENT)])
+        
+    def test_cancel_stops_batch(self):
+        """اختبار أن الإلغاء ينهي العملية ويوقف الدفعة"""
+        cancel_event = threading.Event()
+        urls = ["https://a.com/1", "https://a.com/hang", "https://a.com/2"]
+        with patch("downloader.subprocess.Popen", side_effect=self.fake_popen):
+            results = []
+            for url, info in self.downloader.iter_videos_info(urls, cancel_event, 30):
+                results.append(url)
+                cancel_event.set()
+        self.assertEqual(results, ["https://a.com/1"])
+        self.assertIsNotNone(self.processes[0].wait(5))
+        
+class FakeJobDownloader:
+    """منزل وهمي للخدمة: التحميل ينتظر حتى يُسمح له بالانتهاء"""
+    
+    def __init__(self, progress_callback=None, status_callback=None, checkpoint_callback=None):
+        self.progress_callback = progress_callback
+        self.retry_metrics = RetryMetrics()
+        self.finish = threading.Event()
+        self.paused = False
+        self.cancelled = False
+        self.keep_partial = False
+        self.rate_limit = None
+        self.rate_changes = []
+        self.processes_stopped = threading.Event()
+        self.processes_stopped.set()
+        FakeJobDownloader.instances.append(self)
+        
+    def get_video_info(self, url):
+        return {"title": url.rsplit("/", 1)[-1], "formats": []}
+        
+    def get_quality_options(self, formats):
+        return []
+        
+    def select_quality(self, options, policy):
+        return VideoDownloader.select_quality(None, options, policy)
+        
+    def download_video(self, url, quality_index, save_path, selected_quality=None, info=None):
+        self.selected = selected_quality
+        self.progress_callback(50.0)
+        self.finish.wait(10)
+        return not self.cancelled
+        
+    def pause_download(self):
+        self.paused = True
+        return True
+        
+    def resume_download(self):
+        self.paused = False
+        return True
+        
+    def cancel_download(self, keep_partial=False):
+        self.cancelled = True
+        self.keep_partial = keep_partial
+        self.finish.set()
+        
+    def set_rate_limit(self, rate):
+        self.rate_changes.append(rate)
+        self.rate_limit = rate
+
+class TestControlServer(unittest.TestCase):
+    """اختبار واجهة التحكم HTTP للخدمة بدون واجهة"""
+    
+    def setUp(self):
+        FakeJobDownloader.instances = []
+        self.temp_dir = tempfile.mkdtemp()
+        self.journal = JobJournal(os.path.join(self.temp_dir, "jobs.journal"))
+        self.manager = JobManager(self.temp_dir, max_parallel=2, journal=self.journal,
+                                  downloader_factory=FakeJobDownloader)
+        self.server = ControlServer(("127.0.0.1", 0), self.manager)
+        self.port = self.server.server_port
+        self.manager.start()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        
+    def tearDown(self):
+        for downloader in FakeJobDownloader.instances:
+            downloader.finish.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.manager.shutdown()
+        
+    def request(self, method, path, payload=None):
+        import json
+        import urllib.request
+        import urllib.error
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(f"http://127.0.0.1:{self.port}{path}", data=data,
+                                     method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+            
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.02)
+        return False
+        
+    def test_submit_list_and_control(self):
+        """اختبار إضافة الروابط وعرضها والإيقاف والاستئناف والإلغاء"""
+        status, body = self.request("POST", "/jobs", {
+            "urls": ["https://youtu.be/a", "https://youtu.be/b"], "quality": "720p"})
+        self.assertEqual(status, 201)
+        job_id = body["jobs"][0]["job_id"]
+        self.assertTrue(self.wait_for(
+            lambda: self.request("GET", f"/jobs/{job_id}")[1]["progress"] == 50.0))
+        
+        status, body = self.request("GET", "/jobs")
+        self.assertEqual([job["url"] for job in body["jobs"]],
+                         ["https://youtu.be/a", "https://youtu.be/b"])
+        self.assertNotIn("option", body["jobs"][0])
+        
+        self.assertEqual(self.request("POST", f"/jobs/{job_id}/pause")[1]["job"]["state"],
+                         jobs.PAUSED)
+        self.assertEqual(self.request("POST", f"/jobs/{job_id}/pause")[0], 409)
+        self.assertEqual(self.request("POST", f"/jobs/{job_id}/resume")[1]["job"]["state"],
+                         jobs.RUNNING)
+        self.assertEqual(self.request("POST", f"/jobs/{job_id}/cancel")[1]["job"]["state"],
+                         jobs.CANCELLED)
+        self.assertEqual(self.journal.replay()[job_id]["state"], jobs.CANCELLED)
+        self.assertEqual(self.request("POST", "/jobs", {"urls": ["not a url"]})[0], 400)
+        self.assertEqual(self.request("GET", "/jobs/missing")[0], 404)
+        
+    def test_completed_job_recorded(self):
+        """اختبار تسجيل المهمة المكتملة بخيار الجودة المختار حسب السياسة"""
+        job_id = self.request("POST", "/jobs", {"url": "https://youtu.be/a",
+                                                "quality": "audio"})[1]["jobs"][0]["job_id"]
+        self.assertTrue(self.wait_for(lambda: FakeJobDownloader.instances))
+        FakeJobDownloader.instances[0].finish.set()
+        self.assertTrue(self.wait_for(
+            lambda: self.request("GET", f"/jobs/{job_id}")[1]["state"] == jobs.COMPLETED))
+        self.assertEqual(self.journal.replay()[job_id]["option"]["format_id"], "bestaudio")
+        
+    def test_event_stream_and_concurrent_clients(self):
+        """اختبار بث الأحداث وخدمة عملاء كثيرين أثناء التحميل"""
+        import http.client
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/events")
+        response = connection.getresponse()
+        self.assertEqual(response.getheader("Content-Type"), "text/event-stream")
+        
+        self.request("POST", "/jobs", {"urls": ["https://youtu.be/a"]})
+        events = []
+        while "event: progress" not in events:
+            events.append(response.fp.readline().decode().strip())
+        connection.close()
+        
+        results = []
+        clients = [threading.Thread(target=lambda: results.append(self.request("GET", "/jobs")[0]))
+                   for _ in range(20)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join(5)
+        self.assertEqual(results, [200] * 20)
+        
+    def test_daemon_journal_separate_from_gui(self):
+        """اختبار أن الخدمة لا تشارك الواجهة سجل مهامها"""
+        with tempfile.TemporaryDirectory() as state, \
+                patch.dict(os.environ, {jobs.STATE_DIR_ENV: state}):
+            manager = JobManager(self.temp_dir, downloader_factory=FakeJobDownloader)
+            gui_journal = JobJournal()
+            try:
+                self.assertEqual(manager.journal.path, Path(state) / "daemon.journal")
+                self.assertNotEqual(manager.journal.path, gui_journal.path)
+            finally:
+                manager.journal.close()
+                gui_journal.close()
+                
+    def test_select_quality_policies(self):
+        """اختبار سياسات اختيار الجودة"""
+        options = [{"format_id": "1080", "height": 1080, "type": "combined"},
+                   {"format_id": "720", "height": 720, "type": "combined"},
+                   {"format_id": "360", "height": 360, "type": "combined"},
+                   {"format_id": "a", "height": 0, "type": "audio"}]
+        select = lambda policy: VideoDownloader.select_quality(None, options, policy)["format_id"]
+        self.assertEqual(select("best"), "1080")
+        self.assertEqual(select("720p"), "720")
+        self.assertEqual(select("480p"), "360")
+        self.assertEqual(select("144p"), "360")
+        self.assertEqual(select("worst"), "360")
+        self.assertEqual(select("audio"), "a")
+
+class QuickDownloader:
+    """منزل وهمي لعمال الطابور المشترك"""
+    
+    block = False
+    
+    def __init__(self):
+        self.retry_metrics = RetryMetrics()
+        self.cancelled = threading.Event()
+        self.keep_partial = None
+        QuickDownloader.last = self
+        
+    def get_video_info(self, url):
+        return {"title": url, "formats": []}
+        
+    def get_quality_options(self, formats):
+        return []
+        
+    def select_quality(self, options, policy):
+        return {"format_id": "best", "type": "best"}
+        
+    def download_video(self, url, quality_index, save_path, selected_quality=None, info=None):
+        if QuickDownloader.block:
+            self.cancelled.wait(10)
+        else:
+            time.sleep(0.02)
+        return not self.cancelled.is_set()
+        
+    def cancel_download(self, keep_partial=False):
+        self.keep_partial = keep_partial
+        self.cancelled.set()
+
+def _shared_store_worker(db_path):
+    """عملية عامل منفصلة (تمثل جهازاً آخر)"""
+    store = SharedJobStore(db_path, lease_seconds=5)
+    StoreWorker(store, downloader_factory=QuickDownloader).run(stop_when_idle=True)
+
+def _shared_store_crash(db_path):
+    """عملية تحجز مهمة ثم تنهار دون إكمالها"""
+    store = SharedJobStore(db_path, lease_seconds=0.3)
+    store.claim()
+    os._exit(1)
+
+class TestSharedJobStore(unittest.TestCase):
+    """اختبار توزيع المهام على عدة عمليات بعقود إيجار ونبضات"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "shared.db")
+        QuickDownloader.block = False
+        
+    def run_processes(self, target, count):
+        import multiprocessing
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=target, args=(self.db_path,)) for _ in range(count)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        return processes
+        
+    def test_each_job_downloaded_once_across_processes(self):
+        """اختبار أن كل مهمة تُحمل مرة واحدة عند تشغيل عدة عمال"""
+        store = SharedJobStore(self.db_path)
+        job_ids = [store.add(f"https://youtu.be/{n}", quality="best") for n in range(40)]
+        self.run_processes(_shared_store_worker, 4)
+        self.assertEqual(store.counts(), {jobs.COMPLETED: 40})
+        self.assertTrue(all(store.get(job_id)["attempts"] == 1 for job_id in job_ids))
+        
+    def test_expired_lease_reassigned_after_crash(self):
+        """اختبار إعادة إسناد مهمة جهاز انهار أثناء التحميل"""
+        store = SharedJobStore(self.db_path, lease_seconds=5)
+        job_id = store.add("https://youtu.be/x")
+        self.run_processes(_shared_store_crash, 1)
+        self.assertEqual(store.get(job_id)["state"], jobs.RUNNING)
+        self.assertIsNone(store.claim())  # العقد لم ينته بعد
+        time.sleep(0.4)
+        self.assertEqual(StoreWorker(store, downloader_factory=QuickDownloader).run(
+            stop_when_idle=True), 1)
+        job = store.get(job_id)
+        self.assertEqual((job["state"], job["attempts"]), (jobs.COMPLETED, 2))
+        self.assertEqual(job["result"]["node"], store.node_id)
+        
+    def test_stale_owner_cannot_complete(self):
+        """اختبار أن الجهاز الذي فقد عقده لا يستطيع تسجيل النتيجة"""
+        node_a = SharedJobStore(self.db_path, lease_seconds=0.1, node_id="a")
+        node_b = SharedJobStore(self.db_path, lease_seconds=30, node_id="b")
+        node_a.add("https://youtu.be/x")
+        job_a = node_a.claim()
+        time.sleep(0.2)
+        job_b = node_b.claim()
+        self.assertEqual(job_b["job_id"], job_a["job_id"])
+        self.assertFalse(node_a.heartbeat(job_a))
+        self.assertFalse(node_a.complete(job_a))
+        self.assertTrue(node_b.complete(job_b))
+        
+    def test_crashing_job_fails_after_max_attempts(self):
+        """اختبار أن المهمة التي تُسقط عاملها كل مرة تُسجل فاشلة بدلاً من إعادة حجزها"""
+        store = SharedJobStore(self.db_path, lease_seconds=0.05, max_attempts=2)
+        job_id = store.add("https://youtu.be/crash")
+        other_id = store.add("https://youtu.be/ok")
+        # الإعادة إلى الطابور (إيقاف الجهاز) لا تُحسب محاولة
+        self.assertTrue(store.release(store.claim()))
+        self.assertEqual(store.get(job_id)["attempts"], 0)
+        for attempt in (1, 2):
+            self.assertEqual(store.claim()["job_id"], job_id)
+            time.sleep(0.1)  # انهيار العامل: ينتهي العقد دون نتيجة
+        self.assertEqual(store.claim()["job_id"], other_id)
+        job = store.get(job_id)
+        self.assertEqual((job["state"], job["attempts"]), (jobs.FAILED, 2))
+        self.assertIn("2 attempts", job["result"]["error"])
+        
+    def test_lost_lease_stops_download_keeping_partial(self):
+        """اختبار إيقاف التحميل عند فقد العقد مع إبقاء الملف الجزئي للجهاز الجديد"""
+        import sqlite3
+        QuickDownloader.block = True
+        store = SharedJobStore(self.db_path, lease_seconds=0.3)
+        job_id = store.add("https://youtu.be/x")
+        worker = StoreWorker(store, downloader_factory=QuickDownloader)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(worker.run(max_jobs=1)))
+        thread.start()
+        time.sleep(0.2)
+        with sqlite3.connect(self.db_path) as db:
+            db.execute("UPDATE jobs SET lease_token = 'other', owner = 'b' WHERE job_id = ?",
+                       (job_id,))
+        thread.join(5)
+        self.assertEqual(result, [0])
+        self.assertTrue(QuickDownloader.last.keep_partial)
+        self.assertEqual(store.get(job_id)["owner"], "b")
+
+class TestUrlIndex(unittest.TestCase):
+    """اختبار فهرس النطاقات وتوحيد الروابط"""
+    
+    def test_suffix_matching(self):
+        """اختبار مطابقة النطاقات الفرعية دون النطاقات المشابهة"""
+        index = DomainIndex()
+        self.assertEqual(index.lookup("www.youtube.com"), "youtube.com")
+        self.assertEqual(index.lookup("M.YouTube.com."), "youtube.com")
+        self.assertEqual(index.lookup("youtu.be"), "youtube.com")
+        self.assertEqual(index.lookup("mobile.x.com"), "twitter.com")
+        self.assertIsNone(index.lookup("notyoutube.com"))
+        self.assertIsNone(index.lookup("youtube.com.evil"))
+        self.assertIsNone(index.lookup("com"))
+        self.assertFalse(is_video_url("https://youtube.com.evil/watch?v=x"))
+        self.assertFalse(is_video_url("ftp://youtube.com/x"))
+        
+    def test_normalize_variants(self):
+        """اختبار توحيد صيغ نفس الفيديو"""
+        canonical = "https://youtube.com/watch?v=abc"
+        for url in ("https://www.youtube.com/watch?v=abc",
+                    "https://m.youtube.com/watch?v=abc&feature=share",
+                    "https://youtu.be/abc?si=tracking",
+                    "https://youtube.com/shorts/abc/",
+                    "HTTPS://WWW.YOUTUBE.COM:443/watch?utm_source=x&v=abc#t=1"):
+            self.assertEqual(normalize_url(url), canonical, url)
+        self.assertEqual(normalize_url("https://x.com/u/status/1?s=20"),
+                         "https://twitter.com/u/status/1")
+        # معامل t له معنى في يوتيوب (وقت البدء) فلا يُحذف
+        self.assertEqual(normalize_url("https://youtu.be/abc?t=10"),
+                         "https://youtube.com/watch?t=10&v=abc")
+        self.assertEqual(normalize_url("http://example.com:8080/a/?b=2&a=1"),
+                         "http://example.com:8080/a?a=1&b=2")
+        self.assertIsNone(normalize_url("not a url"))
+        
+    def test_dedup(self):
+        """اختبار حذف التكرار في الاستيراد والذاكرة المؤقتة وطابور الخدمة"""
+        urls = ["https://youtu.be/abc", "https://www.youtube.com/watch?v=abc&si=1",
+                "https://vimeo.com/1", "bad", "https://vimeo.com/1/"]
+        self.assertEqual(unique_urls(urls), ["https://youtu.be/abc", "https://vimeo.com/1"])
+        sites = [site for _, _, site in classify_urls(urls)]
+        self.assertEqual(sites, ["youtube.com", "youtube.com", "vimeo.com", None, "vimeo.com"])
+        
+        cache = MetadataCache()
+        cache.put("https://youtu.be/abc", {"title": "A"})
+        self.assertEqual(cache.get("https://www.youtube.com/watch?v=abc")["title"], "A")
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            journal = JobJournal(os.path.join(temp_dir, "jobs.journal"))
+            manager = JobManager(temp_dir, journal=journal)
+            first = manager.submit("https://youtu.be/abc")
+            second = manager.submit("https://www.youtube.com/watch?v=abc&utm_source=x")
+            self.assertEqual(first["job_id"], second["job_id"])
+            manager.cancel(first["job_id"])
+            third = manager.submit("https://youtube.com/watch?v=abc")
+            self.assertNotEqual(third["job_id"], first["job_id"])
+            journal.close()
+            
+    def test_bulk_classification_speed(self):
+        """اختبار تصنيف دفعة كبيرة من الروابط"""
+        hosts = ["www.youtube.com", "vimeo.com", "cdn%d.example.org", "m.facebook.com",
+                 "notyoutube.com.evil"]
+        urls = [f"https://{hosts[n % 5] % n if '%' in hosts[n % 5] else hosts[n % 5]}"
+                f"/watch?v={n}&utm_source=feed" for n in range(200000)]
+        start = time.perf_counter()
+        supported = sum(1 for _, _, site in classify_urls(urls) if site)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(supported, 120000)
+        self.assertLess(elapsed, 30)
+        
+def _pool_runner(argv):
+    """yt-dlp وهمي ينفذ داخل عملية المجمع"""
+    import json
+    if "--dump-json" in argv:
+        print(json.dumps({"title": argv[-1].rsplit("/", 1)[-1], "formats": []}))
+    elif "sleep" in argv:
+        time.sleep(30)
+    elif "crash" in argv:
+        os._exit(3)
+    elif "-f" in argv:
+        for percentage in (25, 50, 100):
+            print(f"[download]  {percentage}.0% of 1.00MiB at 1.00MiB/s ETA 00:01")
+    else:
+        print(os.getpid())
+    return 0
+
+class TestWorkerPool(unittest.TestCase):
+    """اختبار مجمع عمليات yt-dlp الجاهزة"""
+    
+    def make_pool(self, size=1, max_tasks=50):
+        pool = WorkerPool(size, max_tasks=max_tasks, runner=_pool_runner, warmup=None)
+        self.addCleanup(pool.shutdown)
+        return pool
+        
+    def run_command(self, pool, *args):
+        process = pool.popen(["yt-dlp"] + list(args), stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, text=True)
+        output = process.stdout.read()
+        return process.wait(10), output.strip()
+        
+    def test_reuses_worker_and_recycles(self):
+        """اختبار تنفيذ الأوامر في نفس العملية واستبدالها بعد عدد المهام"""
+        pool = self.make_pool(max_tasks=2)
+        pids = [self.run_command(pool, "pid")[1] for _ in range(3)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertNotIn(str(os.getpid()), pids)
+        stats = pool.stats()
+        self.assertEqual((stats["tasks"], stats["recycled"]), (3, 1))
+        
+    def test_crash_and_terminate_replace_worker(self):
+        """اختبار أن انهيار العملية أو إنهاء أمرها لا يعطل المجمع"""
+        pool = self.make_pool()
+        self.assertEqual(self.run_command(pool, "crash")[0], 3)
+        process = pool.popen(["yt-dlp", "sleep"], stdout=subprocess.PIPE)
+        time.sleep(0.5)
+        process.terminate()
+        self.assertLess(process.wait(10), 0)
+        self.assertEqual(self.run_command(pool, "pid")[0], 0)
+        self.assertEqual(pool.stats()["replaced"], 2)
+        
+    def test_queue_and_health_check(self):
+        """اختبار انتظار الأوامر في الطابور واستبدال العملية التي لا تستجيب"""
+        pool = self.make_pool()
+        busy = pool.popen(["yt-dlp", "sleep"], stdout=subprocess.PIPE)
+        queued = pool.popen(["yt-dlp", "pid"], stdout=subprocess.PIPE)
+        self.assertEqual(pool.stats()["queued"], 1)
+        queued.terminate()
+        self.assertEqual(queued.wait(1), -signal.SIGTERM)
+        busy.kill()
+        busy.wait(10)
+        
+        deadline = time.monotonic() + 10
+        while pool.stats()["idle"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        pool._idle[0].kill()
+        self.assertEqual(pool.check_health(), 1)
+        self.assertEqual(self.run_command(pool, "pid")[0], 0)
+        
+    def test_downloader_dispatches_to_pool(self):
+        """اختبار أن VideoDownloader يستخدم المجمع لجلب المعلومات والتحميل دون تغيير"""
+        pool = self.make_pool()
+        progress = []
+        downloader = VideoDownloader(progress_callback=progress.append, worker_pool=pool,
+                                     info_cache=MetadataCache())
+        with patch("downloader.subprocess.Popen", side_effect=AssertionError("cold start")):
+            info = downloader.get_video_info("https://vimeo.com/clip")
+            self.assertEqual(info["title"], "clip")
+            with tempfile.TemporaryDirectory() as temp_dir:
+                self.assertTrue(downloader.download_video(
+                    "https://vimeo.com/clip", 0, temp_dir,
+                    {"format_id": "18", "type": "combined", "label": "360p"}))
+        self.assertEqual(progress[-1], 100.0)
+        
+class TestAsyncCancel(unittest.TestCase):
+    """اختبار الإلغاء والإغلاق دون انتظار العمليات في خيط الاستدعاء"""
+    
+    # عملية تتجاهل طلب الإنهاء (SIGTERM) فلا تخرج إلا بالقتل القسري
+    STUBBORN = ("import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                "print('ready', flush=True); time.sleep(30)")
+    
+    def make_downloader(self, grace):
+        downloader = VideoDownloader(reaper=ProcessReaper(grace=grace))
+        process = subprocess.Popen([sys.executable, "-c", self.STUBBORN],
+                                   stdout=subprocess.PIPE, text=True)
+        self.addCleanup(process.kill)
+        process.stdout.readline()
+        downloader.active_processes.append(process)
+        downloader.is_downloading = True
+        return downloader, process
+        
+    def test_cancel_returns_immediately_and_escalates(self):
+        """اختبار أن الإلغاء يعود فوراً ثم تُقتل العملية بعد المهلة ويُستدعى الإبلاغ"""
+        downloader, process = self.make_downloader(grace=0.5)
+        confirmed = threading.Event()
+        started = time.monotonic()
+        stopped = downloader.cancel_download(callback=confirmed.set)
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertIsNone(process.poll())
+        self.assertTrue(stopped.wait(5))
+        self.assertTrue(confirmed.is_set())
+        self.assertIsNotNone(process.poll())
+        
+    def test_parallel_shutdown_is_bounded(self):
+        """اختبار أن إيقاف عدة تحميلات يتم بالتوازي وخلال المدة الكلية"""
+        downloaders = [self.make_downloader(grace=0.5)[0] for _ in range(4)]
+        started = time.monotonic()
+        self.assertTrue(stop_downloaders(downloaders, timeout=5))
+        # بالتتابع يستغرق 4 × 0.5 ثانية على الأقل
+        self.assertLess(time.monotonic() - started, 1.8)
+        
+        slow = [self.make_downloader(grace=30)[0] for _ in range(2)]
+        started = time.monotonic()
+        self.assertFalse(stop_downloaders(slow, cancel=True, timeout=0.5))
+        self.assertLess(time.monotonic() - started, 1.5)
+        
+def _tk_root(test):
+    """نافذة Tk مخفية للاختبار (يُتخطى الاختبار إذا لم تتوفر شاشة)"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        test.skipTest("no display available")
+    root.withdraw()
+    test.addCleanup(root.destroy)
+    return root
+
+class TestMessageLog(unittest.TestCase):
+    """اختبار سجل الرسائل بسعة ثابتة والرسم على دفعات"""
+    
+    def test_ring_buffer_capacity_and_pending(self):
+        """اختبار حذف الأقدم عند امتلاء المخزن وإرجاع الجديد فقط للرسم"""
+        buffer = MessageBuffer(capacity=100)
+        for n in range(250):
+            buffer.append(f"m{n}")
+        self.assertEqual(len(buffer), 100)
+        pending = buffer.take_pending()
+        self.assertEqual([entry[3] for entry in pending], [f"m{n}" for n in range(150, 250)])
+        self.assertEqual(buffer.take_pending(), [])
+        buffer.append("late", "error")
+        self.assertEqual([entry[3] for entry in buffer.take_pending()], ["late"])
+        
+    def test_filtered_view(self):
+        """اختبار التصفية حسب النوع والنص وعرض آخر الرسائل المطابقة فقط"""
+        buffer = MessageBuffer()
+        for n in range(1000):
+            buffer.append(f"job {n} failed" if n % 10 == 0 else f"job {n} ok",
+                          "error" if n % 10 == 0 else "info")
+        buffer.append("unknown type", "debug")
+        errors = buffer.view("error", limit=5)
+        self.assertEqual([entry[3] for entry in errors],
+                         [f"job {n} failed" for n in (950, 960, 970, 980, 990)])
+        self.assertEqual(len(buffer.view(query="FAILED")), 100)
+        self.assertEqual(buffer.view(query="unknown")[0][2], "info")
+        
+    def test_widget_batches_and_trims(self):
+        """اختبار أن عنصر النص يُرسم دفعة واحدة ولا يتجاوز عدد الأسطر المحدد"""
+        from widgets import MessageLog
+        root = _tk_root(self)
+        log = MessageLog(root, buffer=MessageBuffer(capacity=1000), visible=50)
+        for n in range(300):
+            log.add(f"line {n}", "success" if n % 2 else "info")
+        self.assertEqual(log.text.get("1.0", "end-1c"), "")
+        log.flush()
+        lines = log.text.get("1.0", "end-1c").splitlines()
+        self.assertEqual(len(lines), 50)
+        self.assertTrue(lines[-1].endswith("line 299"))
+        log.query_var.set("line 1")
+        lines = log.text.get("1.0", "end-1c").splitlines()
+        self.assertTrue(all("line 1" in line for line in lines))
+        
+class TestJobTable(unittest.TestCase):
+    """اختبار لوحة التقدم المركزية وجدول المهام الذي يحدّث الصفوف المتغيرة فقط"""
+    
+    def test_board_reports_only_changed_rows(self):
+        """اختبار أن القراءة التالية تُرجع الصفوف التي تغيرت أو حُذفت فقط"""
+        board = jobs.ProgressBoard()
+        for n in range(100):
+            board.update(f"job{n}", title=f"video {n}", state=jobs.QUEUED)
+        version, changed, removed = board.changes()
+        self.assertEqual(len(changed), 100)
+        board.update("job5", state=jobs.RUNNING)
+        board.update("job7", progress=50.0)
+        board.remove("job9")
+        version, changed, removed = board.changes(version)
+        self.assertEqual(set(changed), {"job5", "job7"})
+        self.assertEqual(changed["job7"]["title"], "video 7")
+        self.assertEqual(removed, ["job9"])
+        self.assertEqual(board.changes(version)[1:], ({}, []))
+        self.assertEqual(len(board), 99)
+        
+    def test_board_speed_and_eta(self):
+        """اختبار حساب السرعة والوقت المتبقي من البايتات ومسحهما عند التوقف"""
+        now = [0.0]
+        board = jobs.ProgressBoard(clock=lambda: now[0])
+        board.update("job", state=jobs.RUNNING, downloaded=0, total=10000)
+        for step in range(1, 6):
+            now[0] = float(step)
+            board.update("job", downloaded=step * 1000)
+        row = board.get("job")
+        self.assertAlmostEqual(row["speed"], 1000.0)
+        self.assertAlmostEqual(row["eta"], 5.0)
+        self.assertAlmostEqual(row["progress"], 50.0)
+        values = job_row_values(row)
+        self.assertEqual(values[2], "50.0%")
+        self.assertTrue(values[3] and values[4])
+        board.update("job", state=jobs.PAUSED)
+        row = board.get("job")
+        self.assertIsNone(row["speed"])
+        self.assertEqual(job_row_values(row)[3:5], ("", ""))
+        
+    def test_board_scales_to_thousands_of_jobs(self):
+        """اختبار أن قراءة التغييرات بين دورتين تبقى سريعة مع 5000 مهمة"""
+        board = jobs.ProgressBoard()
+        for n in range(5000):
+            board.update(f"job{n}", title=f"video {n}", state=jobs.RUNNING, total=10 ** 6)
+        version = board.changes()[0]
+        for n in range(0, 5000, 10):
+            board.update(f"job{n}", downloaded=n * 100)
+        started = time.perf_counter()
+        version, changed, removed = board.changes(version)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(changed), 500)
+        self.assertLess(elapsed, 0.016)
+        
+    def test_table_updates_changed_rows_within_budget(self):
+        """اختبار أن الجدول يرسم الصفوف المتغيرة فقط وبحد أقصى لكل دورة"""
+        from widgets import JobTable
+        root = _tk_root(self)
+        board = jobs.ProgressBoard()
+        table = JobTable(root, board, max_updates=5000)
+        for n in range(5000):
+            board.update(f"job{n}", title=f"video {n}", state=jobs.QUEUED)
+        self.assertEqual(table.refresh(), 5000)
+        self.assertEqual(len(table.tree.get_children()), 5000)
+        
+        for n in range(0, 5000, 10):
+            board.update(f"job{n}", state=jobs.RUNNING, progress=n / 50)
+        started = time.perf_counter()
+        self.assertEqual(table.refresh(), 500)
+        self.assertLess(time.perf_counter() - started, 0.016)
+        self.assertEqual(table.tree.set("job10", "progress"), "0.2%")
+        
+        # تحديث لا يغير القيم المعروضة لا يلمس الجدول
+        board.update("job10", title="video 10")
+        self.assertEqual(table.refresh(), 0)
+        
+        table.max_updates = 100
+        for n in range(250):
+            board.update(f"job{n}", progress=99.0)
+        self.assertEqual(table.refresh(), 100)
+        self.assertEqual(table.refresh(), 100)
+        self.assertEqual(table.refresh(), 50)
+        board.remove("job1")
+        table.refresh()
+        self.assertFalse(table.tree.exists("job1"))
+        
+class TestUnifiedDownload(unittest.TestCase):
+    """اختبار نقطة الدخول الموحدة للتحميل وكشف توقف التقدم بدلاً من المهلة الكلية"""
+    
+    def setUp(self):
+        self.downloader = VideoDownloader(info_cache=MetadataCache(),
+                                          retry_policy=RetryPolicy(base_delay=0.01,
+                                                                   max_delay=0.05))
+        
+    def test_explicit_format_without_info(self):
+        """اختبار أن المعرف الصريح يُحمَّل بنفس المسار دون جلب المعلومات"""
+        with patch.object(self.downloader, "get_video_info") as fetch, \
+                patch.object(self.downloader, "_run_download", return_value=True) as run:
+            self.assertTrue(self.downloader.download("https://youtu.be/x", "/tmp",
+                                                     format_id="137+140"))
+        fetch.assert_not_called()
+        cmd = run.call_args[0][0]
+        self.assertEqual(cmd[cmd.index("-f") + 1], "137+140")
+        self.assertIn("--newline", cmd)
+        self.assertIn("--merge-output-format", cmd)
+        self.assertTrue(cmd[cmd.index("-o") + 1].endswith("%(title)s.%(ext)s"))
+        
+    def test_policy_selects_from_info_or_falls_back_to_selector(self):
+        """اختبار تطبيق السياسة على خيارات الفيديو، أو كمحدد عام إذا تعذر جلب المعلومات"""
+        info = {"title": "clip", "formats": [
+            {"format_id": "18", "ext": "mp4", "height": 360, "vcodec": "avc1", "acodec": "mp4a",
+             "url": "https://cdn/18", "filesize": 1000},
+            {"format_id": "22", "ext": "mp4", "height": 720, "vcodec": "avc1", "acodec": "mp4a",
+             "url": "https://cdn/22", "filesize": 4000}]}
+        with patch.object(self.downloader, "_run_download", return_value=True) as run:
+            self.assertTrue(self.downloader.download("https://youtu.be/x", "/tmp",
+                                                     policy="worst", info=info))
+            cmd = run.call_args[0][0]
+            self.assertEqual(cmd[cmd.index("-f") + 1], "18")
+            self.assertTrue(cmd[cmd.index("-o") + 1].endswith("clip.%(ext)s"))
+            with patch.object(self.downloader, "get_video_info", return_value=None):
+                self.downloader.download("https://youtu.be/y", "/tmp", policy="720p")
+            cmd = run.call_args[0][0]
+            self.assertEqual(cmd[cmd.index("-f") + 1], "best[height<=720]/best")
+            
+    def test_stalled_download_restarted(self):
+        """اختبار إنهاء عملية توقف تقدمها وإعادة تشغيلها بدلاً من انتظار مهلة كلية"""
+        real_popen = subprocess.Popen
+        processes = []
+        
+        def fake_popen(cmd, **kwargs):
+            script = ("print('[download]  10.0% of 1.00MiB at 1.00MiB/s ETA 00:01', flush=True); "
+                      "import time; time.sleep(30)") if not processes else \
+                "print('[download] 100.0% of 1.00MiB')"
+            process = real_popen([sys.executable, "-c", script], **kwargs)
+            processes.append(process)
+            return process
+            
+        self.downloader.stall_timeout = 0.5
+        progress = []
+        self.downloader.progress_callback = progress.append
+        started = time.monotonic()
+        with patch("downloader.subprocess.Popen", side_effect=fake_popen):
+            self.assertTrue(self.downloader.download("https://youtu.be/x", "/tmp",
+                                                     format_id="18"))
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(len(processes), 2)
+        self.assertEqual(progress, [10.0, 100.0])
+        self.assertEqual(self.downloader.retry_metrics.retries, 1)
+        
+    def test_postprocessing_not_treated_as_stall(self):
+        """اختبار أن الدمج الطويل دون مخرجات تقدم لا يُعد توقفاً"""
+        real_popen = subprocess.Popen
+        script = ("print('[Merger] Merging formats into x.mp4', flush=True); "
+                  "import time; time.sleep(1)")
+        self.downloader.stall_timeout = 0.3
+        with patch("downloader.subprocess.Popen",
+                   side_effect=lambda cmd, **kwargs: real_popen([sys.executable, "-c", script],
+                                                                **kwargs)) as popen:
+            self.assertTrue(self.downloader.download("https://youtu.be/x", "/tmp",
+                                                     format_id="18"))
+        self.assertEqual(popen.call_count, 1)
+        
+class FakeCliDownloader:
+    """محمّل وهمي ينفذ نتائج محددة مسبقاً لكل تحميل"""
+    
+    def __init__(self, outcomes, progress_callback=None, checkpoint_callback=None):
+        self.outcomes = outcomes
+        self.progress_callback = progress_callback
+        self.checkpoint_callback = checkpoint_callback
+        self.retry_metrics = RetryMetrics()
+        self.downloads = []
+        
+    def resolve_quality(self, url, format_id=None, policy=None, info=None):
+        selector = format_id or policy
+        return {"format_id": selector, "label": selector, "type": "format"}, {"title": "clip"}
+        
+    def download(self, url, save_path, selected_quality=None, info=None):
+        self.downloads.append((url, selected_quality["format_id"]))
+        self.retry_metrics = RetryMetrics()
+        for percentage in (25.0, 50.0, 100.0):
+            self.progress_callback(percentage)
+            self.checkpoint_callback(int(percentage * 10), 1000)
+            time.sleep(0.03)
+        outcome = self.outcomes.pop(0)
+        if outcome != "ok":
+            self.retry_metrics.record_failure(DownloadFailure(f"{outcome} error", outcome))
+        return outcome == "ok"
+        
+    def pause_download(self):
+        return True
+        
+class TestCli(unittest.TestCase):
+    """اختبار واجهة سطر الأوامر: أحداث NDJSON ورموز الخروج والاستئناف"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.journal = JobJournal(Path(self.temp_dir.name) / "jobs.journal")
+        self.output = __import__("io").StringIO()
+        
+    def make_runner(self, outcomes):
+        self.fake = None
+        
+        def factory(**callbacks):
+            self.fake = FakeCliDownloader(outcomes, **callbacks)
+            return self.fake
+            
+        return cli.CliRunner(cli.EventWriter(self.output), interval=0.01,
+                             downloader_factory=factory, journal=self.journal)
+        
+    def events(self):
+        return [json.loads(line) for line in self.output.getvalue().splitlines()]
+        
+    def test_download_streams_ndjson_progress(self):
+        """اختبار تسلسل أحداث التحميل وتسجيل المهمة مكتملة"""
+        runner = self.make_runner(["ok"])
+        code = runner.download("https://youtu.be/x", self.temp_dir.name, policy="720p")
+        self.assertEqual(code, cli.EXIT_OK)
+        events = self.events()
+        self.assertEqual(events[0]["event"], "start")
+        self.assertEqual(events[0]["format"], "720p")
+        self.assertEqual(events[0]["title"], "clip")
+        self.assertEqual(events[-1]["event"], "done")
+        progress = [e for e in events if e["event"] == "progress"]
+        self.assertTrue(progress)
+        self.assertEqual(progress[-1]["progress"], 100.0)
+        self.assertEqual(progress[-1]["downloaded"], 1000)
+        job_id = events[0]["job_id"]
+        self.assertEqual(self.journal.replay()[job_id]["state"], jobs.COMPLETED)
+        
+    def test_exit_codes_and_resume(self):
+        """اختبار تمييز الفشل المؤقت من الدائم واستئناف المؤقت بأمر resume"""
+        runner = self.make_runner([retry.TRANSIENT, retry.PERMANENT, "ok"])
+        code = runner.batch(["https://youtu.be/a", "https://youtu.be/b"], self.temp_dir.name,
+                            format_id="18")
+        self.assertEqual(code, cli.EXIT_TRANSIENT)
+        failed = [e for e in self.events() if e["event"] == "failed"]
+        self.assertEqual([e["transient"] for e in failed], [True, False])
+        self.assertEqual(self.events()[-1]["completed"], 0)
+        
+        self.assertEqual([job["url"] for job in self.journal.unfinished()],
+                         ["https://youtu.be/a"])
+        self.assertEqual(runner.resume(self.temp_dir.name), cli.EXIT_OK)
+        self.assertEqual(self.fake.downloads[-1], ("https://youtu.be/a", "18"))
+        self.assertEqual(self.journal.unfinished(), [])
+        self.assertEqual(cli.exit_code_for([cli.EXIT_OK, cli.EXIT_PERMANENT]),
+                         cli.EXIT_PERMANENT)
+        
+    def test_resume_job_without_option_uses_policy(self):
+        """اختبار استئناف مهمة بلا خيار جودة محفوظ بسياسة جودتها بدلاً من إلغائها"""
+        self.journal.record("q1", jobs.QUEUED, url="https://youtu.be/q", quality="720p",
+                            save_path=self.temp_dir.name, option=None)
+        runner = self.make_runner(["ok"])
+        self.assertEqual(runner.resume(), cli.EXIT_OK)
+        self.assertEqual(self.fake.downloads, [("https://youtu.be/q", "720p")])
+        self.assertEqual(self.journal.unfinished(), [])
+        
+    def test_usage_errors(self):
+        """اختبار رفض المعاملات المتعارضة والروابط غير الصالحة"""
+        with patch("sys.stderr"), self.assertRaises(SystemExit) as raised:
+            cli.main(["download", "https://youtu.be/x", "--format", "18", "--policy", "best"])
+        self.assertEqual(raised.exception.code, cli.EXIT_USAGE)
+        code = cli.main(["batch", "not a url"], events=cli.EventWriter(self.output))
+        self.assertEqual(code, cli.EXIT_USAGE)
+        self.assertEqual([e["event"] for e in self.events()], ["warning", "error"])
+        
+    def test_does_not_import_tkinter(self):
+        """اختبار أن الواجهة ووحدات التحميل لا تستورد tkinter"""
+        script = ("import sys, cli, downloader; cli.build_parser(); "
+                  "sys.exit('tkinter' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(
+            os.path.abspath(__file__)), capture_output=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        
+class TestQueueWindows(unittest.TestCase):
+    """اختبار نوافذ الوقت وحدود السرعة لكل طابور في الخدمة بدون واجهة"""
+    
+    PROFILES = {"bulk": [{"start": "01:00", "end": "06:00"},
+                         {"start": "06:00", "end": "08:00", "rate": "2M"}]}
+    
+    def at(self, hour):
+        from datetime import datetime
+        return datetime(2024, 1, 1, hour, 30)
+        
+    def test_window_state(self):
+        """اختبار مطابقة النوافذ بالترتيب وعبور منتصف الليل وتحليل حدود السرعة"""
+        windows = QueueWindows({"bulk": [{"start": "01:00", "end": "06:00"}, {"rate": "2M"}],
+                                "night": [{"start": "22:00", "end": "06:00", "rate": 500000}],
+                                "off": [{"rate": 0}]})
+        self.assertEqual(windows.state("bulk", self.at(3)), (True, None))
+        self.assertEqual(windows.state("bulk", self.at(12)), (True, 2 * 1024 ** 2))
+        self.assertEqual(windows.state("night", self.at(23)), (True, 500000))
+        self.assertEqual(windows.state("night", self.at(2)), (True, 500000))
+        self.assertEqual(windows.state("night", self.at(12)), (False, None))
+        self.assertEqual(windows.state("off", self.at(12)), (False, None))
+        self.assertEqual(windows.state("other", self.at(12)), (True, None))
+        with self.assertRaises(ValueError):
+            QueueWindows({"bulk": [{"start": "25:00", "end": "06:00"}]})
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "windows.json")
+            with open(path, "w") as f:
+                f.write('{"bulk": [{"start": "01:00"}]}')
+            self.assertEqual(load_queue_windows(path).queues(), [])
+            
+    def test_manager_holds_suspends_and_throttles(self):
+        """اختبار تعليق مهام الطابور المغلق وإعادتها من ملفها الجزئي وتغيير حد السرعة"""
+        FakeJobDownloader.instances = []
+        now = [self.at(12)]
+        temp_dir = tempfile.mkdtemp()
+        manager = JobManager(temp_dir, max_parallel=1,
+                             journal=JobJournal(os.path.join(temp_dir, "jobs.journal")),
+                             downloader_factory=FakeJobDownloader,
+                             windows=QueueWindows(self.PROFILES, clock=lambda: now[0]))
+        manager.start()
+        self.addCleanup(manager.shutdown)
+        
+        def wait_for(condition):
+            deadline = time.monotonic() + 5
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.02)
+            return condition()
+            
+        bulk = manager.submit("https://youtu.be/bulk", queue_name="bulk")
+        time.sleep(0.2)
+        self.assertEqual(FakeJobDownloader.instances, [])
+        self.assertEqual(manager.get_job(bulk["job_id"])["waiting"], "window")
+        self.assertEqual(manager.queue_stats()["bulk"]["held"], 1)
+        
+        # فتح النافذة: تبدأ المهمة بلا حد للسرعة
+        now[0] = self.at(3)
+        manager.apply_windows()
+        self.assertTrue(wait_for(lambda: manager.get_job(bulk["job_id"])["state"] == jobs.RUNNING
+                                 and FakeJobDownloader.instances))
+        first = FakeJobDownloader.instances[0]
+        self.assertIsNone(first.rate_limit)
+        
+        # نافذة بحد سرعة: يتغير حد التحميل الجاري دون إيقافه
+        now[0] = self.at(7)
+        manager.apply_windows()
+        self.assertEqual(first.rate_changes, [2 * 1024 ** 2])
+        self.assertEqual(manager.get_job(bulk["job_id"])["state"], jobs.RUNNING)
+        
+        # إغلاق النافذة: تُعلق المهمة مع إبقاء ملفها الجزئي ويتحرر مكانها
+        now[0] = self.at(12)
+        manager.apply_windows()
+        job = manager.get_job(bulk["job_id"])
+        self.assertEqual((job["state"], job["waiting"]), (jobs.PAUSED, "window"))
+        self.assertTrue(first.cancelled and first.keep_partial)
+        other = manager.submit("https://youtu.be/other")
+        self.assertTrue(wait_for(lambda: manager.get_job(other["job_id"])["state"]
+                                 == jobs.RUNNING))
+        FakeJobDownloader.instances[1].finish.set()
+        self.assertTrue(wait_for(lambda: manager.get_job(other["job_id"])["state"]
+                                 == jobs.COMPLETED))
+        
+        # إعادة فتح النافذة: تعود المهمة إلى الطابور وتكمل
+        now[0] = self.at(3)
+        manager.apply_windows()
+        self.assertTrue(wait_for(lambda: len(FakeJobDownloader.instances) == 3))
+        self.assertTrue(wait_for(lambda: manager.get_job(bulk["job_id"])["state"]
+                                 == jobs.RUNNING))
+        self.assertIsNone(manager.get_job(bulk["job_id"])["waiting"])
+        FakeJobDownloader.instances[2].finish.set()
+        self.assertTrue(wait_for(lambda: manager.get_job(bulk["job_id"])["state"]
+                                 == jobs.COMPLETED))
+        
+    def test_rate_change_restarts_process_from_partial(self):
+        """اختبار أن تغيير حد السرعة يعيد العملية بالحد الجديد دون عده فشلاً"""
+        real_popen = subprocess.Popen
+        commands = []
+        
+        def fake_popen(cmd, **kwargs):
+            script = ("print('[download]  10.0% of 1.00MiB', flush=True); "
+                      "import time; time.sleep(30)") if not commands else "pass"
+            commands.append(cmd)
+            return real_popen([sys.executable, "-c", script], **kwargs)
+            
+        downloader = VideoDownloader(stall_timeout=None)
+        cmd = ["yt-dlp", "-f", "18", "https://youtu.be/x"]
+        results = []
+        with patch("downloader.subprocess.Popen", side_effect=fake_popen):
+            thread = threading.Thread(target=lambda: results.append(
+                downloader._run_download(cmd, "https://youtu.be/x", "18")))
+            thread.start()
+            deadline = time.monotonic() + 5
+            while not downloader.active_processes and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertTrue(downloader.set_rate_limit(500000))
+            self.assertFalse(downloader.set_rate_limit(500000))
+            thread.join(10)
+        self.assertEqual(results, [True])
+        self.assertNotIn("--limit-rate", commands[0])
+        self.assertEqual(commands[1][1:3], ["--limit-rate", "500000"])
+        self.assertEqual(downloader.retry_metrics.retries, 0)
+        
+class TestPriorityScheduling(unittest.TestCase):
+    """اختبار الأولويات والتقادم وإيقاف المهام المنخفضة لصالح العاجلة"""
+    
+    def test_priority_aging_and_metrics(self):
+        """اختبار سحب الأعلى أولوية أولاً وتقدم المهمة القديمة بالتقادم"""
+        now = [0.0]
+        scheduler = PoliteScheduler({}, {"concurrency": 5, "rate": 0},
+                                    clock=lambda: now[0], aging_interval=100)
+        scheduler.put("old", "https://example.org/old")
+        now[0] = 250.0
+        scheduler.put("urgent", "https://example.org/urgent", priority=5)
+        scheduler.put("normal", "https://vimeo.com/1", priority=1)
+        self.assertEqual(scheduler.level(0, 0.0), 2)
+        self.assertEqual(scheduler.metrics()["waiting"], {"0": 1, "5": 1, "1": 1})
+        self.assertEqual([scheduler.get(timeout=0) for _ in range(3)],
+                         ["urgent", "old", "normal"])
+        metrics = scheduler.metrics()
+        self.assertEqual((metrics["picked"], metrics["aged"]), (3, 1))
+        self.assertEqual(metrics["wait"]["0"], {"picked": 1, "avg": 250.0, "max": 250.0})
+        
+        # إعادة مهمة بوقت دخولها الأول تحفظ تقادمها
+        scheduler.put("fresh", "https://example.org/fresh", priority=2)
+        scheduler.put("requeued", "https://example.org/old", since=0.0)
+        self.assertTrue(scheduler.discard("fresh"))
+        scheduler.put("fresh", "https://example.org/fresh", priority=1)
+        self.assertEqual(scheduler.get(timeout=0), "requeued")
+        
+    def test_urgent_job_preempts_and_low_job_resumes(self):
+        """اختبار إيقاف المهمة المنخفضة مع ملفها الجزئي ثم إكمالها بعد العاجلة"""
+        FakeJobDownloader.instances = []
+        temp_dir = tempfile.mkdtemp()
+        manager = JobManager(temp_dir, max_parallel=1,
+                             journal=JobJournal(os.path.join(temp_dir, "jobs.journal")),
+                             downloader_factory=FakeJobDownloader)
+        manager.start()
+        self.addCleanup(manager.shutdown)
+        
+        def wait_for(condition):
+            deadline = time.monotonic() + 5
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.02)
+            return condition()
+            
+        def state(job):
+            return manager.get_job(job["job_id"])["state"]
+            
+        archive = manager.submit("https://youtu.be/archive")
+        self.assertTrue(wait_for(lambda: state(archive) == jobs.RUNNING))
+        # نفس الأولوية لا توقف الجارية
+        same = manager.submit("https://vimeo.com/same")
+        time.sleep(0.1)
+        self.assertEqual(state(archive), jobs.RUNNING)
+        manager.cancel(same["job_id"])
+        
+        urgent = manager.submit("https://vimeo.com/urgent", priority=10)
+        self.assertEqual(urgent["priority"], 10)
+        self.assertNotIn("queued_at", urgent)
+        job = manager.get_job(archive["job_id"])
+        self.assertEqual((job["state"], job["waiting"]), (jobs.PAUSED, "preempted"))
+        first = FakeJobDownloader.instances[0]
+        self.assertTrue(first.cancelled and first.keep_partial)
+        self.assertTrue(wait_for(lambda: state(urgent) == jobs.RUNNING))
+        self.assertEqual(state(archive), jobs.PAUSED)
+        self.assertEqual(manager.scheduler_stats()["running"], {"10": 1})
+        
+        FakeJobDownloader.instances[-1].finish.set()
+        self.assertTrue(wait_for(lambda: state(urgent) == jobs.COMPLETED))
+        self.assertTrue(wait_for(lambda: state(archive) == jobs.RUNNING))
+        self.assertIsNone(manager.get_job(archive["job_id"])["waiting"])
+        FakeJobDownloader.instances[-1].finish.set()
+        self.assertTrue(wait_for(lambda: state(archive) == jobs.COMPLETED))
+        stats = manager.scheduler_stats()
+        self.assertEqual((stats["preempted"], stats["resumed"], stats["held_preempted"]),
+                         (1, 1, 0))
+        
+    def test_preempts_on_blocking_host(self):
+        """اختبار أن المهمة التي يمنعها حد موقعها توقف مهمة على نفس الموقع فقط"""
+        FakeJobDownloader.instances = []
+        temp_dir = tempfile.mkdtemp()
+        scheduler = PoliteScheduler({"tiktok.com": {"concurrency": 1, "rate": 0}},
+                                    {"concurrency": 2, "rate": 0})
+        manager = JobManager(temp_dir, max_parallel=2,
+                             journal=JobJournal(os.path.join(temp_dir, "jobs.journal")),
+                             downloader_factory=FakeJobDownloader, scheduler=scheduler)
+        manager.start()
+        self.addCleanup(manager.shutdown)
+        
+        def wait_for(condition):
+            deadline = time.monotonic() + 5
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.02)
+            return condition()
+            
+        def state(job):
+            return manager.get_job(job["job_id"])["state"]
+            
+        tiktok = manager.submit("https://tiktok.com/v/a")
+        youtube = manager.submit("https://youtu.be/b")
+        self.assertTrue(wait_for(lambda: state(tiktok) == state(youtube) == jobs.RUNNING))
+        self.assertEqual(scheduler.host_slots("tiktok.com"), 0)
+        
+        urgent = manager.submit("https://tiktok.com/v/c", priority=10)
+        self.assertEqual(manager.get_job(tiktok["job_id"])["waiting"], "preempted")
+        self.assertEqual(state(youtube), jobs.RUNNING)
+        self.assertTrue(wait_for(lambda: state(urgent) == jobs.RUNNING))
+        
+        # المهمة الموقوفة تعود حين يتحرر حد موقعها، لا حين يتحرر أي مكان
+        youtube_downloader = FakeJobDownloader.instances[1]
+        youtube_downloader.finish.set()
+        self.assertTrue(wait_for(lambda: state(youtube) == jobs.COMPLETED))
+        time.sleep(0.1)
+        self.assertEqual(state(tiktok), jobs.PAUSED)
+        FakeJobDownloader.instances[-1].finish.set()
+        self.assertTrue(wait_for(lambda: state(urgent) == jobs.COMPLETED))
+        self.assertTrue(wait_for(lambda: state(tiktok) == jobs.RUNNING))
+        FakeJobDownloader.instances[-1].finish.set()
+        self.assertTrue(wait_for(lambda: state(tiktok) == jobs.COMPLETED))
+        self.assertEqual(manager.scheduler_stats()["preempted"], 1)
+        
+class TestPoliteScheduler(unittest.TestCase):
+    """اختبار حدود التزامن والمعدل لكل موقع والتناوب بين المواقع"""
+    
+    def setUp(self):
+        self.now = [0.0]
+        self.scheduler = PoliteScheduler(
+            {"youtube.com": {"concurrency": 2, "rate": 1.0},
+             "tiktok.com": {"concurrency": 1, "rate": 0}},
+            {"concurrency": 1, "rate": 0}, clock=lambda: self.now[0])
+            
+    def test_host_aliases(self):
+        """اختبار احتساب النطاقات المختصرة على نفس الموقع"""
+        self.assertEqual(self.scheduler.host_for("https://youtu.be/x"), "youtube.com")
+        self.assertEqual(self.scheduler.host_for("https://m.youtube.com/watch?v=x"),
+                         "youtube.com")
+        self.assertEqual(self.scheduler.host_for("https://vm.tiktok.com/x"), "tiktok.com")
+        self.assertEqual(self.scheduler.host_for("https://example.org/a"), "example.org")
+        
+    def test_interleaves_hosts(self):
+        """اختبار أن موقعاً مزدحماً لا يحجب بقية الطابور"""
+        for n in range(5):
+            self.scheduler.put(f"yt{n}", f"https://youtube.com/watch?v={n}")
+        self.scheduler.put("tt0", "https://tiktok.com/v/0")
+        self.scheduler.put("ex0", "https://example.org/0")
+        started = [self.scheduler.get(timeout=0) for _ in range(3)]
+        self.assertEqual(started, ["yt0", "tt0", "ex0"])
+        
+    def test_concurrency_and_rate_limits(self):
+        """اختبار انتظار المهمة حتى يتوفر مكان ووقت بدء في حد موقعها"""
+        for n in range(4):
+            self.scheduler.put(f"yt{n}", "https://youtube.com/watch")
+        self.assertEqual(self.scheduler.get(timeout=0), "yt0")
+        self.assertIsNone(self.scheduler.get(timeout=0))  # حد المعدل: مهمة في الثانية
+        self.now[0] = 1.0
+        self.assertEqual(self.scheduler.get(timeout=0), "yt1")
+        self.now[0] = 2.0
+        self.assertIsNone(self.scheduler.get(timeout=0))  # حد التزامن: مهمتان
+        self.scheduler.release("https://youtube.com/watch")
+        self.assertEqual(self.scheduler.get(timeout=0), "yt2")
+        self.assertEqual(self.scheduler.stats()["youtube.com"], {"queued": 1, "active": 2})
+        
+    def test_blocked_get_wakes_on_release_and_close(self):
+        """اختبار إيقاظ المنتظر عند تحرير مكان أو إغلاق الطابور"""
+        self.scheduler.put("tt0", "https://tiktok.com/0")
+        self.scheduler.put("tt1", "https://tiktok.com/1")
+        self.scheduler.get(timeout=0)
+        threading.Timer(0.1, self.scheduler.release, args=("https://tiktok.com/0",)).start()
+        self.assertEqual(self.scheduler.get(timeout=5), "tt1")
+        threading.Timer(0.1, self.scheduler.close).start()
+        self.assertIsNone(self.scheduler.get(timeout=5))
+        
+    def test_config_overrides(self):
+        """اختبار تعديل الحدود من ملف الإعدادات"""
+        import json
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "limits.json")
+            with open(path, "w") as f:
+                json.dump({"youtu.be": {"concurrency": 5}, "example.org": {"concurrency": 4},
+                           "*": {"rate": 3}}, f)
+            limits, default = load_host_limits(path)
+        self.assertEqual(limits["youtube.com"], {"concurrency": 5, "rate": 0.5})
+        self.assertEqual(limits["example.org"], {"concurrency": 4, "rate": 3})
+        self.assertEqual(default["rate"], 3)
+
 def run_basic_tests():
     """تشغيل الاختبارات الأساسية"""
     print("بدء الاختبارات الأساسية...")
@@ -41,6 +41,108 @@ def validate_url(url):
     except:
         return False
 
+# المواقع المدعومة للفيديو (النطاق المسجل؛ النطاقات الفرعية مثل www. و m. تطابق تلقائياً)
+VIDEO_DOMAINS = (
+    'youtube.com', 'youtu.be',
+    'facebook.com', 'fb.watch',
+    'instagram.com',
+    'twitter.com', 'x.com',
+    'tiktok.com',
+    'vimeo.com',
+    'dailymotion.com',
+    'twitch.tv',
+    'reddit.com',
+    'streamable.com',
+)
+
+# النطاقات المختصرة وما يقابلها (للمفتاح الموحد)
+DOMAIN_ALIASES = {
+    'youtu.be': 'youtube.com',
+    'fb.watch': 'facebook.com',
+    'x.com': 'twitter.com',
+}
+
+# البادئات التي لا تغير الصفحة (نسخ الجوال وwww)
+_HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'music.')
+
+# معاملات التتبع التي تُحذف من الرابط الموحد
+TRACKING_PARAMS = frozenset((
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'igsh', 'mibextid',
+    'ref', 'ref_src', 'ref_url', 'mc_cid', 'mc_eid',
+))
+_TRACKING_PREFIXES = ('utm_',)
+
+# معاملات تتبع خاصة بموقع واحد (قد تكون لها معانٍ أخرى في مواقع أخرى)
+SITE_TRACKING_PARAMS = {
+    'youtube.com': frozenset(('si', 'feature', 'pp', 'ab_channel')),
+    'twitter.com': frozenset(('s', 't')),
+    'tiktok.com': frozenset(('is_from_webapp', 'sender_device', 'share_id', '_r', '_t')),
+}
+
+class DomainIndex:
+    def __init__(self, domains=VIDEO_DOMAINS):
+        """
+        فهرس لاحقات النطاقات (بحث بالتجزئة من آخر جزء في اسم المضيف)
+        
+        كل مضيف يُفحص بعدد أجزائه (labels) وليس بعدد النطاقات، ولا يطابق
+        إلا نطاقاً كاملاً: notyoutube.com.evil لا يطابق youtube.com
+        
+        Args:
+            domains: النطاقات المسجلة
+        """
+        self._suffixes = {}
+        for domain in domains:
+            domain = domain.lower().strip('.')
+            self._suffixes[domain] = DOMAIN_ALIASES.get(domain, domain)
+        self._max_labels = max((d.count('.') + 1 for d in self._suffixes), default=0)
+        self._cache = {}
+        
+    def lookup(self, host):
+        """
+        الموقع المقابل لاسم المضيف
+        
+        Args:
+            host: اسم المضيف (مثل m.youtube.com)
+            
+        Returns:
+            str: الموقع الموحد (مثل youtube.com) أو None إذا لم يكن مدعوماً
+        """
+        if not host:
+            return None
+        cached = self._cache.get(host)
+        if cached is not None or host in self._cache:
+            return cached
+        labels = host.lower().rstrip('.').split('.')
+        site = None
+        # من أقصر لاحقة إلى أطولها: com ثم youtube.com ثم www.youtube.com
+        for count in range(1, min(len(labels), self._max_labels) + 1):
+            site = self._suffixes.get('.'.join(labels[-count:]))
+            if site is not None:
+                break
+        if len(self._cache) < 100000:
+            self._cache[host] = site
+        return site
+
+# الفهرس المشترك لقائمة المواقع المدعومة
+video_domain_index = DomainIndex()
+
+def _split_url(url):
+    """تحليل الرابط مع التحقق من البروتوكول والمضيف"""
+    if not url or not isinstance(url, str):
+        return None
+    url = url.strip()
+    if not url[:8].lower().startswith(('http://', 'https://')):
+        return None
+    try:
+        parsed = urlparse(url)
+        host = parsed.hostname
+        port = parsed.port
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return parsed, host, port
+
 def is_video_url(url):
     """
     التحقق من كون الرابط رابط فيديو
@@ -51,28 +153,100 @@ def is_video_url(url):
     Returns:
         bool: True إذا كان رابط فيديو، False إذا لم يكن
     """
-    if not validate_url(url):
-        return False
+    parts = _split_url(url)
+    return parts is not None and video_domain_index.lookup(parts[1]) is not None
+
+def normalize_url(url):
+    """
+    تحويل الرابط إلى صيغة موحدة تُستخدم كمفتاح للذاكرة المؤقتة ومنع التكرار
+    
+    - حروف صغيرة للبروتوكول والمضيف وحذف المنفذ الافتراضي
+    - حذف www. و m. وتحويل youtu.be/ID و shorts/ID إلى youtube.com/watch?v=ID
+    - حذف معاملات التتبع (utm_* و fbclid و si...) وترتيب البقية وحذف الجزء بعد #
+    
+    Args:
+        url: الرابط
+        
+    Returns:
+        str: الرابط الموحد أو None إذا لم يكن رابطاً صالحاً
+    """
+    parts = _split_url(url)
+    if parts is None:
+        return None
+    parsed, host, port = parts
+    scheme = parsed.scheme.lower()
+    host = host.rstrip('.')
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and host.count('.') > 1:
+            host = host[len(prefix):]
+            break
+    if port and port != {'http': 80, 'https': 443}.get(scheme):
+        host = f"{host}:{port}"
+        
+    path = parsed.path or '/'
+    site = video_domain_index.lookup(host)
+    site_params = SITE_TRACKING_PARAMS.get(site, ())
+    params = []
+    if parsed.query:
+        for pair in parsed.query.split('&'):
+            if not pair:
+                continue
+            name = pair.split('=', 1)[0].lower()
+            if name in TRACKING_PARAMS or name in site_params or \
+                    name.startswith(_TRACKING_PREFIXES):
+                continue
+            params.append(pair)
+            
+    if site == 'youtube.com':
+        video_id = None
+        if host == 'youtu.be':
+            video_id = path.strip('/').split('/')[0]
+        elif path.startswith(('/shorts/', '/live/', '/embed/')):
+            video_id = path.split('/')[2]
+        if video_id:
+            host, path = 'youtube.com', '/watch'
+            params = [p for p in params if not p.startswith('v=')] + [f"v={video_id}"]
+    elif site in ('twitter.com', 'facebook.com') and host in DOMAIN_ALIASES:
+        host = DOMAIN_ALIASES[host]
+        
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = '&'.join(sorted(params))
+    return f"{scheme}://{host}{path}" + (f"?{query}" if query else '')
+
+def classify_urls(urls, index=None):
+    """
+    تصنيف دفعة كبيرة من الروابط (مثل قوائم الاستيراد)
+    
+    Args:
+        urls: أي مجموعة روابط قابلة للتكرار (تُقرأ تدريجياً)
+        index: فهرس النطاقات (افتراضياً المواقع المدعومة)
         
-    # قائمة المواقع المدعومة للفيديو
-    video_domains = [
-        'youtube.com', 'youtu.be', 'www.youtube.com',
-        'facebook.com', 'www.facebook.com', 'fb.watch',
-        'instagram.com', 'www.instagram.com',
-        'twitter.com', 'www.twitter.com', 'x.com',
-        'tiktok.com', 'www.tiktok.com',
-        'vimeo.com', 'www.vimeo.com',
-        'dailymotion.com', 'www.dailymotion.com',
-        'twitch.tv', 'www.twitch.tv',
-        'reddit.com', 'www.reddit.com',
-        'streamable.com', 'www.streamable.com'
-    ]
+    Yields:
+        tuple: (الرابط الأصلي، الرابط الموحد أو None، الموقع أو None)
+    """
+    index = index or video_domain_index
+    for url in urls:
+        parts = _split_url(url)
+        if parts is None:
+            yield url, None, None
+            continue
+        yield url, normalize_url(url), index.lookup(parts[1])
+
+def unique_urls(urls):
+    """
+    حذف الروابط المكررة بعد توحيدها مع الحفاظ على الترتيب
     
-    try:
-        domain = urlparse(url).netloc.lower()
-        return any(video_domain in domain for video_domain in video_domains)
-    except:
-        return False
+    Returns:
+        list: الروابط الأصلية الأولى لكل رابط موحد (الروابط غير الصالحة تُحذف)
+    """
+    seen = set()
+    result = []
+    for url, key, _ in classify_urls(urls):
+        if key is not None and key not in seen:
+            seen.add(key)
+            result.append(url)
+    return result
 
 def format_size(size_bytes):
     """
@@ -101,6 +275,28 @@ def format_size(size_bytes):
     else:
         return f"{size:.1f} {units[unit_index]}"
 
+def parse_size(size_text):
+    """
+    تحويل حجم مكتوب بصيغة yt-dlp (مثل "12.5MiB" أو "~1.2GiB") إلى بايت
+    
+    Args:
+        size_text: نص الحجم
+        
+    Returns:
+        int: الحجم بالبايت أو None إذا تعذر التحليل
+    """
+    if not size_text:
+        return None
+    match = re.match(r"^~?\s*([\d.]+)\s*([KMGT]?i?B)$", size_text.strip())
+    if not match:
+        return None
+    units = {"B": 1, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+             "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4}
+    try:
+        return int(float(match.group(1)) * units[match.group(2)])
+    except (ValueError, KeyError):
+        return None
+
 def format_time(seconds):
     """
     تنسيق الوقت لعرضه بشكل مقروء
@@ -322,27 +518,19 @@ def check_disk_space(path, required_size):
     except:
         return True  # افتراض وجود مساحة كافية في حالة عدم القدرة على التحقق
 
-def log_error(error_message, error_type="ERROR"):
+def log_error(error_message, error_type="ERROR", **fields):
     """
-    تسجيل الأخطاء في ملف log
-    
+    تسجيل الأخطاء في ملف log عبر المسجل الخلفي
+
     Args:
         error_message: رسالة الخطأ
         error_type: نوع الخطأ
+        fields: حقول إضافية مثل job_id و phase و duration
     """
     try:
-        from datetime import datetime
-        
-        log_dir = Path(__file__).parent / "logs"
-        log_dir.mkdir(exist_ok=True)
-        
-        log_file = log_dir / "downloader.log"
-        
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {error_type}: {error_message}\n"
+        from logger import get_logger
         
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(log_entry)
+        get_logger().log(error_type, error_message, **fields)
             
     except:
         # في حالة فشل التسجيل، نطبع الخطأ فقط
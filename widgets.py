@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة عناصر الواجهة
+GUI Widgets Module
+
+عناصر واجهة Tk التي تعرض كميات كبيرة من البيانات دون أن تبطئ الواجهة:
+سجل رسائل بسعة ثابتة يُرسم على دفعات مع تصفية حسب النوع أو النص، وجدول
+مهام يحدّث الصفوف المتغيرة فقط من لوحة التقدم المركزية
+"""
+
+import threading
+import itertools
+from datetime import datetime
+from collections import deque
+
+import tkinter as tk
+from tkinter import ttk
+
+import jobs
+from utils import format_size, format_speed, format_time
+
+# ألوان أنواع الرسائل
+MESSAGE_COLORS = {
+    "info": "#2c3e50",
+    "success": "#27ae60",
+    "warning": "#f39c12",
+    "error": "#e74c3c",
+}
+
+# عدد الرسائل المحفوظة (الأقدم تُحذف)
+MESSAGE_CAPACITY = 5000
+
+# عدد الأسطر المرسومة في عنصر النص (آخر الرسائل المطابقة للتصفية)
+VISIBLE_MESSAGES = 500
+
+# فترة رسم الرسائل الجديدة دفعة واحدة (مللي ثانية، قرابة إطار واحد)
+FLUSH_INTERVAL_MS = 50
+
+# أسماء أنواع الرسائل في قائمة التصفية
+FILTER_LABELS = (
+    ("الكل", None),
+    ("معلومات", "info"),
+    ("نجاح", "success"),
+    ("تحذير", "warning"),
+    ("خطأ", "error"),
+)
+
+
+class MessageBuffer:
+    def __init__(self, capacity=MESSAGE_CAPACITY):
+        """
+        مخزن رسائل دائري بسعة ثابتة
+
+        Args:
+            capacity: الحد الأقصى لعدد الرسائل
+        """
+        self.capacity = capacity
+        self._entries = deque(maxlen=capacity)
+        self._counter = itertools.count(1)
+        self._rendered = 0  # تسلسل آخر رسالة رُسمت
+        self._lock = threading.Lock()
+
+    def append(self, text, msg_type="info", timestamp=None):
+        """
+        إضافة رسالة (آمنة من أي خيط)
+
+        Returns:
+            tuple: (التسلسل، الوقت، النوع، النص)
+        """
+        if msg_type not in MESSAGE_COLORS:
+            msg_type = "info"
+        stamp = timestamp or datetime.now().strftime("%H:%M:%S")
+        with self._lock:
+            entry = (next(self._counter), stamp, msg_type, str(text))
+            self._entries.append(entry)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def take_pending(self):
+        """
+        الرسائل التي أضيفت منذ آخر رسم
+
+        Returns:
+            list: الرسائل الجديدة الباقية في المخزن (المحذوفة قبل رسمها لا تُرجع)
+        """
+        with self._lock:
+            pending = []
+            for entry in reversed(self._entries):
+                if entry[0] <= self._rendered:
+                    break
+                pending.append(entry)
+            if self._entries:
+                self._rendered = self._entries[-1][0]
+        pending.reverse()
+        return pending
+
+    def view(self, msg_type=None, query=None, limit=None):
+        """
+        الرسائل المطابقة للتصفية
+
+        Args:
+            msg_type: نوع الرسائل (None للكل)
+            query: نص يجب أن تحتويه الرسالة (دون تمييز حالة الأحرف)
+            limit: عدد آخر الرسائل المطابقة المُرجعة
+
+        Returns:
+            list: الرسائل بترتيب الإضافة
+        """
+        query = query.lower() if query else None
+        with self._lock:
+            entries = list(self._entries)
+        result = []
+        for entry in reversed(entries):
+            if msg_type and entry[2] != msg_type:
+                continue
+            if query and query not in entry[3].lower():
+                continue
+            result.append(entry)
+            if limit and len(result) >= limit:
+                break
+        result.reverse()
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MessageLog(ttk.Frame):
+    def __init__(self, parent, buffer=None, visible=VISIBLE_MESSAGES,
+                 interval_ms=FLUSH_INTERVAL_MS, **kwargs):
+        """
+        سجل رسائل: عنصر نص يعرض آخر الرسائل المطابقة للتصفية فقط
+
+        الإضافة لا تلمس عنصر النص؛ الرسائل الجديدة تُرسم دفعة واحدة كل
+        interval_ms، ويُقص عنصر النص إلى visible سطر بعد كل دفعة
+
+        Args:
+            parent: العنصر الأب
+            buffer: مخزن الرسائل (افتراضياً مخزن جديد)
+            visible: عدد الرسائل المرسومة
+            interval_ms: فترة الرسم
+        """
+        super().__init__(parent, **kwargs)
+        self.buffer = buffer or MessageBuffer()
+        self.visible = visible
+        self.interval_ms = interval_ms
+        self._flush_id = None
+        self._lines = 0
+
+        self.columnconfigure(1, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        # شريط التصفية
+        self.filter_var = tk.StringVar(value=FILTER_LABELS[0][0])
+        self.query_var = tk.StringVar()
+        filter_combo = ttk.Combobox(self, textvariable=self.filter_var, state="readonly",
+                                    values=[label for label, _ in FILTER_LABELS], width=10)
+        filter_combo.grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        query_entry = ttk.Entry(self, textvariable=self.query_var)
+        query_entry.grid(row=0, column=1, columnspan=2, sticky=(tk.W, tk.E), padx=(5, 0),
+                         pady=(0, 5))
+        self.filter_var.trace_add("write", lambda *args: self.refresh())
+        self.query_var.trace_add("write", lambda *args: self.refresh())
+
+        self.text = tk.Text(self, height=6, wrap=tk.WORD, font=("Arial", 9), state="disabled")
+        self.text.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.text.yview)
+        scrollbar.grid(row=1, column=2, sticky=(tk.N, tk.S))
+        self.text.configure(yscrollcommand=scrollbar.set)
+
+        # الألوان تُضبط مرة واحدة وليس مع كل رسالة
+        for tag, color in MESSAGE_COLORS.items():
+            self.text.tag_configure(tag, foreground=color)
+
+    def filters(self):
+        """
+        التصفية الحالية
+
+        Returns:
+            tuple: (النوع أو None، النص أو None)
+        """
+        msg_type = dict(FILTER_LABELS).get(self.filter_var.get())
+        return msg_type, self.query_var.get().strip() or None
+
+    def add(self, message, msg_type="info"):
+        """إضافة رسالة وجدولة رسمها مع الدفعة التالية"""
+        self.buffer.append(message, msg_type)
+        if self._flush_id is None:
+            self._flush_id = self.after(self.interval_ms, self.flush)
+
+    def flush(self):
+        """رسم الرسائل الجديدة المطابقة للتصفية دفعة واحدة"""
+        if self._flush_id is not None:
+            # عند الاستدعاء المباشر قبل موعد الدفعة
+            self.after_cancel(self._flush_id)
+            self._flush_id = None
+        msg_type, query = self.filters()
+        pending = self.buffer.take_pending()
+        if msg_type or query:
+            query = query.lower() if query else None
+            pending = [entry for entry in pending
+                       if (not msg_type or entry[2] == msg_type)
+                       and (not query or query in entry[3].lower())]
+        if not pending:
+            return
+        self._render(pending[-self.visible:], append=True)
+
+    def refresh(self):
+        """إعادة رسم آخر الرسائل المطابقة (عند تغيير التصفية)"""
+        msg_type, query = self.filters()
+        self.buffer.take_pending()
+        self._render(self.buffer.view(msg_type, query, self.visible), append=False)
+
+    def _render(self, entries, append):
+        at_bottom = self.text.yview()[1] >= 0.999
+        self.text.configure(state="normal")
+        if not append:
+            self.text.delete("1.0", tk.END)
+            self._lines = 0
+        for _, stamp, msg_type, message in entries:
+            # سطر واحد لكل رسالة حتى يبقى عدد الأسطر صحيحاً عند القص
+            message = message.replace("\n", " ")
+            self.text.insert(tk.END, f"[{stamp}] {message}\n", msg_type)
+        self._lines += len(entries)
+        if self._lines > self.visible:
+            # قص الأسطر الأقدم حتى لا يكبر عنصر النص بلا حد
+            self.text.delete("1.0", f"{self._lines - self.visible + 1}.0")
+            self._lines = self.visible
+        self.text.configure(state="disabled")
+        if at_bottom or not append:
+            self.text.see(tk.END)
+
+
+# أعمدة جدول المهام: (المعرف، العنوان، العرض)
+JOB_COLUMNS = (
+    ("title", "العنوان", 260),
+    ("state", "الحالة", 80),
+    ("progress", "التقدم", 70),
+    ("speed", "السرعة", 90),
+    ("eta", "المتبقي", 80),
+    ("size", "الحجم", 90),
+)
+
+# أسماء حالات المهام في الجدول
+STATE_LABELS = {
+    jobs.QUEUED: "في الانتظار",
+    jobs.RUNNING: "جاري التحميل",
+    jobs.PAUSED: "متوقف",
+    jobs.COMPLETED: "مكتمل",
+    jobs.FAILED: "فشل",
+    jobs.CANCELLED: "ملغى",
+}
+
+# فترة تحديث جدول المهام (مللي ثانية)
+TABLE_INTERVAL_MS = 250
+
+# أقصى عدد صفوف تُحدّث في الدورة الواحدة (الباقي في الدورة التالية)
+TABLE_MAX_UPDATES = 500
+
+
+def job_row_values(row):
+    """
+    قيم أعمدة صف مهمة من لوحة التقدم
+
+    Args:
+        row: صف من ProgressBoard
+
+    Returns:
+        tuple: نصوص الأعمدة بترتيب JOB_COLUMNS
+    """
+    state = row.get("state")
+    total = row.get("total")
+    speed = row.get("speed")
+    eta = row.get("eta")
+    return (
+        row.get("title") or row.get("url") or "",
+        STATE_LABELS.get(state, state or ""),
+        f"{row.get('progress') or 0:.1f}%",
+        format_speed(speed) if speed else "",
+        format_time(eta) if eta is not None and state == jobs.RUNNING else "",
+        format_size(total) if total else "",
+    )
+
+
+class JobTable(ttk.Frame):
+    def __init__(self, parent, board, interval_ms=TABLE_INTERVAL_MS,
+                 max_updates=TABLE_MAX_UPDATES, height=8, **kwargs):
+        """
+        جدول مهام يقرأ من لوحة التقدم المركزية على فترات ثابتة
+
+        خيوط التحميل لا تلمس الجدول؛ كل interval_ms تُقرأ الصفوف التي تغيرت
+        منذ آخر دورة فقط، ويُحدّث منها max_updates صف على الأكثر حتى يبقى زمن
+        الدورة محدوداً مهما كثرت المهام
+
+        Args:
+            parent: العنصر الأب
+            board: لوحة التقدم (ProgressBoard)
+            interval_ms: فترة التحديث
+            max_updates: أقصى عدد صفوف تُحدّث في الدورة
+            height: عدد الصفوف الظاهرة
+        """
+        super().__init__(parent, **kwargs)
+        self.board = board
+        self.interval_ms = interval_ms
+        self.max_updates = max_updates
+        self._version = 0
+        self._pending = {}  # صفوف تغيرت ولم تُرسم بعد
+        self._values = {}  # آخر قيم مرسومة لكل صف
+        self._refresh_id = None
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self, columns=[name for name, _, _ in JOB_COLUMNS],
+                                 show="headings", height=height, selectmode="browse")
+        for name, heading, width in JOB_COLUMNS:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, stretch=(name == "title"),
+                             anchor=tk.W if name == "title" else tk.CENTER)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+    def start(self):
+        """بدء دورات التحديث"""
+        if self._refresh_id is None:
+            self._refresh_id = self.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """إيقاف دورات التحديث"""
+        if self._refresh_id is not None:
+            self.after_cancel(self._refresh_id)
+            self._refresh_id = None
+
+    def _tick(self):
+        self._refresh_id = None
+        self.refresh()
+        self._refresh_id = self.after(self.interval_ms, self._tick)
+
+    def refresh(self):
+        """
+        رسم الصفوف التي تغيرت منذ آخر دورة
+
+        Returns:
+            int: عدد الصفوف المرسومة
+        """
+        self._version, changed, removed = self.board.changes(self._version)
+        self._pending.update(changed)
+        for job_id in removed:
+            self._pending.pop(job_id, None)
+            if self._values.pop(job_id, None) is not None:
+                self.tree.delete(job_id)
+
+        drawn = 0
+        while self._pending and drawn < self.max_updates:
+            job_id, row = self._pending.popitem()
+            values = job_row_values(row)
+            previous = self._values.get(job_id)
+            if previous == values:
+                continue
+            if previous is None:
+                self.tree.insert("", tk.END, iid=job_id, values=values)
+            else:
+                self.tree.item(job_id, values=values)
+            self._values[job_id] = values
+            drawn += 1
+        return drawn
+
+    def selected(self):
+        """معرف المهمة المحددة أو None"""
+        selection = self.tree.selection()
+        return selection[0] if selection else None
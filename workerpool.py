@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة مجمع عمليات yt-dlp الجاهزة
+Warm Extractor Worker Pool Module
+
+عمليات دائمة تستورد yt-dlp وتهيئ مستخرجاته مرة واحدة، ثم تنفذ أوامره
+(جلب المعلومات والتحميل) داخل نفس العملية بدلاً من تشغيل عملية جديدة
+لكل مهمة. كل أمر يُرجع مقبضاً بنفس واجهة subprocess.Popen (stdout و
+wait و poll و terminate) فيعمل باقي البرنامج معه دون تغيير
+"""
+
+import io
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+import multiprocessing
+from collections import deque
+
+import logger
+
+# عدد المهام التي تنفذها العملية قبل استبدالها (للحد من تسرب الذاكرة)
+DEFAULT_MAX_TASKS = 50
+
+# مهلة رد العملية على فحص الصحة (الثواني)
+PING_TIMEOUT = 5
+
+# العملية الخاملة أكثر من هذه المدة تُفحص قبل إعطائها مهمة
+HEALTH_INTERVAL = 30
+
+
+def warm_ytdlp():
+    """استيراد yt-dlp وتحميل قائمة المستخرجات (تُنفذ مرة واحدة في كل عملية)"""
+    import yt_dlp
+    from yt_dlp.extractor import gen_extractor_classes
+    gen_extractor_classes()
+    return yt_dlp
+
+
+def run_ytdlp(argv):
+    """
+    تنفيذ أمر yt-dlp داخل العملية الحالية
+
+    Args:
+        argv: معاملات سطر الأوامر بدون اسم البرنامج
+
+    Returns:
+        int: رمز الخروج
+    """
+    import yt_dlp
+    try:
+        yt_dlp.main(list(argv))
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        sys.stderr.write(f"{e.code}\n")
+        return 1
+    return 0
+
+
+class _ConnWriter(io.TextIOBase):
+    """مجرى نصي يرسل كل ما يُكتب فيه إلى العملية الرئيسية"""
+
+    def __init__(self, conn, channel, lock):
+        self._conn = conn
+        self._channel = channel
+        self._lock = lock
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        if text:
+            # yt-dlp قد يكتب من عدة خيوط (مثل تحميل الأجزاء بالتوازي)
+            with self._lock:
+                self._conn.send((self._channel, text))
+        return len(text)
+
+
+def _worker_main(conn, runner, warmup):
+    """حلقة العملية الجاهزة: تنفيذ الأوامر واحداً تلو الآخر حتى طلب الإيقاف"""
+    try:
+        if warmup is not None:
+            warmup()
+    except Exception as e:
+        # الأوامر تعمل رغم ذلك، لكن بدون فائدة التهيئة المسبقة
+        sys.stderr.write(f"Worker warmup failed: {e}\n")
+
+    # اسم البرنامج في رسائل الاستخدام والأخطاء
+    sys.argv = ["yt-dlp"]
+    lock = threading.Lock()
+    stdout, stderr = sys.stdout, sys.stderr
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == "ping":
+            conn.send(("pong",))
+        elif message[0] == "stop":
+            return
+        elif message[0] == "run":
+            sys.stdout = _ConnWriter(conn, "out", lock)
+            sys.stderr = _ConnWriter(conn, "err", lock)
+            try:
+                code = runner(message[1])
+            except BaseException as e:
+                sys.stderr.write(f"ERROR: {e}\n")
+                code = 1
+            finally:
+                sys.stdout, sys.stderr = stdout, stderr
+            conn.send(("exit", code if isinstance(code, int) else 1))
+
+
+class PooledProcess:
+    def __init__(self, cmd, text=False, stderr=None):
+        """
+        مقبض أمر ينفذ في عملية جاهزة، بنفس واجهة subprocess.Popen المستخدمة
+
+        Args:
+            cmd: الأمر (يبدأ بـ yt-dlp)
+            text: قراءة المخرجات كنص بدلاً من bytes
+            stderr: subprocess.PIPE لمجرى أخطاء منفصل، أو subprocess.STDOUT لدمجه
+        """
+        self.args = cmd
+        self.returncode = None
+        self.pid = None
+        self.stdin = None
+        self._text = text
+        self._done = threading.Event()
+        self._kill_signal = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self.stdout, self._out_sink = self._pipe()
+        if stderr == subprocess.PIPE:
+            self.stderr, self._err_sink = self._pipe()
+        else:
+            self.stderr = None
+            self._err_sink = self._out_sink if stderr == subprocess.STDOUT else None
+
+    def _pipe(self):
+        read_fd, write_fd = os.pipe()
+        if self._text:
+            reader = open(read_fd, "r", encoding="utf-8", errors="replace")
+        else:
+            reader = open(read_fd, "rb")
+        return reader, open(write_fd, "wb", buffering=0)
+
+    def _write(self, channel, text):
+        sink = self._out_sink if channel == "out" else self._err_sink
+        if sink is None:
+            return
+        try:
+            sink.write(text.encode("utf-8", "replace"))
+        except (OSError, ValueError):
+            # المستهلك أغلق المجرى: نتجاهل بقية المخرجات
+            pass
+
+    def _attach(self, worker):
+        """ربط المقبض بالعملية التي ستنفذه (False إذا أُنهي قبل بدئه)"""
+        with self._lock:
+            if self._kill_signal is not None:
+                return False
+            self._worker = worker
+            self.pid = worker.process.pid
+            return True
+
+    def _finish(self, code):
+        for sink in {self._out_sink, self._err_sink} - {None}:
+            try:
+                sink.close()
+            except OSError:
+                pass
+        with self._lock:
+            if self._kill_signal is not None:
+                code = -self._kill_signal
+            self.returncode = code
+        self._done.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        """
+        إنهاء الأمر: لا يمكن مقاطعة yt-dlp بأمان داخل العملية، فتُنهى العملية
+        الجاهزة نفسها ويستبدلها المجمع بأخرى
+        """
+        with self._lock:
+            if self.returncode is not None or self._kill_signal is not None:
+                return
+            self._kill_signal = sig
+            worker = self._worker
+        if worker is None:
+            # لم يبدأ بعد: يُحذف من الطابور
+            self._finish(-sig)
+        else:
+            worker.kill()
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+class _Worker:
+    def __init__(self, context, runner, warmup):
+        """عملية جاهزة واحدة مع قناة الاتصال بها"""
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, runner, warmup),
+                                       name="ytdlp-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.idle_since = time.monotonic()
+
+    def ping(self, timeout=PING_TIMEOUT):
+        """فحص صحة العملية (تستجيب خلال المهلة)"""
+        if not self.process.is_alive():
+            return False
+        try:
+            self.conn.send(("ping",))
+            if not self.conn.poll(timeout):
+                return False
+            return self.conn.recv() == ("pong",)
+        except (EOFError, OSError):
+            return False
+
+    def kill(self):
+        try:
+            self.process.kill()
+        except (OSError, AttributeError):
+            self.process.terminate()
+
+    def stop(self):
+        """إيقاف العملية بعد انتهاء مهامها"""
+        try:
+            self.conn.send(("stop",))
+        except OSError:
+            pass
+        self.process.join(2)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+
+class WorkerPool:
+    def __init__(self, size=2, max_tasks=DEFAULT_MAX_TASKS, health_interval=HEALTH_INTERVAL,
+                 runner=run_ytdlp, warmup=warm_ytdlp):
+        """
+        مجمع عمليات yt-dlp الجاهزة مع طابور للأوامر
+
+        Args:
+            size: عدد العمليات
+            max_tasks: عدد المهام قبل استبدال العملية
+            health_interval: العملية الخاملة أكثر من هذه المدة تُفحص قبل إعطائها مهمة
+            runner: دالة تنفذ الأمر داخل العملية (تستقبل المعاملات وتُرجع رمز الخروج)
+            warmup: دالة تُنفذ مرة واحدة عند بدء كل عملية
+        """
+        self.size = max(1, size)
+        self.max_tasks = max(1, max_tasks)
+        self.health_interval = health_interval
+        self.runner = runner
+        self.warmup = warmup
+        # spawn حتى لا ترث العمليات خيوط البرنامج وأقفاله
+        self._context = multiprocessing.get_context("spawn")
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._idle = []
+        self._busy = set()
+        self._started = False
+        self._closed = False
+        self._stats = {"tasks": 0, "recycled": 0, "replaced": 0}
+
+    def start(self):
+        """تشغيل العمليات (يحدث تلقائياً عند أول أمر)"""
+        with self._condition:
+            if self._started or self._closed:
+                return
+            self._started = True
+            for _ in range(self.size):
+                self._idle.append(_Worker(self._context, self.runner, self.warmup))
+        logger.info(f"Started {self.size} warm yt-dlp workers", phase="setup")
+
+    def popen(self, cmd, stdout=None, stderr=None, text=False, universal_newlines=False,
+              **kwargs):
+        """
+        تنفيذ أمر yt-dlp في أول عملية متاحة (بنفس معاملات subprocess.Popen)
+
+        Returns:
+            PooledProcess: مقبض الأمر
+        """
+        if cmd[0] != "yt-dlp" or kwargs.get("stdin") == subprocess.PIPE:
+            raise ValueError("Only yt-dlp commands without stdin can run in the worker pool")
+        self.start()
+        process = PooledProcess(cmd, text or universal_newlines, stderr)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Worker pool is shut down")
+            self._queue.append(process)
+            self._dispatch()
+        return process
+
+    def _dispatch(self):
+        """إعطاء الأوامر المنتظرة للعمليات الخاملة (تحت القفل)"""
+        while self._queue and self._idle:
+            process = self._queue.popleft()
+            if process.poll() is not None:
+                continue
+            worker = self._idle.pop()
+            self._busy.add(worker)
+            threading.Thread(target=self._serve, args=(worker, process),
+                             name="ytdlp-worker-io", daemon=True).start()
+
+    def _replace(self, worker, reason):
+        """استبدال عملية معطلة أو منتهية بأخرى جديدة"""
+        worker.kill()
+        worker.conn.close()
+        logger.warning(f"Replacing yt-dlp worker {worker.process.pid}: {reason}", phase="setup")
+        with self._condition:
+            self._stats["replaced"] += 1
+        return _Worker(self._context, self.runner, self.warmup)
+
+    def _serve(self, worker, process):
+        """تنفيذ أمر واحد ونقل مخرجاته (في خيط خاص بالأمر)"""
+        if time.monotonic() - worker.idle_since > self.health_interval and not worker.ping():
+            worker = self._swap(worker, self._replace(worker, "health check failed"))
+        if not process._attach(worker):
+            self._release(worker)
+            return
+
+        code = None
+        try:
+            worker.conn.send(("run", process.args[1:]))
+            while True:
+                message = worker.conn.recv()
+                if message[0] == "exit":
+                    code = message[1]
+                    break
+                if message[0] in ("out", "err"):
+                    process._write(*message)
+        except (EOFError, OSError):
+            # العملية انتهت أثناء الأمر (إنهاء أو انهيار)
+            worker.process.join(1)
+        if code is None:
+            process._finish(worker.process.exitcode or -signal.SIGTERM)
+        else:
+            process._finish(code)
+
+        if code is None:
+            worker = self._swap(worker, self._replace(worker, "process exited during task"))
+        else:
+            worker.tasks += 1
+            if worker.tasks >= self.max_tasks:
+                old = worker
+                worker = self._swap(worker, _Worker(self._context, self.runner, self.warmup))
+                old.stop()
+                with self._condition:
+                    self._stats["recycled"] += 1
+        with self._condition:
+            self._stats["tasks"] += 1
+        self._release(worker)
+
+    def _swap(self, old, new):
+        with self._condition:
+            self._busy.discard(old)
+            self._busy.add(new)
+        return new
+
+    def _release(self, worker):
+        with self._condition:
+            self._busy.discard(worker)
+            if self._closed:
+                worker.stop()
+                return
+            worker.idle_since = time.monotonic()
+            self._idle.append(worker)
+            self._dispatch()
+
+    def check_health(self):
+        """
+        فحص كل العمليات الخاملة واستبدال التي لا تستجيب
+
+        Returns:
+            int: عدد العمليات المستبدلة
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        healthy, replaced = [], 0
+        for worker in idle:
+            if worker.ping():
+                healthy.append(worker)
+            else:
+                healthy.append(self._replace(worker, "health check failed"))
+                replaced += 1
+        with self._condition:
+            self._idle.extend(healthy)
+            self._dispatch()
+        return replaced
+
+    def stats(self):
+        """
+        حالة المجمع
+
+        Returns:
+            dict: عدد العمليات الخاملة والمشغولة والأوامر المنتظرة والمنفذة
+        """
+        with self._condition:
+            return dict(self._stats, idle=len(self._idle), busy=len(self._busy),
+                        queued=len(self._queue))
+
+    def shutdown(self):
+        """إيقاف المجمع وإنهاء الأوامر المنتظرة"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            pending, self._queue = list(self._queue), deque()
+        for process in pending:
+            process.terminate()
+        for worker in idle:
+            worker.stop()